@@ -26,24 +26,29 @@
 import sys
 import os
 import argparse
+import concurrent.futures
 import shutil
-from typing import Optional
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 try:
     import fontquery_debug  # noqa: F401
 except ModuleNotFoundError:
     pass
 from fontquery import container  # noqa: F401
+from fontquery import utils  # noqa: F401
 
 
-def do_build(product: str, release: str, target: str, push: bool, args: argparse.Namespace) -> bool:
+def do_build(product: str, release: str, target: str, push: bool, args: argparse.Namespace) -> Union[bool, container.UpdateStatus]:
+    """Build or update an image. UpdateStatus.UP_TO_DATE if nothing is updated"""
     bldr = container.ContainerImage(product, release, args.verbose)
     bldr.target = target
     if not args.skip_build:
         if args.rmi:
             bldr.clean(**vars(args))
         if args.update:
-            if not bldr.update(**vars(args)):
-                return False
+            status = bldr.update(**vars(args))
+            if status != container.UpdateStatus.UPDATED:
+                return status
         else:
             if not bldr.build(**vars(args)):
                 return False
@@ -53,6 +58,15 @@ def do_build(product: str, release: str, target: str, push: bool, args: argparse
     return True
 
 
+def do_build_stages(product: str, release: str, targets: List[str], args: argparse.Namespace) -> Dict[str, bool]:
+    bldr = container.ContainerImage(product, release, args.verbose)
+    if args.rmi:
+        for t in targets:
+            bldr.target = t
+            bldr.clean(**vars(args))
+    return bldr.build_stages(targets, **vars(args))
+
+
 def do_push(product: str, release: str, target: str, args: argparse.Namespace) -> bool:
     bldr = container.ContainerImage(product, release, args.verbose)
     bldr.target = target
@@ -61,6 +75,98 @@ def do_push(product: str, release: str, target: str, args: argparse.Namespace) -
     return True
 
 
+TARGETS = ['minimal', 'extra', 'all']
+
+
+def run_matrix(products: List[str], releases: List[str], targets: List[str],
+               args: argparse.Namespace) -> Dict[Tuple[str, str, str], Dict[str, str]]:
+    """
+    Build images for products x releases x targets concurrently.
+
+    Targets of the same product and release are built in order since
+    they are based on each other, and are skipped once one failed.
+    Images are pushed as soon as they are built while other builds
+    are still running. Images which are up to date aren't pushed and
+    don't stop the next targets. With args.slim, a slim image is built after
+    each target, and failing it doesn't stop the next target.
+
+    Returns:
+        Status of build and push per (product, release, target)
+    """
+    targets = [t for t in TARGETS if t in targets]
+    if getattr(args, 'slim', False):
+        targets = sum([[t, t + utils.SLIM_SUFFIX] for t in targets], [])
+    results = {(p, r, t): {'build': 'skipped', 'push': '-'}
+               for p in products for r in releases for t in targets}
+    lock = threading.Lock()
+
+    def set_status(key, step, status):
+        with lock:
+            results[key][step] = status
+
+    def run(func, *fargs) -> bool:
+        try:
+            return func(*fargs, args)
+        except RuntimeError as e:
+            print(f'** {" ".join(fargs[:2])}: {e}', file=sys.stderr)
+            return False
+
+    def push(key):
+        set_status(key, 'push', 'pushed' if run(do_push, *key) else 'failed')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pushes:
+        def chain(product, release):
+            if args.layers and not args.skip_build:
+                built = run(do_build_stages, product, release, targets) or {}
+                for t in targets:
+                    key = (product, release, t)
+                    if not built.get(t, False):
+                        set_status(key, 'build', 'failed')
+                        # Same as building targets one by one
+                        if t.endswith(utils.SLIM_SUFFIX):
+                            continue
+                        break
+                    set_status(key, 'build', 'built')
+                    if args.push:
+                        pushes.submit(push, key)
+                return
+            for t in targets:
+                key = (product, release, t)
+                status = run(do_build, product, release, t, False)
+                if not status:
+                    set_status(key, 'build', 'failed')
+                    if t.endswith(utils.SLIM_SUFFIX):
+                        continue
+                    break
+                if status == container.UpdateStatus.UP_TO_DATE:
+                    set_status(key, 'build', 'up to date')
+                    continue
+                set_status(key, 'build', '-' if args.skip_build else 'built')
+                if args.push:
+                    pushes.submit(push, key)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as builds:
+            for f in [builds.submit(chain, p, r)
+                      for p in products for r in releases]:
+                f.result()
+
+    return results
+
+
+def print_report(results: Dict[Tuple[str, str, str], Dict[str, str]]) -> bool:
+    """Show a report of run_matrix(). Return False if anything failed"""
+    print('* Build report:')
+    keys = list(results.keys())
+    widths = [max(len(k[i]) for k in keys) for i in range(3)]
+    for key, res in results.items():
+        cols = [f'{k:<{w}}' for k, w in zip(key, widths)]
+        print(f'  {"  ".join(cols)}  {res["build"]:<11}  {res["push"]}')
+    failed = [k for k, res in results.items()
+              if 'failed' in res.values() or res['build'] == 'skipped']
+    print(f'* {len(results) - len(failed)} succeeded, {len(failed)} failed')
+    return not failed
+
+
 def main():
     """Endpoint to execute fontquery-build."""
     parser = argparse.ArgumentParser(
@@ -70,27 +176,57 @@ def main():
                         '--debug',
                         action='store_true',
                         help=argparse.SUPPRESS)
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of builds and pushes to run at once')
     parser.add_argument('-r',
                         '--release',
-                        default='rawhide',
-                        help='Release number')
+                        action='append',
+                        help='Release number. can be specified multiple '
+                        'times (default: rawhide)')
+    parser.add_argument('--disable-dnf-cache',
+                        action='store_true',
+                        help='Do not share the dnf cache on the host '
+                        'with builds and updates')
+    parser.add_argument('--force-check',
+                        action='store_true',
+                        help='Check updates in containers with --update '
+                        'even if --repo-url has no updates')
+    parser.add_argument('--layers',
+                        action='store_true',
+                        help='Build all targets in one multi-stage build '
+                        'sharing layers and show time spent in each stage')
+    parser.add_argument('--repo-url',
+                        action='append',
+                        help='Base URL or path of a repository to check '
+                        'updates on the host with --update. {product}, '
+                        '{release} and {arch} are replaced. can be '
+                        'specified multiple times')
     parser.add_argument('--rmi',
                         action='store_true',
                         help='Remove image before building')
     parser.add_argument('-P', '--product',
-                        default='fedora',
+                        action='append',
                         choices=['fedora', 'centos'],
-                        help='Product name to build image'
+                        help='Product name to build image. can be specified '
+                        'multiple times (default: fedora)'
                         )
     parser.add_argument('-p', '--push', action='store_true', help='Push image')
     parser.add_argument('-s',
                         '--skip-build',
                         action='store_true',
                         help='Do not build image')
+    parser.add_argument('--slim',
+                        action='store_true',
+                        help='Build slim images only for queries as well')
     parser.add_argument('-t',
                         '--target',
-                        choices=['minimal', 'extra', 'all'],
-                        help='Take an action for the specific target only')
+                        action='append',
+                        choices=TARGETS,
+                        help='Take an action for the specific target only. '
+                        'can be specified multiple times')
     parser.add_argument('--try-run',
                         action='store_true',
                         help='Do not take any actions')
@@ -128,19 +264,19 @@ def main():
         print('Warning: --skip-build and --update option are conflict each'
               ' other. Disabling --update.')
         args.update = False
-    if args.target:
-        if not do_build(args.product, args.release, args.target,
-                        args.push, args):
-            sys.exit(1)
-    else:
-        target = ['minimal', 'extra', 'all']
-        for t in target:
-            if not do_build(args.product, args.release, t, False, args):
-                sys.exit(1)
-        if args.push:
-            for t in target:
-                if not do_push(args.product, args.release, t, args):
-                    sys.exit(1)
+    if args.layers and args.update:
+        print('Warning: --layers and --update option are conflict each'
+              ' other. Disabling --layers.')
+        args.layers = False
+    if args.slim and args.update:
+        print('Warning: slim images can\'t be updated. Disabling --slim.')
+        args.slim = False
+
+    results = run_matrix(args.product or ['fedora'],
+                         args.release or ['rawhide'],
+                         args.target or TARGETS, args)
+    if not print_report(results):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -3,32 +3,235 @@
 
 """Module to deal with cache file"""
 
+import argparse
+import asyncio
+import atexit
+import contextlib
+import fcntl
+import functools
+import glob
+import hashlib
+import importlib.metadata
+import io
+import json
+import marshal
 import os
+import re
 import subprocess
 import sys
+import tarfile
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
 from xdg import BaseDirectory
+from fontquery import version
+
+try:
+    FQ_VERSION = importlib.metadata.version('fontquery')
+except ModuleNotFoundError:
+    FQ_VERSION = version.fontquery_version()
+# Bump this when the layout of the indexed data is changed
+INDEX_FORMAT = 1
+# Bump this when the layout of the export bundle is changed
+BUNDLE_FORMAT = 1
+STATS_FILE = 'stats.json'
+PRODUCTS = ['fedora', 'centos']
+TARGETS = ['minimal', 'extra', 'all',
+           'minimal-slim', 'extra-slim', 'all-slim']
+# Keys of entries which can be imported from bundles
+TARGET_RE = re.compile(r'(minimal|extra|all)(-slim)?')
+RELEASE_RE = re.compile(r'[a-zA-Z0-9][a-zA-Z0-9._-]*')
+# Releases may have '-' but products and targets are known
+KEY_RE = re.compile(r'([^-]+)-(.+)-(' + TARGET_RE.pattern + ')')
+ENTRY_RE = re.compile(r'(?P<id>(sha256:)?[0-9a-f]{64}|local-[0-9a-f]{64})'
+                      r'(-(?P<variant>[0-9a-f]{64}))?\.json')
+FC_CONFIG_PATHS = [
+    '/etc/fonts',
+    '/usr/share/fontconfig/conf.avail',
+    os.path.join(BaseDirectory.xdg_config_home, 'fontconfig'),
+    os.path.expanduser('~/.fonts.conf'),
+    os.path.expanduser('~/.fonts.conf.d'),
+]
+FONT_DIR_PATHS = [
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.join(BaseDirectory.xdg_data_home, 'fonts'),
+    os.path.expanduser('~/.fonts'),
+]
+RPMDB_PATHS = [
+    '/usr/lib/sysimage/rpm',
+    '/var/lib/rpm',
+]
+
+
+def _walk(path: str) -> Iterator[Path]:
+    p = Path(path)
+    if p.is_file():
+        yield p
+    elif p.is_dir():
+        yield p
+        for root, dirs, files in os.walk(p):
+            dirs.sort()
+            for n in sorted(dirs + files):
+                yield Path(root) / n
+
+
+def local_fingerprint() -> str:
+    """Compute a digest of the local font environment.
+
+    This covers the contents of fontconfig config files, the mtime of
+    font directories and the state of the rpm database, which is what
+    the result of the local query depends on.
+    """
+    h = hashlib.sha256()
+    h.update(version.fontquery_version().encode('utf-8'))
+    for env in ['FONTCONFIG_FILE', 'FONTCONFIG_PATH', 'FONTCONFIG_SYSROOT']:
+        h.update(f'{env}={os.environ.get(env, "")}\0'.encode('utf-8'))
+    for path in FC_CONFIG_PATHS:
+        for p in _walk(path):
+            h.update(str(p).encode('utf-8') + b'\0')
+            if p.is_symlink():
+                h.update(os.readlink(p).encode('utf-8') + b'\0')
+            elif p.is_file():
+                try:
+                    h.update(p.read_bytes())
+                except OSError:
+                    pass
+    for path in FONT_DIR_PATHS:
+        for p in _walk(path):
+            if p.is_dir():
+                st = p.stat()
+                h.update(f'{p}:{st.st_mtime_ns}\0'.encode('utf-8'))
+    for path in RPMDB_PATHS:
+        p = Path(path)
+        if not p.is_dir():
+            continue
+        for f in sorted(p.iterdir()):
+            with contextlib.suppress(OSError):
+                st = f.stat()
+                h.update(f'{f}:{st.st_size}:{st.st_mtime_ns}\0'
+                         .encode('utf-8'))
+
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def sysroot_variant() -> str:
+    """Variant of entries queried with fontconfig on the host.
+
+    Results of the sysroot mode depend on the version of fontconfig on
+    the host instead of the one in images, so they are kept apart from
+    results queried in containers.
+    """
+    h = hashlib.sha256(b'sysroot\0')
+    try:
+        res = subprocess.run(['fc-match', '--version'], capture_output=True,
+                             check=False)
+        h.update(res.stdout + res.stderr)
+    except OSError:
+        pass
+    return h.hexdigest()
+
+
+def package_digest(files: List[str], params: List[str]) -> str:
+    """Compute a digest of package files and query parameters.
+
+    The order of files doesn't matter as they are installed in one
+    transaction.
+    """
+    digests = []
+    for fn in files:
+        fh = hashlib.sha256()
+        with open(fn, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                fh.update(chunk)
+        digests.append(fh.hexdigest())
+    h = hashlib.sha256()
+    for d in sorted(digests):
+        h.update(d.encode('utf-8') + b'\0')
+    for p in params:
+        h.update(p.encode('utf-8') + b'\0')
+
+    return h.hexdigest()
+
+
+def write_atomic(fn: Path, data: bytes) -> bool:
+    """Write data into a file atomically"""
+    # Write into a temporary file and rename it so that readers never
+    # see a partially written file.
+    fd, tmp = tempfile.mkstemp(dir=fn.parent, prefix=f'.{fn.name}.',
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, fn)
+    except OSError:
+        Path(tmp).unlink(missing_ok=True)
+        return False
+    return True
 
 
 class FontQueryCache:
     """cache handling class"""
 
-    def __init__(self, platform: str, release: str, target: str) -> None:
+    # Statistics are counted up in memory and merged into the file once
+    # per process so that reads don't need to lock and sync the file.
+    _stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+    _stats_lock = threading.Lock()
+    _stats_registered = False
+
+    def __init__(self, platform: str, release: str, target: str,
+                 variant: Optional[str] = None, backend: str = 'cli',
+                 image_id: Optional[Callable[[], Optional[str]]] = None) -> None:
         self._base_cachedir = BaseDirectory.save_cache_path('fontquery')
         self._cachedir = Path(self._base_cachedir) /\
             f'{platform}-{release}-{target}'
+        self._release = release
+        self._variant = variant
+        self._backend = backend
+        # e.g. ContainerImage.image_id to reuse what is known from pulling
+        self._image_id = image_id
+        self._looked_up = False
+        self._local_revision: Optional[str] = None
         self._repo = f'ghcr.io/fedora-i18n/fontquery/{platform}/'\
             f'{target}:{release}'
-        if not self._cachedir.exists():
-            self._cachedir.mkdir()
+        self._cachedir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def revision(self) -> str:
+        """Image ID the entries are currently bound to"""
+        return self._get_current_revision()
 
     @property
     def filename(self) -> os.PathLike:
         tag = self._get_current_revision()
+        if self._variant:
+            tag += '-' + self._variant
         return self._cachedir / (tag + '.json')
 
     def _get_current_revision(self) -> str:
+        if self._release == 'local':
+            # Walking the local environment is expensive. it isn't
+            # supposed to change while processing.
+            if self._local_revision is None:
+                self._local_revision = 'local-' + local_fingerprint()
+            return self._local_revision
+        if self._image_id is not None:
+            image_id = self._image_id()
+            if image_id is None:
+                raise RuntimeError(f'No images available: {self._repo}')
+            return image_id
+        if self._backend == 'api':
+            # podmanapi depends on this module
+            from fontquery.podmanapi import ApiContainerImage
+            image_id = ApiContainerImage.client().image_id(self._repo)
+            if image_id is None:
+                raise RuntimeError(f'No images available: {self._repo}')
+            return image_id
         res = subprocess.run(
             ['podman', 'images', '-a', '--no-trunc', '--format', '{{.ID}}',
              self._repo],
@@ -47,21 +250,532 @@ class FontQueryCache:
             fn = self.filename
         except RuntimeError:
             return None
+        # Only the first lookup is counted. the entry is looked up again
+        # after waiting for others which may be filling it.
+        first = not self._looked_up
+        self._looked_up = True
         try:
-            return fn.read_text(encoding='utf-8')
+            retval = fn.read_text(encoding='utf-8')
         except FileNotFoundError:
+            if first:
+                self._record('miss')
             return None
+        if first:
+            self._record('hit')
+        return retval
+
+    def _record(self, counter: str) -> None:
+        """Count up the cache statistics"""
+        with self._stats_lock:
+            if not FontQueryCache._stats_registered:
+                atexit.register(FontQueryCache.flush_stats)
+                FontQueryCache._stats_registered = True
+            ent = FontQueryCache._stats.setdefault(
+                self._base_cachedir, {}).setdefault(self._cachedir.name, {})
+            ent[counter] = ent.get(counter, 0) + 1
+
+    @classmethod
+    def flush_stats(cls) -> None:
+        """Merge the statistics counted so far into the file"""
+        with cls._stats_lock:
+            pending, cls._stats = cls._stats, {}
+        for base, counters in pending.items():
+            stats = Path(base) / STATS_FILE
+            try:
+                with open(stats.with_suffix('.lock'), 'a',
+                          encoding='utf-8') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        data = json.loads(stats.read_text(encoding='utf-8'))
+                    except (OSError, ValueError):
+                        data = {}
+                    for key, ent in counters.items():
+                        d = data.setdefault(key, {})
+                        for counter, n in ent.items():
+                            d[counter] = d.get(counter, 0) + n
+                    write_atomic(stats,
+                                 json.dumps(data, indent=4).encode('utf-8'))
+            except OSError:
+                pass
+
+    @contextlib.contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold an advisory lock on the current entry.
+
+        Processes which miss the same entry are serialized here so that
+        only one of them runs a container to fill it.
+        """
+        try:
+            fn = self.filename
+        except RuntimeError:
+            yield
+            return
+        with open(fn.with_suffix('.lock'), 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
 
     def save(self, s: str) -> bool:
         try:
             fn = self.filename
         except RuntimeError:
             return False
-        fn.write_text(s, encoding='utf-8')
-        return True
+        return self._write(fn, s.encode('utf-8'))
+
+    def _lookup(self, verbose: int) -> Optional[str]:
+        if verbose:
+            print('* Reading JSON from cache', file=sys.stderr)
+        return self.read()
+
+    def _store(self, out: Optional[str], verbose: int) -> None:
+        if not out:
+            return
+        if verbose:
+            print('* Storing cache...', file=sys.stderr, end='')
+        if self.save(out):
+            if verbose:
+                print('done', file=sys.stderr)
+        else:
+            if verbose:
+                print('failed', file=sys.stderr)
+
+    def get_or_compute(self, fn: Callable[[], Optional[str]],
+                       enabled: bool = True, verbose: int = 0) -> Optional[str]:
+        """Read the current entry or store what fn returns.
+
+        fn is called with the lock held so that processes missing the same
+        entry don't compute it at once. It is simply called if enabled is
+        False.
+        """
+        if not enabled:
+            return fn()
+        out = self._lookup(verbose)
+        if out:
+            return out
+        with self.lock():
+            # Someone else may have stored it while we were waiting
+            out = self.read()
+            if not out:
+                out = fn()
+                self._store(out, verbose)
+        return out
+
+    async def aget_or_compute(self, fn: Callable[[], Awaitable[Optional[str]]],
+                              enabled: bool = True,
+                              verbose: int = 0) -> Optional[str]:
+        """Same as get_or_compute() but for a coroutine function."""
+        if not enabled:
+            return await fn()
+        out = self._lookup(verbose)
+        if out:
+            return out
+        with contextlib.ExitStack() as stack:
+            # Wait for the lock without blocking others in the event loop
+            await asyncio.to_thread(stack.enter_context, self.lock())
+            # Someone else may have stored it while we were waiting
+            out = self.read()
+            if not out:
+                out = await fn()
+                self._store(out, verbose)
+        return out
+
+    def _write(self, fn: Path, data: bytes) -> bool:
+        return write_atomic(fn, data)
+
+    def _index_filename(self, ignore_file: bool, ignore_flag: bool) -> Path:
+        fn = self.filename
+        return fn.with_name(f'{fn.stem}.{int(ignore_file)}{int(ignore_flag)}'
+                            '.idx')
+
+    def read_index(self, ignore_file: bool, ignore_flag: bool) -> Optional[dict[str, Any]]:
+        """Read the data restructured by htmlformatter.json2index()"""
+        try:
+            fn = self._index_filename(ignore_file, ignore_flag)
+        except RuntimeError:
+            return None
+        try:
+            with open(fn, 'rb') as f:
+                fmt, ver, data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            fmt = ver = None
+        if fmt != INDEX_FORMAT or ver != FQ_VERSION:
+            self._record('index_miss')
+            return None
+        self._record('index_hit')
+        return data
+
+    def save_index(self, data: dict[str, Any], ignore_file: bool, ignore_flag: bool) -> bool:
+        """Store the data restructured by htmlformatter.json2index()"""
+        try:
+            fn = self._index_filename(ignore_file, ignore_flag)
+        except RuntimeError:
+            return False
+        return self._write(fn, marshal.dumps((INDEX_FORMAT, FQ_VERSION,
+                                              data)))
 
     def delete(self) -> None:
         try:
-            self.filename.unlink(missing_ok=True)
+            fn = self.filename
         except RuntimeError:
-            pass
+            return
+        fn.unlink(missing_ok=True)
+        for idx in fn.parent.glob(f'{glob.escape(fn.stem)}.*.idx'):
+            idx.unlink(missing_ok=True)
+
+
+def export_bundle(keys: List[Tuple[str, str, str]], path: str) -> int:
+    """Export entries for (product, release, target) keys into an archive.
+
+    All the JSON entries bound to the image currently available on local
+    are exported, including the results after installing packages.
+    Returns the number of entries exported.
+    """
+    entries = []
+    with tarfile.open(path, 'w:gz') as tar:
+        for product, release, target in keys:
+            if release == 'local':
+                print('Warning: entries for local can not be exported',
+                      file=sys.stderr)
+                continue
+            fqc = FontQueryCache(product, release, target)
+            try:
+                image_id = fqc.revision
+            except RuntimeError as e:
+                print(f'Warning: {e}', file=sys.stderr)
+                continue
+            for fn in sorted(fqc._cachedir.glob(f'{glob.escape(image_id)}'
+                                                '*.json')):
+                data = fn.read_bytes()
+                arcname = f'{fqc._cachedir.name}/{fn.name}'
+                tar.add(fn, arcname=arcname)
+                entries.append({
+                    'product': product,
+                    'release': release,
+                    'target': target,
+                    'image_id': image_id,
+                    'file': arcname,
+                    'sha256': hashlib.sha256(data).hexdigest(),
+                })
+        manifest = json.dumps({
+            'format': BUNDLE_FORMAT,
+            'fq_version': FQ_VERSION,
+            'entries': entries,
+        }, indent=4).encode('utf-8')
+        info = tarfile.TarInfo('manifest.json')
+        info.size = len(manifest)
+        tar.addfile(info, io.BytesIO(manifest))
+
+    return len(entries)
+
+
+def import_bundle(path: str) -> int:
+    """Merge entries in an archive made by export_bundle into the cache.
+
+    Entries are validated against the manifest and skipped if the image
+    available on local has a different ID.
+    Returns the number of entries imported.
+    """
+    count = 0
+    with tarfile.open(path, 'r:*') as tar:
+        try:
+            manifest = json.load(tar.extractfile('manifest.json'))
+        except (KeyError, ValueError) as e:
+            raise RuntimeError(f'Invalid cache bundle: {path}') from e
+        if manifest.get('format') != BUNDLE_FORMAT:
+            raise RuntimeError('Unsupported cache bundle format: '
+                               f'{manifest.get("format")}')
+        for ent in manifest['entries']:
+            image_id = ent['image_id']
+            name = Path(ent['file']).name
+            # Keys are part of the path to store entries
+            if ent.get('product') not in PRODUCTS or\
+               not isinstance(ent.get('release'), str) or\
+               not RELEASE_RE.fullmatch(ent['release']) or\
+               ent['release'] == 'local' or\
+               not isinstance(ent.get('target'), str) or\
+               not TARGET_RE.fullmatch(ent['target']):
+                print(f'Warning: Invalid key: {ent["file"]}',
+                      file=sys.stderr)
+                continue
+            if not re.fullmatch(r'(sha256:)?[0-9a-f]{64}', image_id) or\
+               not re.fullmatch(re.escape(image_id) + r'(-[0-9a-f]{64})?\.json',
+                                name):
+                print(f'Warning: Invalid entry: {ent["file"]}',
+                      file=sys.stderr)
+                continue
+            try:
+                data = tar.extractfile(ent['file']).read()
+            except (KeyError, AttributeError):
+                print(f'Warning: Missing entry: {ent["file"]}',
+                      file=sys.stderr)
+                continue
+            if hashlib.sha256(data).hexdigest() != ent['sha256']:
+                print(f'Warning: Checksum mismatch: {ent["file"]}',
+                      file=sys.stderr)
+                continue
+            try:
+                json.loads(data)
+            except ValueError:
+                print(f'Warning: Broken entry: {ent["file"]}',
+                      file=sys.stderr)
+                continue
+            fqc = FontQueryCache(ent['product'], ent['release'],
+                                 ent['target'])
+            try:
+                local_id = fqc.revision
+            except RuntimeError:
+                # Not pulled yet. it will be used once the same image is
+                # pulled.
+                local_id = image_id
+            if local_id != image_id:
+                print(f'Warning: {ent["file"]} is for {image_id} but '
+                      f'{local_id} is available on local. skipping',
+                      file=sys.stderr)
+                continue
+            if fqc._write(fqc._cachedir / name, data):
+                count += 1
+
+    return count
+
+
+def _split_key(name: str) -> Tuple[str, str, str]:
+    m = KEY_RE.fullmatch(name)
+    if not m:
+        raise ValueError(f'Invalid key: {name}')
+    return m.group(1), m.group(2), m.group(3)
+
+
+def _entries(base: Path, args: argparse.Namespace) -> Iterator[Tuple[Path, FontQueryCache]]:
+    for d in sorted(p for p in base.iterdir() if p.is_dir()):
+        try:
+            product, release, target = _split_key(d.name)
+        except ValueError:
+            continue
+        if (args.product and product not in args.product) or\
+           (args.release and release not in args.release) or\
+           (args.target and target not in args.target):
+            continue
+        yield d, FontQueryCache(product, release, target)
+
+
+def _current(fqc: FontQueryCache) -> Optional[str]:
+    try:
+        return fqc.revision
+    except (RuntimeError, OSError):
+        return None
+
+
+def _format_size(size: int) -> str:
+    for unit in ['B', 'KiB', 'MiB']:
+        if size < 1024:
+            return f'{size}{unit}'
+        size = size // 1024
+    return f'{size}GiB'
+
+
+def _format_age(sec: float) -> str:
+    for unit, n in [('d', 86400), ('h', 3600), ('m', 60)]:
+        if sec >= n:
+            return f'{int(sec // n)}{unit}'
+    return f'{int(sec)}s'
+
+
+def do_list(base: Path, args: argparse.Namespace) -> int:
+    now = time.time()
+    print('KEY\tIMAGE ID\tVARIANT\tSIZE\tAGE\tSTATUS')
+    for d, fqc in _entries(base, args):
+        cur = _current(fqc)
+        for fn in sorted(d.glob('*.json')):
+            m = ENTRY_RE.fullmatch(fn.name)
+            if not m:
+                continue
+            st = fn.stat()
+            if cur is None:
+                status = '-'
+            else:
+                status = 'current' if m.group('id') == cur else 'stale'
+            print(f'{d.name}\t{m.group("id")}\t{m.group("variant") or "-"}\t'
+                  f'{_format_size(st.st_size)}\t'
+                  f'{_format_age(now - st.st_mtime)}\t{status}')
+    return 0
+
+
+def do_stats(base: Path, args: argparse.Namespace) -> int:
+    stats = base / STATS_FILE
+    if args.reset:
+        stats.unlink(missing_ok=True)
+        return 0
+    try:
+        data = json.loads(stats.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        data = {}
+    print('KEY\tENTRIES\tSIZE\tHIT\tMISS\tRATIO\tINDEX HIT\tINDEX MISS')
+    for d, _ in _entries(base, args):
+        ent = data.get(d.name, {})
+        files = list(d.glob('*.json'))
+        size = sum(f.stat().st_size for f in d.iterdir() if f.is_file())
+        hit = ent.get('hit', 0)
+        miss = ent.get('miss', 0)
+        ratio = f'{hit * 100 // (hit + miss)}%' if hit + miss else '-'
+        print(f'{d.name}\t{len(files)}\t{_format_size(size)}\t{hit}\t{miss}\t'
+              f'{ratio}\t{ent.get("index_hit", 0)}\t'
+              f'{ent.get("index_miss", 0)}')
+    return 0
+
+
+def _entry_id(fn: Path) -> Optional[str]:
+    """Image ID which an entry, an index or a lock file belongs to"""
+    m = ENTRY_RE.fullmatch(fn.name.split('.', 1)[0] + '.json')
+    return m.group('id') if m else None
+
+
+def do_prune(base: Path, args: argparse.Namespace) -> int:
+    now = time.time()
+    for d, fqc in _entries(base, args):
+        cur = _current(fqc) if args.stale else None
+        for fn in sorted(d.iterdir()):
+            image_id = _entry_id(fn)
+            age = now - fn.stat().st_mtime
+            if fn.name.startswith('.') and fn.suffix == '.tmp':
+                # Left over by an interrupted writer
+                remove = age > 3600
+            elif image_id is None:
+                remove = False
+            elif args.max_age is not None and age > args.max_age * 86400 and\
+                 fn.suffix != '.lock':
+                # Lock files are never updated even while they are in use
+                remove = True
+            else:
+                remove = args.stale and cur is not None and image_id != cur
+            if remove:
+                print(f'* Removing {d.name}/{fn.name}', file=sys.stderr)
+                if not args.try_run:
+                    fn.unlink(missing_ok=True)
+    return 0
+
+
+def do_verify(base: Path, args: argparse.Namespace) -> int:
+    retval = 0
+    for d, _ in _entries(base, args):
+        for fn in sorted(d.iterdir()):
+            try:
+                if fn.suffix == '.json':
+                    data = json.loads(fn.read_text(encoding='utf-8'))
+                    if not isinstance(data, dict) or 'fonts' not in data:
+                        raise ValueError('no fonts')
+                elif fn.suffix == '.idx':
+                    with open(fn, 'rb') as f:
+                        marshal.load(f)
+                else:
+                    continue
+            except (OSError, EOFError, ValueError, TypeError) as e:
+                print(f'{d.name}/{fn.name}: broken ({e})')
+                retval = 1
+                if args.fix:
+                    fn.unlink(missing_ok=True)
+    return retval
+
+
+def do_warm(base: Path, args: argparse.Namespace) -> int:
+    from fontquery import utils
+    from fontquery.container import ContainerImage
+
+    ContainerImage.sysroot = args.sysroot
+    variant = sysroot_variant() if args.sysroot else None
+    retval = 0
+    for product in args.product or ['fedora']:
+        for release in args.release or ['rawhide']:
+            for target in args.target or ['minimal']:
+                key = f'{product}-{release}-{target}'
+                fqc = FontQueryCache(product, release, target, variant)
+                c = ContainerImage(product,
+                                   utils.normalize_release(release, product),
+                                   args.verbose)
+                c.target = target
+                # Don't let one image abort the others
+                try:
+                    if not c.pull():
+                        raise RuntimeError('Unable to pull the image')
+                    with fqc.lock():
+                        if fqc.read():
+                            continue
+                        print(f'* Warming {key}', file=sys.stderr)
+                        out = c.get_json(lang=None, verbose=args.verbose)
+                        if not out:
+                            raise RuntimeError('No results from the query')
+                        if not fqc.save(out):
+                            raise RuntimeError('Unable to store the result')
+                except RuntimeError as e:
+                    print(f'** {key}: {e}', file=sys.stderr)
+                    retval = 1
+    return retval
+
+
+def main():
+    """Endpoint to execute fontquery-cache program."""
+    parser = argparse.ArgumentParser(
+        description='Inspect and maintain caches for fontquery',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-P', '--product',
+                        action='append',
+                        choices=PRODUCTS,
+                        help='Product name to operate')
+    parser.add_argument('-r', '--release',
+                        action='append',
+                        help='Release to operate')
+    parser.add_argument('-t', '--target',
+                        action='append',
+                        choices=TARGETS,
+                        help='Target to operate')
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='count',
+                        default=0,
+                        help='Show more detailed logs')
+    parser.add_argument('-V',
+                        '--version',
+                        action='store_true',
+                        help='Show version')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('list', help='List cache entries')
+    p = sub.add_parser('stats', help='Show hit/miss statistics')
+    p.add_argument('--reset', action='store_true',
+                   help='Reset statistics')
+    p = sub.add_parser('prune', help='Remove old cache entries')
+    p.add_argument('--max-age', type=int, metavar='DAYS',
+                   help='Remove entries older than DAYS')
+    p.add_argument('--stale', action='store_true',
+                   help='Remove entries not for images available on local')
+    p.add_argument('--try-run', action='store_true',
+                   help='Do not take any actions')
+    p = sub.add_parser('verify', help='Check cache entries')
+    p.add_argument('--fix', action='store_true',
+                   help='Remove broken entries')
+    p = sub.add_parser('warm', help='Fill caches for given images. '
+                       'use -t <target>-slim for slim images')
+    p.add_argument('--sysroot', action='store_true',
+                   help='Fill caches for queries with --sysroot')
+
+    args = parser.parse_args()
+    if args.version:
+        print(FQ_VERSION)
+        sys.exit(0)
+
+    base = Path(BaseDirectory.save_cache_path('fontquery'))
+    cmd = {
+        'list': do_list,
+        'stats': do_stats,
+        'prune': do_prune,
+        'verify': do_verify,
+        'warm': do_warm,
+    }
+    if args.command is None:
+        parser.print_help()
+        sys.exit(1)
+    sys.exit(cmd[args.command](base, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -26,14 +26,16 @@
 import argparse
 import csv
 import json
+import os
 import re
 import shutil
 import subprocess
 import sys
 import types
+import xml.etree.ElementTree as ET
 from collections import Counter
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Set
 import langtable
 try:
     import fontquery_debug  # noqa: F401
@@ -45,6 +47,12 @@ try:
     from pyanaconda import localization
     defaultLangList = list(localization.get_available_translations())
 except ModuleNotFoundError:
+    defaultLangList = []
+# Snapshot of the list above in images without anaconda
+LANGS_FILE = Path('/etc/fontquery/langs')
+if not defaultLangList and LANGS_FILE.exists():
+    defaultLangList = LANGS_FILE.read_text(encoding='utf-8').split()
+if not defaultLangList:
     defaultLangList = [
         'aa', 'ab', 'af', 'ak', 'am', 'an', 'ar', 'as', 'ast', 'av', 'ay',
         'az_az', 'az_ir', 'ba', 'be', 'ber_dz', 'ber_ma', 'bg', 'bh', 'bho',
@@ -84,7 +92,7 @@ def get_version(os_release: Dict[str, str]) -> str:
 
 def dump(params: argparse.Namespace) -> str:
     """Dump fontquery result in JSON."""
-    p = Path('/etc/os-release')
+    p = Path(params.sysroot or '/') / 'etc/os-release'
     with open(p, encoding='utf-8') as f:
         reader = csv.reader(f, delimiter='=')
         os_release = dict(reader)
@@ -198,6 +206,101 @@ def fcmatchaliases(params: object) -> str:
     return "\n".join(results)
 
 
+def langs(params: argparse.Namespace) -> str:
+    """Show languages to dump fonts data into JSON"""
+    return '\n'.join(params.lang)
+
+
+FONT_SUFFIXES = ('.ttf', '.otf', '.ttc', '.otc', '.pfa', '.pfb', '.pcf',
+                 '.pcf.gz', '.woff', '.woff2', '.dfont')
+FONTCONFIG_DIRS = ('/etc/fonts/', '/usr/share/fontconfig/')
+
+
+def _installed_files(packages: List[str]) -> List[str]:
+    """Files of installed packages which have the same name as the package files"""
+    files = [
+        str(Path('/var/tmp/fontquery') / p) if not Path(p).is_absolute() else p
+        for p in packages
+    ]
+    res = subprocess.run(['rpm', '-qp', '--qf', '%{NAME}\n'] + files,
+                         capture_output=True, check=False)
+    names = res.stdout.decode('utf-8').split()
+    if res.returncode != 0 or not names:
+        print('Unable to get package names: '
+              f'{res.stderr.decode("utf-8")}', file=sys.stderr)
+        sys.exit(1)
+    # Not installed packages are reported in stdout without a path
+    res = subprocess.run(['rpm', '-ql'] + names, capture_output=True,
+                         check=False)
+    return [f for f in res.stdout.decode('utf-8').splitlines()
+            if f.startswith('/')]
+
+
+def _conf_langs(fn: str) -> Optional[Set[str]]:
+    """Languages tested in a fontconfig config. None if not parsable"""
+    try:
+        root = ET.parse(fn).getroot()
+    except (ET.ParseError, OSError):
+        return None
+    langs = set()
+    for e in root.iter():
+        if e.tag in ('test', 'patelt') and e.get('name') == 'lang':
+            langs |= {s.text.strip().lower().replace('_', '-')
+                      for s in e.iter('string') if s.text}
+    return langs
+
+
+def affected(params: argparse.Namespace) -> str:
+    """Show languages affected by installed packages.
+
+    Packages are the ones installed under the same names as the given
+    package files. Languages are what fonts in the packages cover
+    and what fontconfig configs in the packages test. '*' is shown
+    if it can't be determined, i.e. any configs in the packages have
+    rules not limited to languages.
+    """
+    if not shutil.which('fc-query'):
+        print('fc-query is not installed', file=sys.stderr)
+        sys.exit(1)
+    covered: Set[str] = set()
+    tested: Set[str] = set()
+    for f in _installed_files(params.args):
+        if f.endswith(FONT_SUFFIXES) and Path(f).is_file():
+            res = subprocess.run(['fc-query', '-f', '%{lang}\n', f],
+                                 capture_output=True, check=False)
+            for ls in res.stdout.decode('utf-8').split():
+                covered |= set(ls.split('|'))
+        elif f.startswith(FONTCONFIG_DIRS) and f.endswith('.conf') and \
+             Path(f).is_file():
+            ll = _conf_langs(f)
+            if not ll:
+                # Rules not limited to any languages, e.g. aliases, may
+                # change results for any languages with any fonts
+                return '*'
+            tested |= ll
+    result = []
+    for ls in params.lang:
+        ll = ls.replace('_', '-').lower()
+        if ll in covered or any(ll == t or ll.startswith(t + '-')
+                                for t in tested):
+            result.append(ls)
+
+    return '\n'.join(result)
+
+
+def packages(params: argparse.Namespace) -> str:
+    """Show installed packages in NEVRA."""
+    res = subprocess.run(Font2Package.rpm_cmdline(
+        '-qa', '--qf', '%{NAME}-%{EPOCHNUM}:%{VERSION}-%{RELEASE}.%{ARCH}\n'),
+                         capture_output=True, check=False)
+    if res.returncode != 0:
+        print('Unable to get installed packages', file=sys.stderr)
+        sys.exit(1)
+    # Skip pseudo packages like gpg-pubkey
+    return '\n'.join(sorted(s for s in res.stdout.decode('utf-8').split()
+                            if not s.endswith('.(none)')))
+
+
 def checkupdate(params: object) -> None:
     if not shutil.which('fontquery-setup.sh'):
         print('fontquery-setup.sh is not installed')
@@ -243,6 +346,9 @@ def main():
              'fclist': 'fc-list',
              'fcmatchaliases': fcmatchaliases,
              'json': dump,
+             'langs': langs,
+             'affected': affected,
+             'packages': packages,
              'update': update,
              'checkupdate': checkupdate,
              'install': install,
@@ -253,17 +359,24 @@ def main():
         'ps_pk', 'ti_er', 'ti_et', 'und_zmth', 'und_zsye', 'zh_cn', 'zh_hk',
         'zh_mo', 'zh_sg', 'zh_tw'
     ]
+    # Modes which don't modify the system and can run against --sysroot
+    sysroot_modes = ['fcmatch', 'fclist', 'fcmatchaliases', 'json', 'langs',
+                     'packages']
     families = ['sans-serif', 'serif', 'monospace', 'system-ui']
-    fclangs = []
-    for lang in defaultLangList:
-        added = False
-        for ls in fclang_ll_cc:
-            ll = re.sub('_.*', '', ls)
-            if lang == ll:
-                fclangs.append(ls.replace('_', '-'))
-                added = True
-        if not added:
-            fclangs.append(lang)
+
+    def to_fclangs(langlist: List[str]) -> List[str]:
+        retval = []
+        for lang in langlist:
+            added = False
+            for ls in fclang_ll_cc:
+                ll = re.sub('_.*', '', ls)
+                if lang == ll:
+                    retval.append(ls.replace('_', '-'))
+                    added = True
+            if not added:
+                retval.append(lang)
+        return retval
+    fclangs = to_fclangs(defaultLangList)
 
     parser = argparse.ArgumentParser(
         description='Query fonts',
@@ -287,6 +400,9 @@ def main():
     parser.add_argument('-p',
                         '--pattern',
                         help='Query pattern to identify fonts data into JSON')
+    parser.add_argument('--sysroot',
+                        help='Query the system at SYSROOT, e.g. a mounted '
+                        'image, with fontconfig on this system')
     parser.add_argument('-V',
                         '--version',
                         action='store_true',
@@ -308,7 +424,22 @@ def main():
     ll = Counter(args.lang)
     ll.subtract(fclangs)
     langlist = list(ll.elements())
+    if args.sysroot:
+        if args.mode not in sysroot_modes:
+            print(f'{args.mode} mode is not supported with --sysroot',
+                  file=sys.stderr)
+            sys.exit(1)
+        os.environ['FONTCONFIG_SYSROOT'] = args.sysroot
+        Font2Package.root = args.sysroot
+        # Use languages the client in the system would use
+        fn = Path(args.sysroot) / LANGS_FILE.relative_to('/')
+        if fn.exists():
+            fclangs = to_fclangs(fn.read_text(encoding='utf-8').split())
     args.lang = langlist if langlist else fclangs
+    ff = Counter(args.family)
+    ff.subtract(families)
+    familylist = list(ff.elements())
+    args.family = familylist if familylist else families
     if isinstance(fccmd[args.mode], types.FunctionType):
         print(fccmd[args.mode](args))
     else:
@@ -23,19 +23,30 @@
 # PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 """Module to build a container image for fontquery."""
 
+import asyncio
+import atexit
+import concurrent.futures
 import contextlib
 import glob
 import sys
 import os
 import importlib.metadata
+import platform
 import re
 import subprocess
 import shutil
+import tarfile
 import tempfile
-from fontquery import utils  # noqa: F401
+import threading
+import time
+import uuid
+from enum import IntEnum
+from xdg import BaseDirectory
+from fontquery import rpmmd, utils  # noqa: F401
+from fontquery.registry import PullRecord, RegistryClient, split_reference
 from importlib.resources import files
 from pathlib import Path
-from typing import Iterator
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 try:
     FQ_SCRIPT_PATH = files('fontquery.scripts')
@@ -53,15 +64,196 @@ except ModuleNotFoundError:
     with open(tomlfile, 'r', encoding='utf-8') as f:
         FQ_VERSION = tomli.load(f)['project']['version']
 
+# Where dnf keeps metadata and packages in containers
+DNF_CACHE_DIRS = ['/var/cache/dnf', '/var/cache/libdnf5']
+POOL_LABEL = 'io.github.fedora-i18n.fontquery.pool'
+POOL_STAMP = '/var/tmp/fontquery-pool.stamp'
+# Keep a pooled container alive until nothing touches the stamp file
+# for the given seconds and no queries are running. A query leaves
+# its PID in a marker file while running. Markers of queries which
+# have gone away without cleaning up are ignored.
+POOL_WATCHDOG = ('touch {stamp}; '
+                 'while :; do busy=; '
+                 'for f in {stamp}.*; do '
+                 '[ -e "$f" ] && kill -0 "${{f##*.}}" 2> /dev/null && busy=1; '
+                 'done; '
+                 '[ -n "$busy" ] || [ $(($(date +%s) - $(stat -c %Y {stamp}))) '
+                 '-lt {timeout} ] || break; sleep {interval}; done')
+# Run a query in a pooled container, marked as running
+POOL_EXEC = ('touch {stamp}; : > {stamp}.$$; "$@"; rc=$?; '
+             'rm -f {stamp}.$$; touch {stamp}; exit $rc')
+
+
+class UpdateStatus(IntEnum):
+    """Result of ContainerImage.update(). Only FAILED is false"""
+    FAILED = 0
+    UPDATED = 1
+    UP_TO_DATE = 2
+
+
+# Mount an image, run fontquery-client on the host against it and
+# unmount it. The exit code is the client's, or 125 if not mounted.
+SYSROOT_SCRIPT = ('img=$1; shift; '
+                  'mnt=$(podman image mount "$img") || exit 125; '
+                  'trap \'podman image unmount "$img" > /dev/null\' EXIT; '
+                  'py=$1; client=$2; shift 2; '
+                  '"$py" "$client" --sysroot "$mnt" "$@"')
+
+
+def session_name() -> str:
+    """Unique name for a container"""
+    return f'fontquery-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+def full_image_id(image_id: str) -> str:
+    """Image ID in the same form as `podman images --no-trunc'"""
+    return image_id if image_id.startswith('sha256:') else \
+        'sha256:' + image_id
+
+
+def write_tarball(fp, files: List[str], progress: 'CopyProgress') -> None:
+    """Write files into fp as a tar stream"""
+    # Stream a tarball to not touch the container storage
+    # on the host side.
+    with tarfile.open(fileobj=fp, mode='w|') as tar:
+        for f in files:
+            info = tar.gettarinfo(f, arcname=Path(f).name)
+            info.uid = info.gid = 0
+            info.uname = info.gname = 'root'
+            with open(f, 'rb') as fr:
+                tar.addfile(info, progress.wrap(fr))
+
+
+class CopyProgress:
+    """Report progress of copying files"""
+
+    def __init__(self, total: int, out=sys.stderr):
+        self._total = total
+        self._done = 0
+        self._percent = -1
+        self._out = out
+
+    def wrap(self, fp):
+        """Wrap a file object to count bytes read from it"""
+        progress = self
+
+        class Reader:
+            def read(self, size=-1):
+                data = fp.read(size)
+                progress.update(len(data))
+                return data
+        return Reader()
+
+    def update(self, n: int) -> None:
+        self._done += n
+        percent = self._done * 100 // self._total if self._total else 100
+        if percent != self._percent and self._out.isatty():
+            self._percent = percent
+            print(f'\r  {self._done / 1048576:.1f}/'
+                  f'{self._total / 1048576:.1f} MiB ({percent}%)',
+                  file=self._out, end='', flush=True)
+
+    def done(self) -> None:
+        if self._percent >= 0:
+            print('', file=self._out)
+        self._percent = -1
+
+
+class StageTimer:
+    """Track time spent in each stage from the output of buildah build"""
+
+    STEP = re.compile(r'^\[(\d+)/\d+\] STEP \d+/\d+: (.*)$')
+    FROM = re.compile(r'^FROM\s+\S+(?:\s+AS\s+(\S+))?', re.IGNORECASE)
+
+    def __init__(self) -> None:
+        self.stages: List[Dict[str, Any]] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Start tracking another build"""
+        self._pass: List[Dict[str, Any]] = []
+        self._pending = False
+        self.executed = 0
+
+    def _close_step(self) -> None:
+        if self._pending:
+            self._pass[-1]['executed'] += 1
+            self.executed += 1
+        self._pending = False
+
+    def feed(self, line: str, now: Optional[float] = None) -> None:
+        """Take a line of the output"""
+        now = time.monotonic() if now is None else now
+        line = line.strip()
+        m = self.STEP.match(line)
+        if m:
+            self._close_step()
+            if not self._pass or self._pass[-1]['index'] != m.group(1):
+                if self._pass:
+                    self._pass[-1]['end'] = now
+                f = self.FROM.match(m.group(2))
+                self._pass.append({'index': m.group(1),
+                                   'name': (f and f.group(1)) or m.group(1),
+                                   'start': now, 'end': now,
+                                   'steps': 0, 'executed': 0})
+            # Only steps which make layers may be cached
+            self._pending = re.match(r'(RUN|COPY|ADD)\s',
+                                     m.group(2)) is not None
+            if self._pending:
+                self._pass[-1]['steps'] += 1
+        elif line.startswith('--> Using cache'):
+            self._pending = False
+
+    def finish(self, target: Optional[str] = None,
+               now: Optional[float] = None) -> None:
+        """Finish a build. stages are recorded if target is given"""
+        self._close_step()
+        if self._pass:
+            self._pass[-1]['end'] = time.monotonic() if now is None else now
+        if target is not None:
+            self.stages = self._pass
+
+    def report(self, out=None) -> None:
+        """Show time spent in each stage"""
+        if not self.stages:
+            return
+        out = out or sys.stderr
+        print('* Time spent in each stage:', file=out)
+        width = max(len(s['name']) for s in self.stages)
+        for s in self.stages:
+            cached = s['steps'] - s['executed']
+            print(f'  {s["name"]:<{width}}  {s["end"] - s["start"]:8.1f}s'
+                  f'  ({s["steps"]} step(s), {cached} cached)', file=out)
+
 
 class ContainerImage:
     """Container helper"""
 
+    # State of images known in this process, keyed by the full image name.
+    # This is used to avoid pulling and probing the same image repeatedly.
+    _image_state: Dict[str, Dict[str, Any]] = {}
+    _image_state_lock = threading.Lock()
+    # Locks to not pull the same image from multiple threads at once
+    _pull_locks: Dict[str, threading.Lock] = {}
+    # URL of the registry API. None to derive it from the image name.
+    registry_url: Optional[str] = None
+    # Seconds to keep a pooled container without any queries.
+    # 0 to disable the pool and run a container per query.
+    pool_timeout: int = 0
+    # Leave pooled containers created by this process running at exit
+    # so that other processes can reuse them until the idle timeout.
+    pool_keep: bool = False
+    _pool_owned: List[str] = []
+    # Query images mounted on the host with fontquery-client on the host
+    # instead of running containers. fontconfig on the host is used.
+    sysroot: bool = False
+
     def __init__(self, product: str, version: str, verbose: bool = False):
         self.__product = product
         self.__version = version
         self.__target = None
         self.__verbose = verbose
+        self.__pull_ttl = 0
         if product == 'fedora':
             if version == 'eln':
                 self.__registry = 'quay.io/fedoraci/fedora'
@@ -90,41 +282,179 @@ class ContainerImage:
     def target(self, v: str) -> None:
         self.__target = v
 
+    @property
+    def slim(self) -> bool:
+        """Whether the image has only what queries need"""
+        return bool(self.__target) and \
+            self.__target.endswith(utils.SLIM_SUFFIX)
+
+    @property
+    def pattern(self) -> str:
+        """Target which the image has fonts for"""
+        if self.slim:
+            return self.__target[:-len(utils.SLIM_SUFFIX)]
+        return self.__target
+
+    def _ensure_writable(self) -> None:
+        if self.slim:
+            raise RuntimeError('Slim images are only for queries: '
+                               f'{self._get_namespace()}')
+
+    @property
+    def verbose(self) -> bool:
+        return self.__verbose
+
+    @property
+    def pull_ttl(self) -> int:
+        """Seconds to skip pulling since the last pull"""
+        return self.__pull_ttl
+
+    @pull_ttl.setter
+    def pull_ttl(self, v: int) -> None:
+        self.__pull_ttl = v
+
+    def _get_state(self, key: str) -> Any:
+        with self._image_state_lock:
+            return self._image_state.get(self._get_fullnamespace(),
+                                         {}).get(key)
+
+    def _set_state(self, **kwargs) -> None:
+        with self._image_state_lock:
+            self._image_state.setdefault(self._get_fullnamespace(),
+                                         {}).update(kwargs)
+
+    def image_id(self) -> Optional[str]:
+        """ID of the image on local.
+
+        The ID known from the last pull in this process is reused. It is
+        looked up once otherwise.
+        """
+        image_id = self._get_state('image_id')
+        if image_id is None:
+            image_id = self._local_image_id()
+            if image_id is None:
+                return None
+            self._set_state(image_id=image_id)
+        return full_image_id(image_id)
+
     def exists(self, remote=True) -> bool:
         """Whether the image is available or not"""
+        if self._get_state('pulled') or \
+           (not remote and self._get_state('local')):
+            return True
         if not remote:
-            cmdline = [
-                'buildah', 'images', self._get_fullnamespace()
-            ]
+            if not self._has_image():
+                return False
+            self._set_state(local=True)
         else:
-            cmdline = [
-                'buildah', 'pull', self._get_fullnamespace()
-            ]
+            image_id = self._fetch_image('buildah')
+            if image_id is None:
+                return False
+            self._set_state(pulled=True, local=True, image_id=image_id)
+        return True
+
+    def _has_image(self) -> bool:
+        """Whether the image is on local storage"""
+        cmdline = [
+            'buildah', 'images', self._get_fullnamespace()
+        ]
         if self.__verbose:
             print('# ' + ' '.join(cmdline), file=sys.stderr)
-        try:
-            subprocess.run(cmdline, capture_output=True, check=True)
-        except subprocess.CalledProcessError:
-            return False
-        return True
+        res = subprocess.run(cmdline, capture_output=True, check=False)
+        return res.returncode == 0
 
-    def pull(self, *args, **kwargs) -> bool:
-        cmdline = ['podman', 'pull', self._get_fullnamespace()]
+    def _fetch_image(self, tool: str = 'podman') -> Optional[str]:
+        """Pull the image and return its ID, or None on failure"""
+        cmdline = [tool, 'pull', self._get_fullnamespace()]
         if self.__verbose:
             print('# ' + ' '.join(cmdline), file=sys.stderr)
-        if not kwargs.get('try_run', False):
-            ret = subprocess.run(cmdline, capture_output=True, check=False)
-            return ret.returncode == 0
-        return True
+        res = subprocess.run(cmdline, capture_output=True, check=False)
+        if res.returncode != 0:
+            return None
+        return res.stdout.decode('utf-8').strip()
 
-    def build(self, *args, **kwargs) -> bool:
-        """Build an image"""
-        retval = True
-        if self.exists(remote=False):
-            print(f'Warning: {self._get_namespace()} is already'
-                  ' available on local. '
-                  'You may want to remove older images manually.',
-                  file=sys.stderr)
+    def _get_local_digests(self) -> List[str]:
+        """Manifest digests of the image on local"""
+        cmdline = [
+            'podman', 'image', 'inspect', '--format',
+            '{{.Digest}} {{join .RepoDigests " "}}',
+            self._get_fullnamespace()
+        ]
+        res = subprocess.run(cmdline, capture_output=True, check=False)
+        if res.returncode != 0:
+            return []
+        return [d.split('@')[-1] for d in res.stdout.decode('utf-8').split()]
+
+    def _is_up_to_date(self) -> bool:
+        """Whether the image on local doesn't need to be pulled"""
+        ref = self._get_fullnamespace()
+        record = PullRecord().get(ref)
+        if self.__pull_ttl > 0 and record and \
+           time.time() - record['time'] < self.__pull_ttl and \
+           self.exists(remote=False):
+            if self.__verbose:
+                print(f'# {ref} was pulled within {self.__pull_ttl} seconds',
+                      file=sys.stderr)
+            return True
+        local = self._get_local_digests()
+        if not local:
+            return False
+        registry, repo, tag = split_reference(ref)
+        client = RegistryClient(self.registry_url or f'https://{registry}')
+        remote = client.get_digest(repo, tag)
+        if remote and remote in local:
+            if self.__verbose:
+                print(f'# {ref} is up to date: {remote}', file=sys.stderr)
+            PullRecord().update(ref, remote)
+            return True
+        return False
+
+    def pull(self, *args, **kwargs) -> bool:
+        with self._image_state_lock:
+            lock = self._pull_locks.setdefault(self._get_fullnamespace(),
+                                               threading.Lock())
+        with lock:
+            if self._get_state('pulled'):
+                if self.__verbose:
+                    print(f'# {self._get_fullnamespace()} is already pulled',
+                          file=sys.stderr)
+                return True
+            cmdline = ['podman', 'pull', self._get_fullnamespace()]
+            if not kwargs.get('try_run', False):
+                if self._is_up_to_date():
+                    self._set_state(pulled=True, local=True)
+                    return True
+                image_id = self._fetch_image()
+                if image_id is not None:
+                    self._set_state(pulled=True, local=True, pool=None,
+                                    image_id=image_id)
+                    PullRecord().update(self._get_fullnamespace(), None)
+                return image_id is not None
+            if self.__verbose:
+                print('# ' + ' '.join(cmdline), file=sys.stderr)
+            return True
+
+    def dnf_cache_volumes(self, **kwargs) -> List[str]:
+        """Volumes to share the dnf cache on the host with containers.
+
+        The cache is shared between targets of the same product and
+        release. Nothing is shared if disable_dnf_cache is True.
+        """
+        if kwargs.get('disable_dnf_cache', False):
+            return []
+        base = Path(BaseDirectory.save_cache_path('fontquery')) / 'dnf' / \
+            f'{self.__product}-{self.__version}'
+        volumes = []
+        for d in DNF_CACHE_DIRS:
+            src = base / Path(d).name
+            if not kwargs.get('try_run', False):
+                src.mkdir(parents=True, exist_ok=True)
+            volumes.append(f'{src}:{d}:z')
+        return volumes
+
+    @contextlib.contextmanager
+    def _build_context(self, **kwargs) -> Iterator[Tuple[str, List[str]]]:
+        """Prepare a build context and the common buildah build options"""
         with tempfile.TemporaryDirectory() as tmpdir:
             abssetup = FQ_SCRIPT_PATH.joinpath('fontquery-setup.sh')
             setup = str(abssetup.name)
@@ -148,6 +478,21 @@ class ContainerImage:
                 '--build-arg', f'release={self.__version}',
                 '--build-arg', f'setup={setup}',
                 '--build-arg', f'dist={Path(dist).name}',
+            ]
+            for v in self.dnf_cache_volumes(**kwargs):
+                cmdline += ['-v', v]
+            yield tmpdir, cmdline
+
+    def build(self, *args, **kwargs) -> bool:
+        """Build an image"""
+        retval = True
+        if self.exists(remote=False):
+            print(f'Warning: {self._get_namespace()} is already'
+                  ' available on local. '
+                  'You may want to remove older images manually.',
+                  file=sys.stderr)
+        with self._build_context(**kwargs) as (tmpdir, cmdline):
+            cmdline += [
                 '--target', self.target, '-t',
                 f'ghcr.io/fedora-i18n/{self._get_namespace()}',
                 tmpdir
@@ -157,8 +502,63 @@ class ContainerImage:
             if not kwargs.get('try_run', False):
                 ret = subprocess.run(cmdline, cwd=tmpdir, check=False)
                 retval = ret.returncode == 0
+                if retval:
+                    self._set_state(local=True, image_id=None, pool=None)
+        if retval and kwargs.get('repo_url'):
+            self.record_packages(**kwargs)
         return retval
 
+    def build_stages(self, targets: List[str], *args, **kwargs) -> Dict[str, bool]:
+        """Build images for targets in one multi-stage build.
+
+        The last target is built first with intermediate layers kept,
+        then the others are tagged from the cached layers. Time spent
+        in each stage is reported. Returns whether it succeeded per target.
+        A failure doesn't stop building the others, which may not depend
+        on the failed stage.
+        """
+        timer = StageTimer()
+        orig = self.target
+        results = {t: True for t in targets}
+        try:
+            with self._build_context(**kwargs) as (tmpdir, base):
+                for i, target in enumerate(reversed(targets)):
+                    self.target = target
+                    cmdline = base + [
+                        '--layers', '--target', target, '-t',
+                        self._get_fullnamespace(), tmpdir
+                    ]
+                    if self.__verbose:
+                        print('# ' + ' '.join(cmdline))
+                    if kwargs.get('try_run', False):
+                        continue
+                    timer.reset()
+                    with subprocess.Popen(cmdline, cwd=tmpdir, text=True,
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT) as proc:
+                        for line in proc.stdout:
+                            sys.stdout.write(line)
+                            timer.feed(line)
+                    timer.finish(target if i == 0 else None)
+                    if proc.returncode != 0:
+                        print(f'** Unable to build {self._get_namespace()}',
+                              file=sys.stderr)
+                        results[target] = False
+                        continue
+                    self._set_state(local=True, image_id=None, pool=None)
+                    if kwargs.get('repo_url'):
+                        self.record_packages(**kwargs)
+                    # Slim stages aren't shared with other targets
+                    if i > 0 and timer.executed and not self.slim:
+                        print(f'Warning: {timer.executed} step(s) for '
+                              f'{self._get_namespace()} were run again '
+                              'instead of reusing layers',
+                              file=sys.stderr)
+        finally:
+            self.target = orig
+        timer.report()
+        return results
+
     def clean(self, *args, **kwargs) -> None:
         """Clean up an image"""
         if not self.exists(remote=False):
@@ -174,6 +574,8 @@ class ContainerImage:
             print('# ' + ' '.join(cmdline))
         if not kwargs.get('try_run', False):
             subprocess.run(cmdline, check=False)
+            with self._image_state_lock:
+                self._image_state.pop(self._get_fullnamespace(), None)
 
     def push(self, *args, **kwargs) -> bool:
         """Publish an image to registry"""
@@ -193,19 +595,19 @@ class ContainerImage:
         return True
 
     @contextlib.contextmanager
-    def _create(self, endpoint_args=[], interactive=False, *args, **kwargs) -> Iterator[str]:
+    def _create(self, endpoint_args=[], interactive=False, *args, volumes=None, **kwargs) -> Iterator[str]:
         """Create a container"""
-        if not self.exists(remote=True):
-            raise RuntimeError("Image isn't yet available. "
-                               f"try build first: {self._get_namespace()}")
+        self._ensure_image()
         if endpoint_args is None:
             endpoint_args = []
-        cname = f'fontquery-{os.getpid()}'
+        cname = session_name()
         cmdline = [
             'podman', 'create', '-i', '--name', cname
         ]
         if interactive:
             cmdline += ['--entrypoint', '/bin/bash']
+        for v in volumes or []:
+            cmdline += ['-v', v]
         cmdline += [self._get_fullnamespace()]
         cmdline += endpoint_args
         cleancmdline = [
@@ -263,79 +665,403 @@ class ContainerImage:
         if not kwargs.get('try_run', False):
             res = subprocess.run(cmdline, check=False)
             if res.returncode == 0:
+                self._set_state(local=True, image_id=None, pool=None)
                 print('** Image has been changed.', file=sys.stderr)
             else:
                 print('** Failed to change image.', file=sys.stderr)
 
     def _copy(self, session='', files=[]) -> bool:
         """Copy files into container"""
-        res = subprocess.run(['podman', 'unshare', 'podman', 'mount', session],
-                             capture_output=True, check=False)
-        if res.returncode != 0:
-            print('** Unable to get a working container\'s directory',
+        cmdline = [
+            'podman', 'cp', '-', f'{session}:/var/tmp/fontquery'
+        ]
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        try:
+            total = sum(os.stat(f).st_size for f in files)
+        except OSError as e:
+            print(f'** Unable to copy files into a container: {e}',
                   file=sys.stderr)
             return False
-        mnt = res.stdout.decode('utf-8').rstrip('\r\n')
-        try:
-            cmdline = ['podman', 'unshare', 'cp', '-a'] + files + \
-                      [str(Path(mnt) / 'var' / 'tmp' / 'fontquery')]
-            if self.__verbose:
-                print('# ' + ' '.join(cmdline), file=sys.stderr)
-            res = subprocess.run(cmdline, capture_output=True, check=False)
-            if res.returncode != 0:
-                print('** Unable to copy files into a container',
+        progress = CopyProgress(total)
+        with subprocess.Popen(cmdline, stdin=subprocess.PIPE,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE) as proc:
+            try:
+                write_tarball(proc.stdin, files, progress)
+                proc.stdin.close()
+            except OSError as e:
+                proc.kill()
+                print(f'** Unable to copy files into a container: {e}',
                       file=sys.stderr)
                 return False
-        finally:
-            subprocess.run(['podman', 'unshare', 'podman', 'umount', session],
-                           capture_output=True, check=False)
+            err = proc.stderr.read()
+        progress.done()
+        if proc.returncode != 0:
+            print('** Unable to copy files into a container: '
+                  f'{err.decode("utf-8")}', file=sys.stderr)
+            return False
         return True
 
-    def update(self, *args, **kwargs) -> bool:
-        """Update an image"""
+    def _ensure_image(self) -> None:
+        """Make sure the image is available on local"""
+        if not self.exists(remote=False) and not self.exists(remote=True):
+            raise RuntimeError("Image isn't yet available. "
+                               f"try build first: {self._get_namespace()}")
+
+    @classmethod
+    def _cleanup_pool(cls) -> None:
+        """Remove pooled containers created by this process"""
+        with cls._image_state_lock:
+            names = list(cls._pool_owned)
+            cls._pool_owned.clear()
+            for state in cls._image_state.values():
+                state.pop('pool', None)
+        if names and not cls.pool_keep:
+            try:
+                subprocess.run(['podman', 'rm', '-f', '-t', '0'] + names,
+                               capture_output=True, check=False)
+            except OSError:
+                pass
+
+    def _find_pool(self) -> Optional[str]:
+        """Look up a pooled container running for the image"""
+        cmdline = [
+            'podman', 'ps', '--filter',
+            f'label={POOL_LABEL}={self._get_fullnamespace()}',
+            '--filter', f'ancestor={self._get_fullnamespace()}',
+            '--format', '{{.Names}}'
+        ]
+        res = subprocess.run(cmdline, capture_output=True, check=False)
+        if res.returncode != 0:
+            return None
+        names = res.stdout.decode('utf-8').split()
+        return names[0] if names else None
+
+    def _start_pool(self) -> Optional[str]:
+        """Start a pooled container for the image"""
+        cname = session_name()
+        watchdog = POOL_WATCHDOG.format(stamp=POOL_STAMP,
+                                        timeout=self.pool_timeout,
+                                        interval=min(self.pool_timeout, 10))
+        cmdline = [
+            'podman', 'run', '-d', '--rm', '--name', cname,
+            '--label', f'{POOL_LABEL}={self._get_fullnamespace()}',
+            '--entrypoint', '/bin/sh', self._get_fullnamespace(),
+            '-c', watchdog
+        ]
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        res = subprocess.run(cmdline, capture_output=True, check=False)
+        if res.returncode != 0:
+            print(f'** Unable to start a container: {res.stderr.decode("utf-8")}',
+                  file=sys.stderr)
+            return None
+        with self._image_state_lock:
+            if not ContainerImage._pool_owned:
+                atexit.register(ContainerImage._cleanup_pool)
+            ContainerImage._pool_owned.append(cname)
+        return cname
+
+    def _pool_exec(self, endpoint_args) -> subprocess.CompletedProcess[str]:
+        """Run a query in a pooled container"""
+        for _ in range(2):
+            cname = self._get_state('pool')
+            cached = cname is not None
+            if not cached:
+                cname = self._find_pool() or self._start_pool()
+                if not cname:
+                    break
+                self._set_state(pool=cname)
+            # Mark the query as running to keep the container alive
+            # until it finishes, then run the client as the entrypoint does.
+            cmdline = [
+                'podman', 'exec', cname, '/bin/sh', '-c',
+                POOL_EXEC.format(stamp=POOL_STAMP), 'sh',
+                '/usr/local/bin/fontquery-client', '--pattern', self.pattern
+            ] + endpoint_args
+            if self.__verbose:
+                print('# ' + ' '.join(cmdline), file=sys.stderr)
+            res = subprocess.run(cmdline, stdout=subprocess.PIPE, check=False)
+            # 125 means podman couldn't run it, e.g. the container has gone
+            # away due to the idle timeout. try another one.
+            if res.returncode != 125:
+                return res
+            self._set_state(pool=None)
+        return self._run(endpoint_args, pool=False)
+
+    def _sysroot_exec(self, endpoint_args) -> subprocess.CompletedProcess[str]:
+        """Run a query on the host against the mounted image"""
+        cmdline = ['/bin/sh', '-c', SYSROOT_SCRIPT, 'sh',
+                   self._get_fullnamespace(), sys.executable,
+                   utils.get_fontquery_client_path(),
+                   '--pattern', self.pattern] + endpoint_args
+        # Images can be mounted only in the user namespace if rootless
+        if os.geteuid() != 0:
+            cmdline = ['podman', 'unshare'] + cmdline
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        res = subprocess.run(cmdline, stdout=subprocess.PIPE, check=False)
+        if res.returncode == 125:
+            print(f'** Unable to mount {self._get_namespace()}',
+                  file=sys.stderr)
+        return res
+
+    def _run(self, endpoint_args=None, *args, pool=True, volumes=None, **kwargs) -> subprocess.CompletedProcess[str]:
+        """Run a container and remove it when finished.
+
+        This is the cheapest way to get an output from a container as
+        long as nothing needs to be inspected after running.
+        If the pool is enabled, the query is dispatched into a container
+        kept running for the image instead, unless any volumes are
+        mounted. In the sysroot mode, no containers are started and the
+        query runs on the host against the mounted image instead.
+        """
+        self._ensure_image()
+        if pool and not volumes and not kwargs.get('try_run', False):
+            if self.sysroot:
+                return self._sysroot_exec(endpoint_args or [])
+            if self.pool_timeout > 0:
+                return self._pool_exec(endpoint_args or [])
+        cmdline = ['podman', 'run', '--rm']
+        for v in volumes or []:
+            cmdline += ['-v', v]
+        cmdline += [self._get_fullnamespace()] + (endpoint_args or [])
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        if kwargs.get('try_run', False):
+            return subprocess.CompletedProcess(cmdline, 0, b'')
+        return subprocess.run(cmdline, stdout=subprocess.PIPE, check=False)
+
+    def _local_image_id(self) -> Optional[str]:
+        """ID of the image on local storage"""
+        res = subprocess.run(['podman', 'images', '-a', '--no-trunc',
+                              '--format', '{{.ID}}',
+                              self._get_fullnamespace()],
+                             capture_output=True, check=False)
+        lines = res.stdout.decode('utf-8').split()
+        return lines[0] if res.returncode == 0 and lines else None
+
+    def record_packages(self, **kwargs) -> bool:
+        """Record packages installed in the image to check updates on the host"""
+        if kwargs.get('try_run', False):
+            return True
+        image_id = self.image_id()
+        res = self._run(['-m', 'packages'], pool=False)
+        if not image_id or res.returncode != 0:
+            print(f'Warning: Unable to record packages in {self._get_namespace()}',
+                  file=sys.stderr)
+            return False
+        return rpmmd.PackageRecord(self._get_fullnamespace()).update(
+            image_id, res.stdout.decode('utf-8').split())
+
+    def pending_updates(self, urls: List[str]) -> Optional[List[Tuple[str, str, str]]]:
+        """Updates available in repositories for packages in the image.
+
+        {product}, {release} and {arch} in urls are replaced.
+        None is returned if packages in the image aren't recorded yet.
+        """
+        packages = rpmmd.PackageRecord(self._get_fullnamespace()).get(
+            self.image_id())
+        if packages is None:
+            return None
+        urls = [u.format(product=self.__product, release=self.__version,
+                         arch=platform.machine()) for u in urls]
+        return rpmmd.pending_updates(packages, urls)
+
+    def update(self, *args, **kwargs) -> UpdateStatus:
+        """Update an image
+
+        If repo_url is given, updates are checked against the
+        repositories on the host with packages recorded for the image
+        and no containers are started if nothing is updated, unless
+        force_check is set. Only installed packages are compared on the
+        host, so obsoletes and arch changes are found in containers only.
+        """
+        self._ensure_writable()
         if not self.exists(remote=True):
             raise RuntimeError("Image isn't yet available. "
                                f"try build first: {self._get_namespace()}")
-        with self._create(endpoint_args=['-m', 'checkupdate'], *args, **kwargs) as cname:
-            res = self._start(session=cname)
+        urls = kwargs.get('repo_url')
+        pending = None
+        if urls and not kwargs.get('force_check', False):
+            try:
+                pending = self.pending_updates(urls)
+            except RuntimeError as e:
+                print(f'Warning: {e}', file=sys.stderr)
+            if pending == []:
+                print(f'* {self._get_namespace()} is up to date',
+                      file=sys.stderr)
+                return UpdateStatus.UP_TO_DATE
+            if pending and self.__verbose:
+                for name, old, new in pending:
+                    print(f'# {name}: {old} -> {new}', file=sys.stderr)
+        volumes = self.dnf_cache_volumes(**kwargs)
+        if pending is None:
+            res = self._run(['-m', 'checkupdate'], *args, volumes=volumes,
+                            **kwargs)
             if res.returncode == 0:
-                return False
+                print(f'* {self._get_namespace()} is up to date',
+                      file=sys.stderr)
+                if urls:
+                    self.record_packages(**kwargs)
+                return UpdateStatus.UP_TO_DATE
         if not kwargs.get('try_run', False):
-            with self._create(endpoint_args=['-m', 'update'], *args, **kwargs) as cname:
+            with self._create(endpoint_args=['-m', 'update'], *args,
+                              volumes=volumes, **kwargs) as cname:
                 res = self._start(session=cname)
                 if res.returncode != 0:
                     print('** Updating image failed.', file=sys.stderr)
-                    return False
+                    return UpdateStatus.FAILED
 
                 self._commit(cname)
+            if urls:
+                self.record_packages(**kwargs)
 
-        return True
+        return UpdateStatus.UPDATED
 
-    def get_json(self, *args, **kwargs) -> str:
-        """Get JSON from a container"""
-        if not self.exists(remote=True):
-            raise RuntimeError("Image isn't yet available. "
-                               f"try build first: {self._get_namespace()}")
-        eargs = ['-m', 'json']
-        eargs += utils.build_lang_flags(kwargs['lang'])
+    def query(self, mode, *args, **kwargs) -> str:
+        """Get a query result from a container"""
+        eargs = ['-m', mode]
+        eargs += utils.build_lang_flags(kwargs.get('lang'))
         eargs += utils.build_verbose_flags(kwargs['verbose'] if 'verbose' in kwargs else 0)
         if 'extra_args' in kwargs and kwargs['extra_args']:
             eargs += kwargs['extra_args']
-        with self._create(endpoint_args=eargs, *args, **kwargs) as cname:
-            res = self._start(session=cname)
-            if res.returncode != 0:
-                sys.tracebacklimit = 0
-                raise RuntimeError('`podman run\' failed with '
-                                   f'the error code {res.returncode}')
-            return res.stdout.decode('utf-8')
+        res = self._run(eargs, *args, **kwargs)
+        if res.returncode != 0:
+            sys.tracebacklimit = 0
+            raise RuntimeError('`podman run\' failed with '
+                               f'the error code {res.returncode}')
+        return res.stdout.decode('utf-8')
 
-    def get_json_after_install(self, package, *args, **kwargs) -> str:
-        """Get JSON from a container after installing a package"""
-        if not self.exists(remote=True):
+    def get_json(self, *args, shards=1, **kwargs) -> str:
+        """Get JSON from a container.
+
+        If shards is more than 1, languages are split into them and
+        queried in containers concurrently.
+        """
+        if shards > 1:
+            return asyncio.run(self.aget_json(*args, shards=shards, **kwargs))
+        return self.query('json', *args, **kwargs)
+
+    async def _ahas_image(self) -> bool:
+        cmdline = [
+            'buildah', 'images', self._get_fullnamespace()
+        ]
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        res = await utils.run_async(cmdline, stderr=subprocess.DEVNULL)
+        return res.returncode == 0
+
+    async def _afetch_image(self, tool: str = 'podman') -> Optional[str]:
+        cmdline = [tool, 'pull', self._get_fullnamespace()]
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        res = await utils.run_async(cmdline, stderr=subprocess.DEVNULL)
+        if res.returncode != 0:
+            return None
+        return res.stdout.decode('utf-8').strip()
+
+    async def apull(self, *args, **kwargs) -> bool:
+        """Asynchronous version of pull()"""
+        if self._get_state('pulled'):
+            return True
+        if kwargs.get('try_run', False):
+            return self.pull(*args, **kwargs)
+        if await asyncio.to_thread(self._is_up_to_date):
+            self._set_state(pulled=True, local=True)
+            return True
+        image_id = await self._afetch_image()
+        if image_id is not None:
+            self._set_state(pulled=True, local=True, pool=None,
+                            image_id=image_id)
+            PullRecord().update(self._get_fullnamespace(), None)
+        return image_id is not None
+
+    async def _aensure_image(self) -> None:
+        if self._get_state('local'):
+            return
+        if await self._ahas_image():
+            self._set_state(local=True)
+            return
+        image_id = await self._afetch_image('buildah')
+        if image_id is None:
             raise RuntimeError("Image isn't yet available. "
                                f"try build first: {self._get_namespace()}")
+        self._set_state(pulled=True, local=True, image_id=image_id)
+
+    async def aquery(self, mode, *args, **kwargs) -> str:
+        """Asynchronous version of query().
+
+        If cancelled, the container is removed as well.
+        """
+        if self.pool_timeout > 0 or self.sysroot or \
+           kwargs.get('try_run', False):
+            return await asyncio.to_thread(self.query, mode, *args, **kwargs)
+        await self._aensure_image()
+        eargs = ['-m', mode]
+        eargs += utils.build_lang_flags(kwargs.get('lang'))
+        eargs += utils.build_verbose_flags(kwargs['verbose'] if 'verbose' in kwargs else 0)
+        if 'extra_args' in kwargs and kwargs['extra_args']:
+            eargs += kwargs['extra_args']
+        cname = session_name()
+        cmdline = [
+            'podman', 'run', '--rm', '--name', cname,
+            self._get_fullnamespace()
+        ] + eargs
+        if self.__verbose:
+            print('# ' + ' '.join(cmdline), file=sys.stderr)
+        res = await utils.run_async(cmdline,
+                                    cleanup=['podman', 'rm', '-f', cname])
+        if res.returncode != 0:
+            sys.tracebacklimit = 0
+            raise RuntimeError('`podman run\' failed with '
+                               f'the error code {res.returncode}')
+        return res.stdout.decode('utf-8')
+
+    async def aget_json(self, *args, shards=1, **kwargs) -> str:
+        """Asynchronous version of get_json()"""
+        if shards <= 1:
+            return await self.aquery('json', *args, **kwargs)
+        langs = kwargs.get('lang')
+        if not langs:
+            kw = dict(kwargs, extra_args=None)
+            try:
+                langs = (await self.aquery('langs', *args, **kw)).split()
+            except RuntimeError as e:
+                raise RuntimeError('Unable to get languages to split into '
+                                   'shards. The image may be too old. '
+                                   'try with --lang') from e
+        outs = await asyncio.gather(*[
+            self.aquery('json', *args, **dict(kwargs, lang=ll))
+            for ll in utils.split_shards(langs, shards)
+        ])
+        return utils.merge_json_shards(outs)
+
+    def _affected_langs(self, session: str, pkgs: str,
+                        lang: Optional[List[str]]) -> Optional[List[str]]:
+        """Languages which installed packages may affect. None if unknown"""
+        res = self._exec(session=session,
+                         stderr=subprocess.PIPE,
+                         cmd='/usr/local/bin/fontquery-client -m affected ' +
+                         ' '.join(utils.build_lang_flags(lang) + [pkgs]))
+        out = res.stdout.decode('utf-8').split()
+        if res.returncode != 0 or '*' in out:
+            return None
+        return out
+
+    def get_json_after_install(self, package, *args, baseline=None,
+                               full_query=False, **kwargs) -> str:
+        """Get JSON from a container after installing a package
+
+        If baseline, which is JSON from the image without the package,
+        is given, only languages the package may affect are queried and
+        the rest are taken from baseline unless full_query is True.
+        baseline can be a Future to wait for it only when it is needed.
+        """
+        self._ensure_writable()
+        self._ensure_image()
         eargs = ['-m', 'json']
-        eargs += utils.build_lang_flags(kwargs['lang'])
         eargs += utils.build_verbose_flags(kwargs['verbose'] if 'verbose' in kwargs else 0)
         if 'extra_args' in kwargs and kwargs['extra_args']:
             eargs += kwargs['extra_args']
@@ -344,8 +1070,12 @@ class ContainerImage:
             print('* Copying packages...', file=sys.stderr)
             if not self._copy(cname, package):
                 return None
-            print('* Installing packages...', file=sys.stderr)
             pkgs = ' '.join([Path(f).name for f in package])
+            langs = None
+            if baseline and not full_query:
+                # Packages being replaced may have affected others
+                langs = self._affected_langs(cname, pkgs, kwargs['lang'])
+            print('* Installing packages...', file=sys.stderr)
             res = self._exec(session=cname,
                              stderr=subprocess.PIPE,
                              cmd='/usr/local/bin/fontquery-client '
@@ -353,10 +1083,32 @@ class ContainerImage:
             if res.returncode != 0:
                 print('** Unable to install package', file=sys.stderr)
                 return None
+            if langs is not None:
+                after = self._affected_langs(cname, pkgs, kwargs['lang'])
+                langs = None if after is None else \
+                    langs + [ls for ls in after if ls not in langs]
+            if langs is not None and \
+               isinstance(baseline, concurrent.futures.Future):
+                baseline = baseline.result()
+                if not baseline:
+                    langs = None
+            if langs is None:
+                eargs += utils.build_lang_flags(kwargs['lang'])
+            elif not langs:
+                print('* No languages are affected by packages',
+                      file=sys.stderr)
+                return baseline
+            else:
+                print(f'* Querying {len(langs)} affected language(s)...',
+                      file=sys.stderr)
+                eargs += utils.build_lang_flags(langs)
             res = self._exec(session=cname,
                              cmd='/usr/local/bin/fontquery-client ' +
                              ' '.join(eargs))
             if res.returncode != 0:
                 print('** Unable to get a JSON', file=sys.stderr)
                 return None
+            if langs:
+                return utils.replace_langs(baseline, res.stdout.decode('utf-8'),
+                                           langs)
             return res.stdout.decode('utf-8')
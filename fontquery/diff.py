@@ -24,13 +24,14 @@
 """Module to perform a diff application for fontquery."""
 
 import argparse
+import asyncio
 import importlib.metadata
 import json
 import re
 import shutil
 import subprocess
 import sys
-from typing import Optional
+from typing import Any, List, Optional, Union
 try:
     import fontquery_debug  # noqa: F401
 except ModuleNotFoundError:
@@ -41,49 +42,97 @@ try:
 except ModuleNotFoundError:
     LOCAL_NOT_SUPPORTED = True
 from fontquery import htmlformatter  # noqa: F401
-from fontquery.cache import FontQueryCache  # noqa: F401
+from fontquery.cache import FontQueryCache, sysroot_variant  # noqa: F401
 from fontquery.container import ContainerImage  # noqa: F401
+from fontquery.podmanapi import image_class  # noqa: F401
 from fontquery import utils  # noqa: F401
 
 
-def get_json(release: str, args: argparse.Namespace) -> str:
+async def aget_json(release: str, args: argparse.Namespace) -> str:
     """Get JSON output from fontquery."""
-    return utils.run_container_query(release, args, 'json')
+    if release != 'local' and \
+       (ContainerImage.pool_timeout > 0 or ContainerImage.sysroot or
+        args.backend == 'api' or args.shards > 1):
+        release_normalized = utils.normalize_release(release, args.product)
+        c = image_class(args.backend)(args.product, release_normalized,
+                                      args.verbose)
+        c.target = utils.image_target(args)
+        return await c.aget_json(lang=args.lang, verbose=args.verbose,
+                                 shards=args.shards)
+    return await utils.arun_container_query(release, args, 'json')
 
 
-def load_json(release: str, args: argparse.Namespace, fcache: bool) -> Optional[str]:
+async def aupdate_image(release: str,
+                        args: argparse.Namespace) -> Optional[ContainerImage]:
+    """Pull the latest image unless disabled. None for local"""
+    if release == 'local':
+        return None
+    release_normalized = utils.normalize_release(release, args.product)
+    c = image_class(args.backend)(args.product, release_normalized,
+                                  args.verbose)
+    c.target = utils.image_target(args)
+    c.pull_ttl = args.pull_ttl
+    if not args.disable_update and not await c.apull(args):
+        raise RuntimeError('`podman pull\' failed')
+    return c
+
+
+async def aload_json(release: str, args: argparse.Namespace, fcache: bool,
+                     c: Optional[ContainerImage] = None) -> Optional[str]:
     """Load JSON from cache or query."""
-    out = None
+    fqc = FontQueryCache(args.product, release, utils.image_target(args),
+                         sysroot_variant()
+                         if args.sysroot and release != 'local' else None,
+                         args.backend, c.image_id if c else None)
+    if args.clean_cache:
+        fqc.delete()
 
-    if release == 'local':
-        out = get_json(release, args)
-    else:
-        if not args.disable_update:
-            release_normalized = utils.normalize_release(release, args.product)
-            c = ContainerImage(args.product, release_normalized, args.verbose)
-            c.target = args.target
-            if not c.pull(args):
-                raise RuntimeError('`podman pull\' failed')
-        fqc = FontQueryCache(args.product, release, args.target)
-        if args.clean_cache:
-            fqc.delete()
-        if fcache:
+    return await fqc.aget_or_compute(lambda: aget_json(release, args), fcache,
+                                     args.verbose)
+
+
+async def aload_data(release: str, args: argparse.Namespace,
+                     fcache: bool) -> dict[str, Any]:
+    """Load data indexed for generate_diff from cache or query."""
+    c = await aupdate_image(release, args)
+    fqc = FontQueryCache(args.product, release, utils.image_target(args),
+                         sysroot_variant()
+                         if args.sysroot and release != 'local' else None,
+                         args.backend, c.image_id if c else None)
+    if fcache and not args.clean_cache:
+        data = fqc.read_index(args.loose_comparison, True)
+        if data is not None:
             if args.verbose:
-                print('* Reading JSON from cache', file=sys.stderr)
-            out = fqc.read()
-        if not out:
-            out = get_json(release, args)
-            if fcache:
-                if args.verbose:
-                    print('* Storing cache...', file=sys.stderr, end='')
-                if fqc.save(out):
-                    if args.verbose:
-                        print('done', file=sys.stderr)
-                else:
-                    if args.verbose:
-                        print('failed', file=sys.stderr)
-
-    return out
+                print('* Reading indexed data from cache', file=sys.stderr)
+            return data
+    data = htmlformatter.json2index(json.loads(await aload_json(release, args,
+                                                                fcache, c)),
+                                    args.loose_comparison, True)
+    if fcache:
+        fqc.save_index(data, args.loose_comparison, True)
+
+    return data
+
+
+def load_data(release: str, args: argparse.Namespace, fcache: bool) -> dict[str, Any]:
+    """Load data indexed for generate_diff from cache or query."""
+    return asyncio.run(aload_data(release, args, fcache))
+
+
+async def load_both(release_a: str, release_b: str, args: argparse.Namespace,
+                    fcache: bool) -> List[Union[dict[str, Any], BaseException]]:
+    """Load data for both sides concurrently.
+
+    A failure on one side doesn't cancel the other. The exception is
+    returned in place of its result.
+    """
+    if release_a == release_b:
+        ret = await asyncio.gather(aload_data(release_a, args, fcache),
+                                   return_exceptions=True)
+        return ret * 2
+    return await asyncio.gather(aload_data(release_a, args, fcache),
+                                aload_data(release_b, args, fcache),
+                                return_exceptions=True)
 
 
 def main():
@@ -100,6 +149,11 @@ def main():
     parser.add_argument('--diff-only',
                         action='store_true',
                         help='Show diff only')
+    parser.add_argument('--backend',
+                        default='cli',
+                        choices=['cli', 'api'],
+                        help='How to operate containers. "api" to talk to '
+                        'the podman API socket')
     parser.add_argument('--disable-cache',
                         action='store_true',
                         help='Enforce processing everything '
@@ -107,6 +161,18 @@ def main():
     parser.add_argument('--disable-update',
                         action='store_true',
                         help='Do not update the container image')
+    parser.add_argument('--pool-timeout',
+                        type=int,
+                        default=0,
+                        metavar='SECONDS',
+                        help='Keep a container running for queries and '
+                        'share it until SECONDS passed without any queries')
+    parser.add_argument('--pull-ttl',
+                        type=int,
+                        default=0,
+                        metavar='SECONDS',
+                        help='Do not check updates of the container image '
+                        'within SECONDS since the last pull')
     parser.add_argument('-l',
                         '--lang',
                         action='append',
@@ -125,6 +191,20 @@ def main():
     parser.add_argument('-R', '--render',
                         default='text',
                         choices=renderer.keys())
+    parser.add_argument('--shards',
+                        type=int,
+                        default=1,
+                        metavar='N',
+                        help='Split languages into N containers '
+                        'to dump fonts data into JSON concurrently')
+    parser.add_argument('--slim',
+                        action='store_true',
+                        help='Query fonts from slim images, '
+                        'which have only what queries need')
+    parser.add_argument('--sysroot',
+                        action='store_true',
+                        help='Query images mounted on the host with '
+                        'fontconfig on the host instead of running containers')
     parser.add_argument('-t',
                         '--target',
                         default='minimal',
@@ -145,6 +225,9 @@ def main():
                         default='local')
 
     args = parser.parse_args()
+    ContainerImage.pool_timeout = args.pool_timeout
+    ContainerImage.pool_keep = True
+    ContainerImage.sysroot = args.sysroot
     if args.version:
         print(importlib.metadata.version('fontquery'))
         sys.exit(0)
@@ -157,7 +240,7 @@ def main():
     if args.lang:
         args.lang = sum([s.split(',') for s in args.lang],[])
     if args.verbose:
-        print(f'* Target: {args.target}', file=sys.stderr)
+        print(f'* Target: {utils.image_target(args)}', file=sys.stderr)
         print(f'* Language: {args.lang}', file=sys.stderr)
         print(file=sys.stderr)
 
@@ -165,15 +248,25 @@ def main():
           f'{args.compare_a} and {args.compare_b}',
           file=sys.stderr)
 
-    retval_a = load_json(args.compare_a, args,
-                         not args.disable_cache and not args.lang)
-    retval_b = load_json(args.compare_b, args,
-                         not args.disable_cache and not args.lang)
+    retval_a, retval_b = asyncio.run(load_both(args.compare_a, args.compare_b,
+                                               args,
+                                               not args.disable_cache and
+                                               not args.lang))
+    failed = False
+    for r, out in {args.compare_a: retval_a,
+                   args.compare_b: retval_b}.items():
+        if isinstance(out, BaseException):
+            if not isinstance(out, Exception):
+                raise out
+            print(f'** {r}: {out}', file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
 
     with args.output:
         g = htmlformatter.generate_diff(renderer[args.render](), '',
-                                        json.loads(retval_a),
-                                        json.loads(retval_b),
+                                        retval_a,
+                                        retval_b,
                                         not args.loose_comparison,
                                         args.diff_only)
         for s in next(g):
@@ -24,6 +24,7 @@
 """Module to perform a frontend application for fontquery."""
 
 import argparse
+import asyncio
 import importlib.metadata
 import re
 import shutil
@@ -33,7 +34,7 @@ import tempfile
 import warnings
 from collections import Counter
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Union
 try:
     import fontquery_debug  # noqa: F401
 except ModuleNotFoundError:
@@ -44,49 +45,64 @@ try:
     LOCAL_NOT_SUPPORTED = False
 except ModuleNotFoundError:
     LOCAL_NOT_SUPPORTED = True
-from fontquery.cache import FontQueryCache  # noqa: F401
+from fontquery.cache import FontQueryCache, export_bundle, import_bundle, sysroot_variant  # noqa: F401
 from fontquery.container import ContainerImage  # noqa: F401
+from fontquery.podmanapi import image_class  # noqa: F401
 from fontquery import utils  # noqa: F401
 
 
-def run(release: str, args: argparse.Namespace) -> str:
+async def arun(release: str, args: argparse.Namespace) -> str:
     """Execute fontquery in container or locally."""
-    if release != 'local' and not args.disable_update:
+    if release != 'local':
         release_normalized = utils.normalize_release(release, args.product)
-        c = ContainerImage(args.product, release_normalized, args.verbose)
-        c.target = args.target
-        if not c.pull(args):
+        c = image_class(args.backend)(args.product, release_normalized,
+                                      args.verbose)
+        c.target = utils.image_target(args)
+        c.pull_ttl = args.pull_ttl
+        if not args.disable_update and not await c.apull(args):
             raise RuntimeError('`podman pull\' failed')
+        if args.mode == 'json' and args.shards > 1:
+            return await c.aget_json(lang=args.lang, verbose=args.verbose,
+                                     shards=args.shards)
+        if ContainerImage.pool_timeout > 0 or ContainerImage.sysroot or \
+           args.backend == 'api':
+            return await c.aquery(args.mode, lang=args.lang,
+                                  verbose=args.verbose, extra_args=args.args)
+
+    return await utils.arun_container_query(release, args, args.mode,
+                                            args.args)
+
+
+def run(release: str, args: argparse.Namespace) -> str:
+    """Execute fontquery in container or locally."""
+    return asyncio.run(arun(release, args))
+
+
+async def aload(release: str, args: argparse.Namespace, fcache: bool) -> Optional[str]:
+    fqc = FontQueryCache(args.product, release, utils.image_target(args),
+                         sysroot_variant()
+                         if args.sysroot and release != 'local' else None,
+                         args.backend)
+    if args.clean_cache:
+        fqc.delete()
 
-    return utils.run_container_query(release, args, args.mode, args.args)
+    return await fqc.aget_or_compute(lambda: arun(release, args), fcache,
+                                     args.verbose)
 
 
 def load(release: str, args: argparse.Namespace, fcache: bool) -> Optional[str]:
-    out = None
+    return asyncio.run(aload(release, args, fcache))
 
-    if release == 'local':
-        out = run(release, args)
-    else:
-        fqc = FontQueryCache(args.product, release, args.target)
-        if args.clean_cache:
-            fqc.delete()
-        if fcache:
-            if args.verbose:
-                print('* Reading JSON from cache', file=sys.stderr)
-            out = fqc.read()
-        if not out:
-            out = run(release, args)
-            if fcache:
-                if args.verbose:
-                    print('* Storing cache...', file=sys.stderr, end='')
-                if fqc.save(out):
-                    if args.verbose:
-                        print('done', file=sys.stderr)
-                else:
-                    if args.verbose:
-                        print('failed', file=sys.stderr)
-
-    return out
+
+async def load_all(releases: List[str], args: argparse.Namespace,
+                   fcache: bool) -> List[Union[str, None, BaseException]]:
+    """Load results for releases concurrently.
+
+    A failure for a release doesn't cancel the others. The exception is
+    returned in place of its result.
+    """
+    return await asyncio.gather(*[aload(r, args, fcache) for r in releases],
+                                return_exceptions=True)
 
 
 def main():
@@ -100,6 +116,11 @@ def main():
                         '--clean-cache',
                         action='store_true',
                         help='Clean caches before processing')
+    parser.add_argument('--backend',
+                        default='cli',
+                        choices=['cli', 'api'],
+                        help='How to operate containers. "api" to talk to '
+                        'the podman API socket')
     parser.add_argument('--disable-cache',
                         action='store_true',
                         help='Enforce processing everything '
@@ -107,6 +128,14 @@ def main():
     parser.add_argument('--disable-update',
                         action='store_true',
                         help='Do not update the container image')
+    parser.add_argument('--export-cache',
+                        metavar='FILE',
+                        help='Export caches for the given product, releases '
+                        'and target into FILE and exit')
+    parser.add_argument('--import-cache',
+                        metavar='FILE',
+                        help='Import caches exported by --export-cache '
+                        'and exit')
     parser.add_argument('-f',
                         '--filename-format',
                         default='{product}-{release}-{target}.{mode}',
@@ -119,6 +148,18 @@ def main():
                         help='Release number such as "rawhide" and "39". '
                         '"local" to query from current environment instead '
                         'of images')
+    parser.add_argument('--pool-timeout',
+                        type=int,
+                        default=0,
+                        metavar='SECONDS',
+                        help='Keep a container running for queries and '
+                        'share it until SECONDS passed without any queries')
+    parser.add_argument('--pull-ttl',
+                        type=int,
+                        default=0,
+                        metavar='SECONDS',
+                        help='Do not check updates of the container image '
+                        'within SECONDS since the last pull')
     parser.add_argument('-l',
                         '--lang',
                         action='append',
@@ -138,6 +179,20 @@ def main():
                         default='fedora',
                         choices=['fedora', 'centos'],
                         help='Product name to operate')
+    parser.add_argument('--shards',
+                        type=int,
+                        default=1,
+                        metavar='N',
+                        help='Split languages into N containers '
+                        'to dump fonts data into JSON concurrently')
+    parser.add_argument('--slim',
+                        action='store_true',
+                        help='Query fonts from slim images, '
+                        'which have only what queries need')
+    parser.add_argument('--sysroot',
+                        action='store_true',
+                        help='Query images mounted on the host with '
+                        'fontconfig on the host instead of running containers')
     parser.add_argument('-t',
                         '--target',
                         default='minimal',
@@ -160,6 +215,9 @@ def main():
     parser.add_argument('args', nargs='*', help='Queries')
 
     args = parser.parse_args()
+    ContainerImage.pool_timeout = args.pool_timeout
+    ContainerImage.pool_keep = True
+    ContainerImage.sysroot = args.sysroot
     rr = Counter(args.release)
     rr.subtract(defrel)
     rellist = list(rr.elements())
@@ -173,6 +231,16 @@ def main():
     if args.version:
         print(importlib.metadata.version('fontquery'))
         sys.exit(0)
+    if args.export_cache:
+        n = export_bundle([(args.product, r, utils.image_target(args))
+                           for r in args.release],
+                          args.export_cache)
+        print(f'* {n} cache(s) exported', file=sys.stderr)
+        sys.exit(0)
+    if args.import_cache:
+        n = import_bundle(args.import_cache)
+        print(f'* {n} cache(s) imported', file=sys.stderr)
+        sys.exit(0)
 
     # Validate output directory
     output_dir = Path(args.output_dir).resolve()
@@ -192,7 +260,7 @@ def main():
     if args.verbose:
         print(f'* Product: {args.product}', file=sys.stderr)
         print(f'* Release: {args.release}', file=sys.stderr)
-        print(f'* Target: {args.target}', file=sys.stderr)
+        print(f'* Target: {utils.image_target(args)}', file=sys.stderr)
         print(f'* Language: {args.lang}', file=sys.stderr)
         print(f'* Mode: {args.mode}', file=sys.stderr)
         print(f'* Output: {ofile}', file=sys.stderr)
@@ -203,14 +271,27 @@ def main():
         if args.target != parser.get_default('target'):
             warnings.warn("target option won't take any effects on local mode",
                           RuntimeWarning, stacklevel=2)
+        if args.slim:
+            warnings.warn("slim option won't take any effects on local mode",
+                          RuntimeWarning, stacklevel=2)
     else:
         if not shutil.which('podman'):
             print('podman is not installed')
             sys.exit(1)
+        if args.sysroot and LOCAL_NOT_SUPPORTED:
+            raise TypeError('sysroot query feature is not available.')
 
-    for r in args.release:
-        out = load(r, args, not args.lang and not args.disable_cache and
-                   args.mode == 'json')
+    outs = asyncio.run(load_all(args.release, args,
+                                not args.lang and not args.disable_cache and
+                                args.mode == 'json'))
+    failed = False
+    for r, out in zip(args.release, outs):
+        if isinstance(out, BaseException):
+            if not isinstance(out, Exception):
+                raise out
+            print(f'** {r}: {out}', file=sys.stderr)
+            failed = True
+            continue
         if redirect:
             with tempfile.NamedTemporaryFile(mode='w+') as tmp:
                 tmp.write(out)
@@ -233,6 +314,8 @@ def main():
                                        target=args.target, mode=origmode),
                           'w', encoding='utf-8') as fw:
                     fw.write(out)
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
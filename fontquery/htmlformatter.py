@@ -535,6 +535,25 @@ def json2data(data: dict[str, Any], ignore_file: bool, ignore_flag: bool = False
     return retval
 
 
+def json2index(data: dict[str, Any], ignore_file: bool, ignore_flag: bool = False) -> dict[str, Any]:
+    """Restructure JSON format into the form generate_diff consumes."""
+    retval = {k: v for k, v in data.items() if k != 'fonts'}
+    retval['index'] = json2data(data, ignore_file, ignore_flag)
+    retval['index_flags'] = [ignore_file, ignore_flag]
+
+    return retval
+
+
+def index2data(data: dict[str, Any], ignore_file: bool, ignore_flag: bool = False) -> dict[str, dict[str, Any]]:
+    """Take restructured data from JSON or the result of json2index."""
+    if 'index' in data:
+        if data['index_flags'] != [ignore_file, ignore_flag]:
+            raise RuntimeError('Indexed data was generated with '
+                               'different options')
+        return data['index']
+    return json2data(data, ignore_file, ignore_flag)
+
+
 def json2langgroup(data: dict[str, Any]) -> dict[str, dict[str, Any]]:
     """Restructure JSON format by language group."""
     retval = {}
@@ -580,9 +599,12 @@ def generate_table(renderer: DataRenderer, title: str, data: dict[str, Any]) ->
 
 def generate_diff(renderer: DataRenderer, title: str, data: dict[str, Any],
                   diffdata: dict[str, Any], compare_accurately: bool, diff_only: bool) -> Iterator[str]:
-    """Format difference between two JSONs to HTML."""
-    sorteddata = json2data(data, not compare_accurately, True)
-    sorteddiffdata = json2data(diffdata, not compare_accurately, True)
+    """Format difference between two JSONs to HTML.
+
+    data and diffdata can be either JSON or the result of json2index.
+    """
+    sorteddata = index2data(data, not compare_accurately, True)
+    sorteddiffdata = index2data(diffdata, not compare_accurately, True)
     matched = {}
     notmatched = {}
     missing_b = {}
@@ -0,0 +1,270 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Module to distribute fontquery runs and merge their results."""
+
+import argparse
+import json
+import shlex
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from fontquery import utils
+from fontquery.version import fontquery_version
+
+PLAN_FORMAT = 1
+
+
+def resolve_langs(product: str, release: str, target: str,
+                  verbose: int = 0) -> List[str]:
+    """Get the default languages to dump fonts data for the image."""
+    ns = argparse.Namespace(product=product, target=target,
+                            verbose=verbose, lang=None)
+    return utils.run_container_query(release, ns, 'langs').split()
+
+
+def make_plan(images: List[Tuple[str, str, str]], workers: int,
+              langs: Optional[List[str]] = None,
+              families: Optional[List[str]] = None,
+              shards: Optional[int] = None,
+              split_families: bool = False,
+              verbose: int = 0) -> Dict[str, Any]:
+    """
+    Make a plan to distribute queries for images to workers.
+
+    Args:
+        images: List of (product, release, target)
+        workers: Number of workers
+        langs: Languages to query. the default ones of the image if None
+        families: Families to query. DEFAULT_FAMILIES if None
+        shards: Number of language shards per image. workers if None
+        split_families: Query families separately
+
+    Returns:
+        Plan which is serializable into JSON
+    """
+    plan: Dict[str, Any] = {
+        'format': PLAN_FORMAT,
+        'workers': workers,
+        'images': [],
+        'jobs': [],
+    }
+    cached: Dict[Tuple[str, str], List[str]] = {}
+    families = families or utils.DEFAULT_FAMILIES
+    n = 0
+    for product, release, target in images:
+        ll = langs
+        if not ll:
+            if (product, release) not in cached:
+                cached[(product, release)] = resolve_langs(product, release,
+                                                           target, verbose)
+            ll = cached[(product, release)]
+        image = len(plan['images'])
+        plan['images'].append({
+            'product': product,
+            'release': release,
+            'target': target,
+            'lang': ll,
+            'family': families,
+        })
+        fsplit = [[f] for f in families] if split_families else [families]
+        for lshard in utils.split_shards(ll, shards or workers):
+            for fshard in fsplit:
+                output = f'{product}-{release}-{target}-{n:04d}.json'
+                cmdline = [
+                    'fontquery', '-m', 'json', '-P', product,
+                    '-r', release, '-t', target,
+                    '--filename-format', output
+                ]
+                for lang in lshard:
+                    cmdline += ['-l', lang]
+                if fshard != utils.DEFAULT_FAMILIES:
+                    cmdline += ['--']
+                    for f in fshard:
+                        cmdline += ['-f', f]
+                plan['jobs'].append({
+                    'worker': n % workers,
+                    'image': image,
+                    'lang': lshard,
+                    'family': fshard,
+                    'output': output,
+                    'command': cmdline,
+                })
+                n += 1
+
+    return plan
+
+
+def load_plan(fn: str) -> Dict[str, Any]:
+    """Load a plan made by make_plan()."""
+    with open(fn, encoding='utf-8') as f:
+        plan = json.load(f)
+    if plan.get('format') != PLAN_FORMAT:
+        raise RuntimeError(f'Unsupported plan format: {fn}')
+    return plan
+
+
+def merge_files(files: List[str],
+                plan: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Merge results per image.
+
+    Args:
+        files: JSON files to merge
+        plan: Plan the files were made with if any
+
+    Returns:
+        List of (filename, result) per image. the filename is what
+        fontquery would use by default.
+    """
+    outputs = {}
+    if plan:
+        outputs = {j['output']: plan['images'][j['image']]
+                   for j in plan['jobs']}
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    images: Dict[Any, Optional[Dict[str, Any]]] = {}
+    for fn in files:
+        with open(fn, encoding='utf-8') as f:
+            try:
+                doc = json.load(f)
+            except ValueError as e:
+                raise RuntimeError(f'Unable to read {fn}: {e}') from e
+        image = outputs.get(Path(fn).name)
+        if image:
+            key = (image['product'], image['release'], image['target'])
+        else:
+            key = tuple(doc.get(k) for k in utils.HEADER_KEYS)
+        groups.setdefault(key, []).append(doc)
+        images[key] = image
+    result = []
+    for key, docs in groups.items():
+        image = images[key]
+        if image:
+            data = utils.merge_data(docs, image['lang'], image['family'])
+            name = '{}-{}-{}.json'.format(*key)
+        else:
+            data = utils.merge_data(docs)
+            name = f'{data["id"]}-{data["version_id"]}-{data["pattern"]}.json'
+        result.append((name, data))
+
+    return result
+
+
+def do_plan(args: argparse.Namespace) -> int:
+    images = [(p, r, t)
+              for p in args.product or ['fedora']
+              for r in args.release or ['rawhide']
+              for t in args.target or ['minimal']]
+    plan = make_plan(images, args.workers, args.lang, args.family,
+                     args.shards, args.split_families, args.verbose)
+    out = json.dumps(plan, indent=4) + '\n'
+    if args.output == '-':
+        sys.stdout.write(out)
+    else:
+        Path(args.output).write_text(out, encoding='utf-8')
+    if args.verbose:
+        print(f'* {len(plan["jobs"])} job(s) for {args.workers} worker(s)',
+              file=sys.stderr)
+    return 0
+
+
+def do_commands(args: argparse.Namespace) -> int:
+    plan = load_plan(args.plan)
+    for j in plan['jobs']:
+        if args.worker is None or j['worker'] == args.worker:
+            print(shlex.join(j['command']))
+    return 0
+
+
+def do_merge(args: argparse.Namespace) -> int:
+    plan = load_plan(args.plan) if args.plan else None
+    result = merge_files(args.file, plan)
+    if len(result) > 1 and not args.output_dir:
+        raise RuntimeError('Results for multiple images are given. '
+                           'Use --output-dir to store them')
+    for name, data in result:
+        out = json.dumps(data, indent=4) + '\n'
+        if args.output_dir:
+            fn = Path(args.output_dir) / name
+            fn.write_text(out, encoding='utf-8')
+            print(f'* {fn}: {len(data["fonts"])} record(s)', file=sys.stderr)
+        elif args.output == '-':
+            sys.stdout.write(out)
+        else:
+            Path(args.output).write_text(out, encoding='utf-8')
+    return 0
+
+
+def main():
+    """Endpoint to execute fontquery-merge program."""
+    parser = argparse.ArgumentParser(
+        description='Distribute fontquery runs and merge their results',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='count',
+                        default=0,
+                        help='Show more detailed logs')
+    parser.add_argument('-V',
+                        '--version',
+                        action='store_true',
+                        help='Show version')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('plan', help='Make a plan to distribute queries')
+    p.add_argument('-n', '--workers', type=int, default=1,
+                   help='Number of workers')
+    p.add_argument('-P', '--product', action='append',
+                   choices=['fedora', 'centos'],
+                   help='Product name to query (default: fedora)')
+    p.add_argument('-r', '--release', action='append',
+                   help='Release to query (default: rawhide)')
+    p.add_argument('-t', '--target', action='append',
+                   choices=['minimal', 'extra', 'all'],
+                   help='Target to query (default: minimal)')
+    p.add_argument('-l', '--lang', action='append',
+                   help='Language list to query. '
+                   'the default ones of images if not given')
+    p.add_argument('-f', '--family', action='append',
+                   help='Family list to query (default: '
+                   f'{" ".join(utils.DEFAULT_FAMILIES)})')
+    p.add_argument('--shards', type=int,
+                   help='Number of language shards per image '
+                   '(default: number of workers)')
+    p.add_argument('--split-families', action='store_true',
+                   help='Query families in separate jobs')
+    p.add_argument('-o', '--output', default='-',
+                   help='Output file')
+    p = sub.add_parser('commands', help='Show commands in a plan')
+    p.add_argument('-w', '--worker', type=int,
+                   help='Show commands only for the worker')
+    p.add_argument('plan', help='Plan file')
+    p = sub.add_parser('merge', help='Merge results')
+    p.add_argument('--plan', help='Plan file the results were made with')
+    p.add_argument('-o', '--output', default='-',
+                   help='Output file')
+    p.add_argument('-O', '--output-dir',
+                   help='Output directory to store results per image')
+    p.add_argument('file', nargs='+', help='JSON files to merge')
+
+    args = parser.parse_args()
+    if args.version:
+        print(fontquery_version())
+        sys.exit(0)
+
+    cmd = {
+        'plan': do_plan,
+        'commands': do_commands,
+        'merge': do_merge,
+    }
+    if args.command is None:
+        parser.print_help()
+        sys.exit(1)
+    try:
+        sys.exit(cmd[args.command](args))
+    except (RuntimeError, OSError) as e:
+        print(f'** {e}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
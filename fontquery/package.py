@@ -48,13 +48,23 @@ class InvalidFormat(FqException):
 
 class Font2Package:
 
+    # Root directory of the system to look up packages in. None for /
+    root: Optional[str] = None
+
+    @classmethod
+    def rpm_cmdline(cls, *args: str) -> List[str]:
+        """Build a rpm command line to query packages in the root"""
+        if cls.root:
+            return ['rpm', '--root', cls.root] + list(args)
+        return ['rpm'] + list(args)
+
     @classmethod
     def get_source_package_name(cls, pkg: Union[str, List[str]]) -> Iterator[str]:
         if not isinstance(pkg, list):
             pkg = [pkg]
         for p in pkg:
             # Combine both queries into single rpm call for efficiency
-            cmdline = ['rpm', '-q', '--qf', '%{version}-%{release}|%{sourcerpm}', p]
+            cmdline = cls.rpm_cmdline('-q', '--qf', '%{version}-%{release}|%{sourcerpm}', p)
             ret = subprocess.run(cmdline, capture_output=True, check=False)
             if ret.returncode != 0:
                 raise PackageNotFound(p)
@@ -65,7 +75,10 @@ class Font2Package:
     @classmethod
     def get_package_name_from_file(cls, fontfile: str) -> Iterator[str]:
         if shutil.which('rpm'):
-            cmdline = ['rpm', '-qf', '--qf', '%{name}', fontfile]
+            # fontconfig reports files with the sysroot
+            if cls.root and Path(fontfile).is_relative_to(cls.root):
+                fontfile = str(Path('/') / Path(fontfile).relative_to(cls.root))
+            cmdline = cls.rpm_cmdline('-qf', '--qf', '%{name}', fontfile)
             retval = subprocess.run(cmdline, capture_output=True,
                                     check=False)
             if retval.returncode != 0:
@@ -4,56 +4,167 @@
 """Module to check differences with package installation"""
 
 import argparse
+import concurrent.futures
+import glob
 import importlib.metadata
 import json
+import re
 import shutil
 import sys
-from typing import Optional, List
+import yaml
+from pathlib import Path
+from typing import Optional, List, Tuple, Union
 try:
     import fontquery_debug  # noqa: F401
 except ModuleNotFoundError:
     pass
 from fontquery import htmlformatter  # noqa: F401
-from fontquery.cache import FontQueryCache  # noqa: F401
+from fontquery.cache import FontQueryCache, package_digest  # noqa: F401
 from fontquery.container import ContainerImage  # noqa: F401
+from fontquery.podmanapi import image_class  # noqa: F401
+from fontquery import utils  # noqa: F401
 
 
-def load_json(release: str, packages: Optional[List[str]], args: argparse.Namespace, fcache: bool) -> Optional[str]:
-    out = None
-    fqc = None
-
-    c = ContainerImage(args.product, release, args.verbose)
+def load_json(release: str, packages: Optional[List[str]], args: argparse.Namespace, fcache: bool,
+              baseline: Union[str, concurrent.futures.Future, None] = None) -> Optional[str]:
+    c = image_class(args.backend)(args.product, release, args.verbose)
     c.target = args.target
+    c.pull_ttl = args.pull_ttl
     if not args.disable_update:
         if not c.pull(args):
             raise RuntimeError('`podman pull\' failed')
     if packages is None:
-        fqc = FontQueryCache(args.product, release, args.target)
-        if args.clean_cache:
-            fqc.delete()
-        if fcache:
-            if args.verbose:
-                print('* Reading JSON from cache', file=sys.stderr)
-            out = fqc.read()
-    if not out:
+        fqc = FontQueryCache(args.product, release, args.target,
+                             image_id=c.image_id)
+    else:
+        # Results after installing packages are specific to the package
+        # contents and the query parameters on top of the base image.
+        fqc = FontQueryCache(args.product, release, args.target,
+                             variant=package_digest(
+                                 packages,
+                                 utils.build_lang_flags(args.lang) +
+                                 (['--full-query'] if args.full_query
+                                  else [])),
+                             image_id=c.image_id)
+    if args.clean_cache:
+        fqc.delete()
+
+    def query() -> Optional[str]:
+        kw = dict(vars(args))
+        del kw['package']
         if packages is None:
-            kw = vars(args)
-            out = c.get_json(**kw)
-            if fcache:
-                if args.verbose:
-                    print('* Storing cache...', file=sys.stderr, end='')
-                if fqc.save(out):
-                    if args.verbose:
-                        print('done', file=sys.stderr)
-                else:
-                    if args.verbose:
-                        print('failed', file=sys.stderr)
-        else:
-            kw = vars(args)
-            del kw['package']
-            out = c.get_json_after_install(packages, **kw)
-
-    return out
+            return c.get_json(**kw)
+        return c.get_json_after_install(packages, baseline=baseline, **kw)
+
+    return fqc.get_or_compute(query, fcache, args.verbose)
+
+
+def load_pair(args: argparse.Namespace) -> Tuple[Optional[str], Optional[str]]:
+    """Load JSON without and with packages concurrently.
+
+    The baseline is waited for only when the result after installing
+    packages is merged with it.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as ex:
+        base = ex.submit(load_json, args.release, None, args,
+                         not args.disable_cache and not args.lang)
+        out = ex.submit(load_json, args.release, args.package, args,
+                        not args.disable_cache, base)
+        return base.result(), out.result()
+
+
+def load_manifest(fn: str) -> List[Tuple[str, List[str]]]:
+    """Load package sets from a manifest.
+
+    The manifest is YAML or JSON like:
+
+        sets:
+          - name: foo
+            packages:
+              - foo/*.rpm
+
+    Relative paths are resolved from the manifest's directory.
+    """
+    with open(fn, encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data.get('sets')
+    if not isinstance(data, list):
+        raise RuntimeError(f'No package sets in the manifest: {fn}')
+    base = Path(fn).parent
+    sets = []
+    for i, s in enumerate(data, 1):
+        if isinstance(s, list):
+            s = {'packages': s}
+        if not isinstance(s, dict) or not s.get('packages'):
+            raise RuntimeError(f'Invalid package set #{i} in {fn}')
+        packages = []
+        for p in s['packages']:
+            matched = sorted(glob.glob(str(base / p)))
+            if not matched:
+                raise RuntimeError(f'No such package: {p} in set #{i}')
+            packages += matched
+        sets.append((str(s.get('name', f'set{i:03d}')), packages))
+    names = [report_name(n) for n, _ in sets]
+    if len(set(names)) != len(names):
+        raise RuntimeError(f'Duplicate set names in {fn}')
+
+    return sets
+
+
+def report_name(name: str) -> str:
+    """Name of a set usable as a filename in the output directory"""
+    return re.sub(r'^\.', '_', re.sub(r'[^a-zA-Z0-9._+-]', '_', name))
+
+
+def write_diff(renderer, base: str, out: str, args: argparse.Namespace, fp) -> bool:
+    """Write a report of differences. Returns True if nothing changed"""
+    g = htmlformatter.generate_diff(renderer(), '',
+                                    json.loads(base),
+                                    json.loads(out),
+                                    not args.loose_comparison,
+                                    args.diff_only)
+    for s in next(g):
+        fp.write(s)
+    return next(g)
+
+
+def run_batch(renderer, base: str, args: argparse.Namespace) -> int:
+    """Evaluate package sets in a manifest against the baseline"""
+    sets = load_manifest(args.batch)
+    outdir = Path(args.output_dir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    ext = 'txt' if args.render == 'text' else args.render
+
+    def check(name: str, packages: List[str]) -> str:
+        # Don't let one set abort the others
+        try:
+            out = load_json(args.release, packages, args,
+                            not args.disable_cache, base)
+            if not out:
+                return 'failed'
+            with open(outdir / f'{report_name(name)}.{ext}', 'w',
+                      encoding='utf-8') as fp:
+                same = write_diff(renderer, base, out, args, fp)
+        except Exception as e:
+            print(f'** {name}: {e}', file=sys.stderr)
+            return 'failed'
+        return 'unchanged' if same else 'changed'
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as ex:
+        results = list(ex.map(lambda s: check(*s), sets))
+
+    with args.output:
+        width = max(len(n) for n, _ in sets)
+        for (name, packages), res in zip(sets, results):
+            args.output.write(f'{name:<{width}}  {res:<9}  '
+                              f'{len(packages)} package(s)\n')
+        args.output.write(f'* {results.count("changed")} changed, '
+                          f'{results.count("unchanged")} unchanged, '
+                          f'{results.count("failed")} failed\n')
+    if 'failed' in results:
+        return 2
+    return 1 if 'changed' in results else 0
 
 
 def main():
@@ -70,6 +181,16 @@ def main():
     parser.add_argument('--diff-only',
                         action='store_true',
                         help='Show diff only')
+    parser.add_argument('--batch',
+                        metavar='MANIFEST',
+                        help='Check package sets in MANIFEST against '
+                        'one baseline and write a report per set into '
+                        '--output-dir')
+    parser.add_argument('--backend',
+                        default='cli',
+                        choices=['cli', 'api'],
+                        help='How to operate containers. "api" to talk to '
+                        'the podman API socket')
     parser.add_argument('--disable-cache',
                         action='store_true',
                         help='Enforce processing everything '
@@ -77,9 +198,31 @@ def main():
     parser.add_argument('--disable-update',
                         action='store_true',
                         help='Do not update the container image')
+    parser.add_argument('--full-query',
+                        action='store_true',
+                        help='Query all languages after installing packages '
+                        'instead of only ones the packages may affect')
     parser.add_argument('-r', '--release',
                         default='rawhide',
                         help='Target release to check')
+    parser.add_argument('--pool-timeout',
+                        type=int,
+                        default=0,
+                        metavar='SECONDS',
+                        help='Keep a container running for queries and '
+                        'share it until SECONDS passed without any queries')
+    parser.add_argument('--pull-ttl',
+                        type=int,
+                        default=0,
+                        metavar='SECONDS',
+                        help='Do not check updates of the container image '
+                        'within SECONDS since the last pull')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of package sets to check in parallel '
+                        'with --batch')
     parser.add_argument('-l',
                         '--lang',
                         action='append',
@@ -90,7 +233,11 @@ def main():
     parser.add_argument('-o', '--output',
                         type=argparse.FileType('w'),
                         default='-',
-                        help='Output file')
+                        help='Output file. the summary goes here '
+                        'with --batch')
+    parser.add_argument('-O', '--output-dir',
+                        default='.',
+                        help='Output directory for reports with --batch')
     parser.add_argument('-P', '--product',
                         default='fedora',
                         choices=['fedora', 'centos'],
@@ -98,6 +245,12 @@ def main():
     parser.add_argument('-R', '--render',
                         default=list(renderer.keys())[0],
                         choices=renderer.keys())
+    parser.add_argument('--shards',
+                        type=int,
+                        default=1,
+                        metavar='N',
+                        help='Split languages into N containers '
+                        'to dump fonts data into JSON concurrently')
     parser.add_argument('-t',
                         '--target',
                         default='minimal',
@@ -112,13 +265,19 @@ def main():
                         '--version',
                         action='store_true',
                         help='Show version')
-    parser.add_argument('package', nargs='+',
+    parser.add_argument('package', nargs='*',
                         help='Test package to see difference')
 
     args = parser.parse_args()
+    ContainerImage.pool_timeout = args.pool_timeout
+    ContainerImage.pool_keep = True
     if args.version:
         print(importlib.metadata.version('fontquery'))
         sys.exit(0)
+    if not args.batch and not args.package:
+        parser.error('package or --batch is required')
+    if args.batch and args.package:
+        parser.error('package and --batch are exclusive')
     if not shutil.which('podman'):
         print('podman is not installed', file=sys.stderr)
         sys.exit(1)
@@ -129,24 +288,19 @@ def main():
         print(file=sys.stderr)
 
     print(f'* Comparison on {args.release}', file=sys.stderr)
-    if args.verbose:
-        print(f'* Package(s) being installed: {' '.join(args.package)}',
+    if args.verbose and args.package:
+        print(f'* Package(s) being installed: {" ".join(args.package)}',
               file=sys.stderr)
 
-    retval_a = load_json(args.release, None, args,
-                         not args.disable_cache and not args.lang)
-    retval_b = load_json(args.release, args.package, args,
-                         not args.disable_cache and not args.lang)
+    if args.batch:
+        retval_a = load_json(args.release, None, args,
+                             not args.disable_cache and not args.lang)
+        sys.exit(run_batch(renderer[args.render], retval_a, args))
+    retval_a, retval_b = load_pair(args)
 
     with args.output:
-        g = htmlformatter.generate_diff(renderer[args.render](), '',
-                                        json.loads(retval_a),
-                                        json.loads(retval_b),
-                                        not args.loose_comparison,
-                                        args.diff_only)
-        for s in next(g):
-            args.output.write(s)
-        ret = next(g)
+        ret = write_diff(renderer[args.render], retval_a, retval_b, args,
+                         args.output)
     sys.exit(0 if ret else 1)
 
 
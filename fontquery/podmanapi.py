@@ -0,0 +1,410 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Module to operate containers through the podman REST API."""
+
+import asyncio
+import contextlib
+import http.client
+import io
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import urllib.parse
+from typing import Dict, Iterator, List, Optional, Tuple
+from fontquery.container import (ContainerImage, CopyProgress,
+                                 full_image_id, session_name, write_tarball)
+
+API_PREFIX = '/v4.0.0/libpod'
+
+
+def default_socket() -> str:
+    """Path to the podman API socket for the current user"""
+    host = os.environ.get('CONTAINER_HOST', '')
+    if host.startswith('unix://'):
+        return host[len('unix://'):]
+    if os.getuid() == 0:
+        return '/run/podman/podman.sock'
+    runtime = os.environ.get('XDG_RUNTIME_DIR', f'/run/user/{os.getuid()}')
+    return os.path.join(runtime, 'podman', 'podman.sock')
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix domain socket"""
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def demux(stream, stderr=None) -> Tuple[bytes, bytes]:
+    """Split a multiplexed stream into stdout and stderr.
+
+    Each frame has a 8 bytes header, which is the stream type,
+    3 bytes padding and the size of the payload in big endian.
+    stderr is written into the given file object as it comes
+    if any.
+    """
+    out = io.BytesIO()
+    err = io.BytesIO()
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            break
+        kind = header[0]
+        size = struct.unpack('>I', header[4:])[0]
+        data = stream.read(size)
+        if kind == 1:
+            out.write(data)
+        elif kind == 2:
+            if stderr:
+                stderr.write(data.decode('utf-8', errors='replace'))
+            else:
+                err.write(data)
+    return out.getvalue(), err.getvalue()
+
+
+class LibpodClient:
+    """Client for the libpod REST API.
+
+    A connection is kept open and reused for requests. Requests which
+    hijack a connection for streaming use a dedicated connection.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 verbose: bool = False) -> None:
+        self._path = path or default_socket()
+        self._verbose = verbose
+        self._conn: Optional[UnixHTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def _url(self, path: str, params: Optional[Dict[str, str]]) -> str:
+        url = API_PREFIX + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        return url
+
+    def _send(self, conn: UnixHTTPConnection, method: str, url: str,
+              body=None) -> http.client.HTTPResponse:
+        headers = {}
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif body is not None and not isinstance(body, bytes):
+            headers['Content-Type'] = 'application/x-tar'
+        if self._verbose:
+            print(f'# {method} {url}', file=sys.stderr)
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            return conn.getresponse()
+        except FileNotFoundError as e:
+            raise RuntimeError('podman API socket is not available: '
+                               f'{self._path}. try `systemctl --user start '
+                               'podman.socket\'') from e
+
+    def _open(self, method: str, path: str,
+             params: Optional[Dict[str, str]] = None,
+             body=None) -> http.client.HTTPResponse:
+        """Send a request on the shared connection"""
+        url = self._url(path, params)
+        retry = body is None or isinstance(body, (bytes, dict, list))
+        while True:
+            if self._conn is None:
+                self._conn = UnixHTTPConnection(self._path)
+            try:
+                return self._send(self._conn, method, url, body)
+            except (ConnectionError, http.client.HTTPException):
+                # The server may have closed an idle connection
+                self._conn.close()
+                self._conn = None
+                if not retry:
+                    raise
+                retry = False
+
+    def request(self, method: str, path: str,
+                params: Optional[Dict[str, str]] = None,
+                body=None) -> Tuple[int, bytes]:
+        """Send a request and read the whole response"""
+        with self._lock:
+            res = self._open(method, path, params, body)
+            return res.status, res.read()
+
+    def call(self, method: str, path: str,
+             params: Optional[Dict[str, str]] = None, body=None):
+        """Send a request and decode the response as JSON.
+
+        RuntimeError is raised if the request failed.
+        """
+        status, data = self.request(method, path, params, body)
+        if status >= 400:
+            try:
+                msg = json.loads(data)['message']
+            except (ValueError, KeyError, TypeError):
+                msg = data.decode('utf-8', errors='replace')
+            raise RuntimeError(f'{method} {path} failed: {msg}')
+        return json.loads(data) if data else None
+
+    def image_id(self, name: str) -> Optional[str]:
+        """ID of an image in the same form as `podman images --no-trunc'.
+
+        None is returned if the image isn't available on local.
+        """
+        status, data = self.request(
+            'GET', '/images/' + urllib.parse.quote(name, safe='') + '/json')
+        if status == 404:
+            return None
+        if status >= 400:
+            raise RuntimeError(f'GET /images/{name}/json failed with '
+                               f'the status {status}')
+        return full_image_id(json.loads(data)['Id'])
+
+    def stream(self, method: str, path: str,
+               params: Optional[Dict[str, str]] = None,
+               body=None) -> http.client.HTTPResponse:
+        """Send a request on a new connection for hijacked streams"""
+        conn = UnixHTTPConnection(self._path)
+        res = self._send(conn, method, self._url(path, params), body)
+        if res.status >= 400:
+            data = res.read()
+            conn.close()
+            raise RuntimeError(f'{method} {path} failed: '
+                               f'{data.decode("utf-8", errors="replace")}')
+        return res
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+
+class ApiContainerImage(ContainerImage):
+    """Container helper working with the podman REST API.
+
+    Building and publishing images are still done by buildah.
+    """
+
+    # Clients shared between instances to reuse connections
+    _clients: Dict[str, LibpodClient] = {}
+
+    def __init__(self, product: str, version: str, verbose: bool = False,
+                 socket_path: Optional[str] = None):
+        super().__init__(product, version, verbose)
+        self._api = self.client(socket_path, verbose)
+
+    @classmethod
+    def client(cls, socket_path: Optional[str] = None,
+               verbose: bool = False) -> LibpodClient:
+        """Client shared for the socket"""
+        path = socket_path or default_socket()
+        with cls._image_state_lock:
+            if path not in cls._clients:
+                cls._clients[path] = LibpodClient(path, verbose)
+            return cls._clients[path]
+
+    def _image_path(self) -> str:
+        return '/images/' + urllib.parse.quote(self._get_fullnamespace(),
+                                               safe='')
+
+    def _has_image(self) -> bool:
+        status, _ = self._api.request('GET', self._image_path() + '/exists')
+        return status == 204
+
+    def _fetch_image(self, tool: str = 'podman') -> Optional[str]:
+        status, data = self._api.request(
+            'POST', '/images/pull',
+            {'reference': self._get_fullnamespace(), 'quiet': 'true'})
+        if status != 200:
+            return None
+        image_id = None
+        # The response is a series of JSON objects
+        decoder = json.JSONDecoder()
+        text = data.decode('utf-8')
+        pos = 0
+        while pos < len(text):
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+            if pos >= len(text):
+                break
+            obj, pos = decoder.raw_decode(text, pos)
+            if obj.get('error'):
+                if self.verbose:
+                    print(f'** {obj["error"]}', file=sys.stderr)
+                return None
+            image_id = obj.get('id', image_id)
+        return image_id
+
+    async def _ahas_image(self) -> bool:
+        return await asyncio.to_thread(self._has_image)
+
+    async def _afetch_image(self, tool: str = 'podman') -> Optional[str]:
+        return await asyncio.to_thread(self._fetch_image, tool)
+
+    async def aquery(self, mode, *args, **kwargs) -> str:
+        return await asyncio.to_thread(self.query, mode, *args, **kwargs)
+
+    def _local_image_id(self) -> Optional[str]:
+        try:
+            return self._api.image_id(self._get_fullnamespace())
+        except RuntimeError:
+            return None
+
+    def _get_local_digests(self) -> List[str]:
+        try:
+            data = self._api.call('GET', self._image_path() + '/json')
+        except RuntimeError:
+            return []
+        digests = [data.get('Digest', '')] + (data.get('RepoDigests') or [])
+        return [d.split('@')[-1] for d in digests if d]
+
+    def _create_container(self, command: Optional[List[str]] = None,
+                          entrypoint: Optional[List[str]] = None,
+                          volumes: Optional[List[str]] = None) -> str:
+        spec = {
+            'image': self._get_fullnamespace(),
+            'name': session_name(),
+            'stdin': True,
+        }
+        if command:
+            spec['command'] = command
+        if entrypoint:
+            spec['entrypoint'] = entrypoint
+        if volumes:
+            spec['mounts'] = []
+            for v in volumes:
+                src, dest, *opts = v.split(':')
+                spec['mounts'].append({'type': 'bind', 'source': src,
+                                       'destination': dest,
+                                       'options': ['rbind'] + opts})
+        return self._api.call('POST', '/containers/create', body=spec)['Id']
+
+    def _remove_container(self, cid: str) -> None:
+        try:
+            self._api.request('DELETE', f'/containers/{cid}',
+                              {'force': 'true', 'timeout': '0'})
+        except (OSError, RuntimeError):
+            pass
+
+    def _start_attached(self, cid: str) -> subprocess.CompletedProcess:
+        # Attach before starting to not miss any output
+        res = self._api.stream('POST', f'/containers/{cid}/attach',
+                               {'stream': 'true', 'stdout': 'true',
+                                'stderr': 'true'})
+        try:
+            self._api.call('POST', f'/containers/{cid}/start')
+            out, _ = demux(res, sys.stderr)
+        finally:
+            res.close()
+        code = self._api.call('POST', f'/containers/{cid}/wait')
+        return subprocess.CompletedProcess([cid], int(code), out)
+
+    def _run(self, endpoint_args=None, *args, pool=True, volumes=None, **kwargs) -> subprocess.CompletedProcess:
+        if (pool and not volumes and
+            (self.pool_timeout > 0 or self.sysroot)) or \
+           kwargs.get('try_run', False):
+            return super()._run(endpoint_args, *args, pool=pool,
+                                volumes=volumes, **kwargs)
+        self._ensure_image()
+        cid = self._create_container(endpoint_args or [], volumes=volumes)
+        try:
+            return self._start_attached(cid)
+        finally:
+            self._remove_container(cid)
+
+    @contextlib.contextmanager
+    def _create(self, endpoint_args=[], interactive=False, *args, volumes=None, **kwargs) -> Iterator[str]:
+        self._ensure_image()
+        if kwargs.get('try_run', False):
+            return
+        cid = self._create_container(
+            endpoint_args, ['/bin/bash'] if interactive else None, volumes)
+        try:
+            yield cid
+        finally:
+            self._remove_container(cid)
+
+    def _start(self, session='', *args, **kwargs) -> subprocess.CompletedProcess:
+        return self._start_attached(session)
+
+    def _exec(self, session='', cmd='/bin/bash', stderr=None, *args, **kwargs) -> subprocess.CompletedProcess:
+        status, _ = self._api.request('POST', f'/containers/{session}/start')
+        if status not in (204, 304):
+            raise RuntimeError(f'Unable to start a container: {session}')
+        cmd = cmd.split() if isinstance(cmd, str) else cmd
+        eid = self._api.call('POST', f'/containers/{session}/exec',
+                             body={'Cmd': cmd, 'AttachStdout': True,
+                                   'AttachStderr': True})['Id']
+        res = self._api.stream('POST', f'/exec/{eid}/start',
+                               body={'Detach': False})
+        try:
+            out, err = demux(res, None if stderr == subprocess.PIPE
+                             else sys.stderr)
+        finally:
+            res.close()
+        code = self._api.call('GET', f'/exec/{eid}/json')['ExitCode']
+        return subprocess.CompletedProcess(cmd, code, out, err)
+
+    def _commit(self, session='', *args, **kwargs) -> None:
+        if kwargs.get('try_run', False):
+            return
+        repo, tag = self._get_fullnamespace().rsplit(':', 1)
+        try:
+            self._api.call('POST', '/commit', {'container': session,
+                                               'repo': repo, 'tag': tag})
+        except RuntimeError as e:
+            print(f'** Failed to change image: {e}', file=sys.stderr)
+            return
+        self._set_state(local=True, image_id=None, pool=None)
+        print('** Image has been changed.', file=sys.stderr)
+
+    def _copy(self, session='', files=[]) -> bool:
+        try:
+            total = sum(os.stat(f).st_size for f in files)
+        except OSError as e:
+            print(f'** Unable to copy files into a container: {e}',
+                  file=sys.stderr)
+            return False
+        progress = CopyProgress(total)
+        rfd, wfd = os.pipe()
+        errors = []
+
+        def writer():
+            try:
+                with os.fdopen(wfd, 'wb') as fp:
+                    write_tarball(fp, files, progress)
+            except OSError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        try:
+            with os.fdopen(rfd, 'rb') as fp:
+                status, data = self._api.request(
+                    'PUT', f'/containers/{session}/archive',
+                    {'path': '/var/tmp/fontquery'}, fp)
+        finally:
+            thread.join()
+        progress.done()
+        if errors or status != 200:
+            msg = errors[0] if errors else data.decode('utf-8',
+                                                       errors='replace')
+            print(f'** Unable to copy files into a container: {msg}',
+                  file=sys.stderr)
+            return False
+        return True
+
+
+def image_class(backend: str) -> type:
+    """Class of container helper for the backend"""
+    if backend == 'api':
+        return ApiContainerImage
+    return ContainerImage
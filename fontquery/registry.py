@@ -0,0 +1,113 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Module to deal with container registries and pull records."""
+
+import fcntl
+import json
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from xdg import BaseDirectory
+from fontquery.cache import write_atomic
+
+MANIFEST_TYPES = [
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+]
+PULL_RECORD_FILE = 'pulls.json'
+
+
+def split_reference(ref: str) -> Tuple[str, str, str]:
+    """Split an image reference into registry, repository and tag."""
+    registry, path = ref.split('/', 1)
+    repo, tag = path.rsplit(':', 1) if ':' in path else (path, 'latest')
+    return registry, repo, tag
+
+
+class RegistryClient:
+    """Minimal client for the registry HTTP API v2"""
+
+    def __init__(self, url: str, timeout: float = 10) -> None:
+        self._url = url.rstrip('/')
+        self._timeout = timeout
+        self._tokens: Dict[str, str] = {}
+
+    def _get_token(self, challenge: str) -> Optional[str]:
+        m = re.match(r'Bearer\s+(.*)', challenge, re.I)
+        if not m:
+            return None
+        params = dict(re.findall(r'(\w+)="([^"]*)"', m.group(1)))
+        if 'realm' not in params:
+            return None
+        query = {k: v for k, v in params.items() if k in ['service', 'scope']}
+        url = params['realm'] + '?' + urllib.parse.urlencode(query)
+        with urllib.request.urlopen(url, timeout=self._timeout) as res:
+            data = json.load(res)
+        return data.get('token') or data.get('access_token')
+
+    def get_digest(self, repo: str, tag: str) -> Optional[str]:
+        """Get the digest of the manifest for repo:tag.
+
+        This only sends HEAD requests and doesn't download any layers.
+        Returns None if the registry isn't reachable.
+        """
+        url = f'{self._url}/v2/{repo}/manifests/{tag}'
+        headers = {'Accept': ', '.join(MANIFEST_TYPES)}
+        for _ in range(2):
+            if repo in self._tokens:
+                headers['Authorization'] = f'Bearer {self._tokens[repo]}'
+            req = urllib.request.Request(url, headers=headers, method='HEAD')
+            try:
+                with urllib.request.urlopen(req,
+                                            timeout=self._timeout) as res:
+                    return res.headers.get('Docker-Content-Digest')
+            except urllib.error.HTTPError as e:
+                if e.code != 401 or repo in self._tokens:
+                    return None
+                try:
+                    token = self._get_token(e.headers.get('WWW-Authenticate',
+                                                          ''))
+                except (OSError, ValueError):
+                    return None
+                if not token:
+                    return None
+                self._tokens[repo] = token
+            except OSError:
+                return None
+        return None
+
+
+class PullRecord:
+    """Record when images were pulled last time"""
+
+    def __init__(self) -> None:
+        self._fn = Path(BaseDirectory.save_cache_path('fontquery')) /\
+            PULL_RECORD_FILE
+
+    def _load(self) -> Dict[str, Dict[str, object]]:
+        try:
+            return json.loads(self._fn.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, ref: str) -> Optional[Dict[str, object]]:
+        return self._load().get(ref)
+
+    def update(self, ref: str, digest: Optional[str]) -> None:
+        try:
+            with open(self._fn.with_suffix('.lock'), 'a',
+                      encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                data = self._load()
+                data[ref] = {'time': time.time(), 'digest': digest}
+                write_atomic(self._fn,
+                             json.dumps(data, indent=4).encode('utf-8'))
+        except OSError:
+            pass
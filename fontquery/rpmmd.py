@@ -0,0 +1,242 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Module to compare installed packages against repository metadata."""
+
+import bz2
+import fcntl
+import gzip
+import io
+import json
+import lzma
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+from xdg import BaseDirectory
+from fontquery.cache import write_atomic
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+REPO_NS = '{http://linux.duke.edu/metadata/repo}'
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+PACKAGE_RECORD_DIR = 'packages'
+
+EVR = Tuple[str, str, str]
+Nevra = Tuple[str, str, str, str, str]
+
+# Packages in repositories loaded in this process, keyed by URL
+_repos: Dict[str, Dict[Tuple[str, str], EVR]] = {}
+_repos_lock = threading.Lock()
+
+
+def rpmvercmp(a: str, b: str) -> int:
+    """Compare version strings in the same way as rpm.
+
+    Returns -1, 0 or 1 if a is older than, same as or newer than b.
+    """
+    if a == b:
+        return 0
+    sa = re.findall(r'~|\^|[0-9]+|[a-zA-Z]+', a)
+    sb = re.findall(r'~|\^|[0-9]+|[a-zA-Z]+', b)
+    while sa or sb:
+        x = sa.pop(0) if sa else None
+        y = sb.pop(0) if sb else None
+        # Tilde sorts before anything, even the end of a string
+        if x == '~' or y == '~':
+            if x != y:
+                return -1 if x == '~' else 1
+            continue
+        # Caret sorts after the end of a string but before anything else
+        if x == '^' or y == '^':
+            if x is None:
+                return -1
+            if y is None:
+                return 1
+            if x != y:
+                return -1 if x == '^' else 1
+            continue
+        if x is None or y is None:
+            return -1 if x is None else 1
+        if x.isdigit() != y.isdigit():
+            # Numeric segments are newer than alphabetic ones
+            return 1 if x.isdigit() else -1
+        if x.isdigit():
+            x = x.lstrip('0') or '0'
+            y = y.lstrip('0') or '0'
+            if len(x) != len(y):
+                return 1 if len(x) > len(y) else -1
+        if x != y:
+            return 1 if x > y else -1
+    return 0
+
+
+def compare_evr(a: EVR, b: EVR) -> int:
+    """Compare (epoch, version, release)"""
+    for x, y in zip(a, b):
+        r = rpmvercmp(x or '0', y or '0')
+        if r != 0:
+            return r
+    return 0
+
+
+def parse_nevra(s: str) -> Nevra:
+    """Split name-[epoch:]version-release.arch"""
+    m = re.match(r'^(.+)-(?:(\d+):)?([^-]+)-([^-]+)\.([^.]+)$', s)
+    if not m:
+        raise RuntimeError(f'Invalid NEVRA: {s}')
+    name, epoch, version, release, arch = m.groups()
+    return name, epoch or '0', version, release, arch
+
+
+def _url(base: str, href: str = '') -> str:
+    if not urllib.parse.urlparse(base).scheme:
+        base = Path(base).absolute().as_uri()
+    return urllib.parse.urljoin(base.rstrip('/') + '/', href)
+
+
+def _decompress(fp: IO[bytes], href: str) -> IO[bytes]:
+    if href.endswith('.gz'):
+        return gzip.GzipFile(fileobj=fp)
+    if href.endswith('.xz'):
+        return lzma.LZMAFile(fp)
+    if href.endswith('.bz2'):
+        return bz2.BZ2File(fp)
+    if href.endswith('.zst'):
+        if zstandard is not None:
+            return zstandard.ZstdDecompressor().stream_reader(fp)
+        if shutil.which('zstd'):
+            # Decompress with the command line tool instead
+            with tempfile.TemporaryFile() as tmp:
+                shutil.copyfileobj(fp, tmp)
+                tmp.seek(0)
+                res = subprocess.run(['zstd', '-dc'], stdin=tmp,
+                                     capture_output=True, check=False)
+            if res.returncode != 0:
+                raise RuntimeError(f'Unable to decompress {href}')
+            return io.BytesIO(res.stdout)
+        raise RuntimeError(f'zstandard or zstd is required to read {href}')
+    return fp
+
+
+def iter_packages(url: str) -> Iterator[Tuple[str, str, EVR]]:
+    """Iterate (name, arch, evr) in the primary metadata of a repository"""
+    with urllib.request.urlopen(_url(url, 'repodata/repomd.xml')) as res:
+        repomd = ET.parse(res).getroot()
+    href = None
+    for data in repomd.iter(REPO_NS + 'data'):
+        if data.get('type') == 'primary':
+            href = data.find(REPO_NS + 'location').get('href')
+    if href is None:
+        raise RuntimeError(f'No primary metadata in {url}')
+    with urllib.request.urlopen(_url(url, href)) as res:
+        fp = _decompress(res, href)
+        try:
+            for _, e in ET.iterparse(fp):
+                if e.tag != COMMON_NS + 'package':
+                    continue
+                v = e.find(COMMON_NS + 'version')
+                yield (e.findtext(COMMON_NS + 'name'),
+                       e.findtext(COMMON_NS + 'arch'),
+                       (v.get('epoch') or '0', v.get('ver'), v.get('rel')))
+                e.clear()
+        finally:
+            fp.close()
+
+
+def load_repo(url: str) -> Dict[Tuple[str, str], EVR]:
+    """Newest (epoch, version, release) per (name, arch) in a repository.
+
+    Repositories are loaded once in a process.
+    """
+    with _repos_lock:
+        if url in _repos:
+            return _repos[url]
+    pkgs: Dict[Tuple[str, str], EVR] = {}
+    try:
+        for name, arch, evr in iter_packages(url):
+            if arch == 'src':
+                continue
+            if (name, arch) not in pkgs or \
+               compare_evr(evr, pkgs[(name, arch)]) > 0:
+                pkgs[(name, arch)] = evr
+    except (OSError, ET.ParseError, EOFError, lzma.LZMAError) as e:
+        raise RuntimeError(f'Unable to read repository {url}: {e}') from e
+    with _repos_lock:
+        _repos[url] = pkgs
+    return pkgs
+
+
+def pending_updates(packages: List[str],
+                    urls: List[str]) -> List[Tuple[str, str, str]]:
+    """
+    Find installed packages which have newer versions in repositories.
+
+    This doesn't take obsoletes and new dependencies into account.
+    Packages not in any repositories are ignored.
+
+    Args:
+        packages: Installed packages in NEVRA
+        urls: Base URLs or paths of repositories
+
+    Returns:
+        List of (name.arch, installed EVR, available EVR)
+    """
+    repos = [load_repo(u) for u in urls]
+    result = []
+    for p in packages:
+        name, epoch, version, release, arch = parse_nevra(p)
+        installed = (epoch, version, release)
+        newest = None
+        for repo in repos:
+            for a in [arch, 'noarch'] if arch != 'noarch' else [arch]:
+                evr = repo.get((name, a))
+                if evr and (newest is None or compare_evr(evr, newest) > 0):
+                    newest = evr
+        if newest and compare_evr(newest, installed) > 0:
+            result.append((f'{name}.{arch}', '{}:{}-{}'.format(*installed),
+                           '{}:{}-{}'.format(*newest)))
+    return result
+
+
+class PackageRecord:
+    """Record packages installed in images, bound to the image ID"""
+
+    def __init__(self, ref: str) -> None:
+        d = Path(BaseDirectory.save_cache_path('fontquery')) / \
+            PACKAGE_RECORD_DIR
+        d.mkdir(exist_ok=True)
+        self._fn = d / (re.sub(r'[/:]', '_', ref) + '.json')
+
+    def get(self, image_id: Optional[str]) -> Optional[List[str]]:
+        """Packages installed in the image. None if not known"""
+        try:
+            data = json.loads(self._fn.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if not image_id or data.get('image_id') != image_id:
+            return None
+        return data.get('packages')
+
+    def update(self, image_id: str, packages: List[str]) -> bool:
+        try:
+            with open(self._fn.with_suffix('.lock'), 'a',
+                      encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                return write_atomic(self._fn, json.dumps({
+                    'image_id': image_id,
+                    'packages': sorted(packages),
+                }, indent=4).encode('utf-8'))
+        except OSError:
+            return False
+
+    def delete(self) -> None:
+        self._fn.unlink(missing_ok=True)
@@ -19,7 +19,7 @@ Image setup script
 Usage: $PROG <options>
 Options:
 -h         Display this help and exit
--t=TARGET  Set a TARGET build (base, minimal, extra, all)
+-t=TARGET  Set a TARGET build (base, minimal, extra, all, slim)
 -c         Check for updates
 -i         Install a package
 -u         Update
@@ -34,6 +34,8 @@ OPT_UPDATE=0
 OPT_CHECKUPDATE=0
 OPT_INSTALL=0
 DIST="${DIST:-}"
+FC_SYSROOT=""
+SLIM_ROOT="/slim"
 
 detect_pip() {
     PIP=""
@@ -76,6 +78,115 @@ update_fontquery() {
     echo "** Updated version.txt to $BUILD_DATE"
 }
 
+# Whether the dnf cache is shared from the host
+dnf_cache_mounted() {
+    grep -qE ' /var/cache/(dnf|libdnf5) ' /proc/mounts
+}
+
+clean_dnf() {
+    if dnf_cache_mounted; then
+        debug "Keeping the dnf cache shared from the host"
+    else
+        $DNF -y $DNFOPT clean all
+    fi
+}
+
+update_fccache() {
+    if ! [ -x "$(command -v fc-cache)" ]; then
+        debug "fc-cache is not available"
+        return
+    fi
+    if [ $# -eq 0 ]; then
+        echo "** Updating fontconfig caches"
+    else
+        echo "** Updating fontconfig caches for $*"
+    fi
+    fc-cache -s ${FC_SYSROOT:+-y "$FC_SYSROOT"} "$@"
+}
+
+verify_fccache() {
+    if ! [ -x "$(command -v fc-cache)" ]; then
+        return
+    fi
+    echo "** Verifying fontconfig caches"
+    # Any directories still being cached mean caches aren't reusable
+    stale=$(fc-cache -s ${FC_SYSROOT:+-y "$FC_SYSROOT"} -v 2>&1 | grep ': caching, ' || :)
+    if [ -n "$stale" ]; then
+        echo "Error: fontconfig caches are not up to date:" >&2
+        echo "$stale" >&2
+        exit 1
+    fi
+}
+
+# Install only what queries need into $SLIM_ROOT
+make_slim() {
+    echo "** Making a slim root in $SLIM_ROOT"
+    # Python which fontquery has been installed for
+    PY=$(head -1 /usr/local/bin/fontquery-client | sed -e 's/^#! *//')
+    # Pin exactly what is installed here so that the slim image gives
+    # the same results as the full one. dnf fails if any of them are gone
+    # from the repositories.
+    qf='%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}\n'
+    pkgs=$(find /usr/share/fonts /usr/share/X11/fonts /etc/fonts /usr/share/fontconfig -mindepth 1 2>/dev/null | xargs -r rpm -qf --qf "$qf" 2>/dev/null | grep -v ' ' | sort -u)
+    if ! sysrel=$(rpm -q --whatprovides system-release --qf "$qf") ||
+       ! python=$(rpm -qf --qf "$qf" "$(readlink -f "$PY")") ||
+       ! base=$(rpm -q --qf "$qf" fontconfig rpm git-core ca-certificates bash coreutils) ||
+       ! pyfiles=$(python_deps) ||
+       ! pymods=$(echo "$pyfiles" | xargs -r rpm -qf --qf "$qf"); then
+        echo "Error: Unable to determine packages to install into $SLIM_ROOT" >&2
+        exit 1
+    fi
+    pkgs="$pkgs $sysrel $python $base $pymods"
+    mkdir -p "$SLIM_ROOT/etc/pki"
+    cp -a /etc/pki/rpm-gpg "$SLIM_ROOT/etc/pki/"
+    if ! $DNF -y $DNFOPT --installroot="$SLIM_ROOT" --releasever="$VERSION_ID" \
+         --setopt=reposdir=/etc/yum.repos.d --setopt=install_weak_deps=False \
+         --setopt=tsflags=nodocs \
+         install $pkgs; then
+        echo "Error: Unable to install the same packages into $SLIM_ROOT. Rebuild the image to pick up the latest packages" >&2
+        exit 1
+    fi
+    $DNF -y $DNFOPT --installroot="$SLIM_ROOT" clean all
+    rm -rf "$SLIM_ROOT"/var/cache/dnf "$SLIM_ROOT"/var/cache/libdnf5
+    echo "** Copying fontquery"
+    cp -a /usr/local/. "$SLIM_ROOT/usr/local/"
+    # Languages may come from anaconda, which isn't installed
+    mkdir -p "$SLIM_ROOT/etc/fontquery"
+    $PY -c 'from fontquery import client; print("\n".join(client.defaultLangList))' > "$SLIM_ROOT/etc/fontquery/langs"
+    echo "** Checking fontquery in $SLIM_ROOT"
+    if ! chroot "$SLIM_ROOT" /usr/local/bin/fontquery-client -m langs > /dev/null; then
+        echo "Error: fontquery doesn't work in $SLIM_ROOT" >&2
+        exit 1
+    fi
+    FC_SYSROOT="$SLIM_ROOT"
+}
+
+# Files of python modules which fontquery depends on, installed by rpm.
+# pip doesn't install them into /usr/local when they are already there.
+# Keep this in sync with dependencies in pyproject.toml.
+python_deps() {
+    $PY -c '
+import importlib, os
+for m in ["langtable", "yaml", "termcolor", "xdg", "markdown"]:
+    fn = os.path.realpath(importlib.import_module(m).__file__)
+    if not fn.startswith("/usr/local/"):
+        print(fn)'
+}
+
+# Directories owned by installed packages which have their fonts in.
+# Parents like /usr/share/fonts are left out since fc-cache scans
+# directories recursively.
+font_dirs() {
+    names=$(rpm -qp --qf '%{NAME}\n' "$@" 2>/dev/null) || return 0
+    files=$(rpm -ql $names | grep -E '^/usr/(share|local/share)/fonts/|^/usr/share/X11/fonts/' || :)
+    if [ -z "$files" ]; then
+        return 0
+    fi
+    echo "$files" | while read f; do
+        [ -d "$f" ] || dirname "$f"
+    done | sort -u | grep -Fx -f <(echo "$files") || :
+}
+
 while getopts chit:uv OPT; do
     case "$OPT" in
         h)
@@ -143,6 +254,10 @@ case "$ID" in
             echo "Error: dnf not found" >& 2
             exit 1
         fi
+        if dnf_cache_mounted; then
+            echo "** Using the dnf cache shared from the host"
+            DNF="$DNF --setopt=keepcache=True"
+        fi
         ;;
     *)
         echo "Error: Unsupported distribution: $ID" >&2
@@ -158,6 +273,7 @@ if test "$OPT_UPDATE" -eq 1; then
             $DNF -y update --setopt=protected_packages=,
             EXIT_STATUS=$?
             update_fontquery
+            update_fccache
             ;;
         *)
             echo "Error: Unsupported distribution: $ID" >&2
@@ -179,6 +295,11 @@ if test "$OPT_INSTALL" -eq 1; then
             done
             echo $DNF -y install "${args[@]}"
             $DNF -y install "${args[@]}"
+            # Rescan only directories the packages touch
+            dirs=($(font_dirs "${args[@]}"))
+            if [ ${#dirs[@]} -gt 0 ]; then
+                update_fccache "${dirs[@]}"
+            fi
             ;;
         *)
             echo "Error: Unsupported distribution: $ID" >&2
@@ -214,7 +335,7 @@ case "$ID" in
                 else
                     echo "** Installing python packages"; $DNF -y $DNFOPT install python3-pip
                 fi
-                echo "** Cleaning up dnf cache"; $DNF -y $DNFOPT clean all
+                echo "** Cleaning up dnf cache"; clean_dnf
                 update_fontquery
                 ;;
             minimal)
@@ -224,7 +345,10 @@ case "$ID" in
                 else
                     $DNF -y $DNFOPT --setopt=install_weak_deps=False install @fonts
                 fi
-                $DNF -y $DNFOPT clean all
+                clean_dnf
+                ;;
+            slim)
+                make_slim
                 ;;
             extra)
                 echo "** Installing extra font packages"
@@ -233,11 +357,11 @@ case "$ID" in
                 else
                     $DNF -y $DNFOPT install langpacks*
                 fi
-                $DNF -y $DNFOPT clean all
+                clean_dnf
                 ;;
             all)
                 echo "** Installing all font packages"
-                $DNF -y $DNFOPT --setopt=install_weak_deps=False install --skip-broken -x bicon-fonts -x root-fonts -x wine*-fonts -x php-tcpdf*-fonts -x texlive*-fonts -x mathgl-fonts -x python*-matplotlib-data-fonts *-fonts && $DNF -y clean all
+                $DNF -y $DNFOPT --setopt=install_weak_deps=False install --skip-broken -x bicon-fonts -x root-fonts -x wine*-fonts -x php-tcpdf*-fonts -x texlive*-fonts -x mathgl-fonts -x python*-matplotlib-data-fonts *-fonts && clean_dnf
                 ;;
             *)
                 echo "Error: Unknown target: $OPT_TARGET" >&2
@@ -261,7 +385,7 @@ case "$ID" in
                 fi
                 echo "** Installing anaconda-core"; $DNF -y install anaconda-core
                 echo "** Installing python packages"; $DNF -y install python3-pip
-                echo "** Cleaning up dnf cache"; $DNF -y clean all
+                echo "** Cleaning up dnf cache"; clean_dnf
                 update_fontquery
                 ;;
             minimal)
@@ -271,7 +395,10 @@ case "$ID" in
                 else
                     $DNF -y --setopt=install_weak_deps=False install @fonts
                 fi
-                $DNF -y clean all
+                clean_dnf
+                ;;
+            slim)
+                make_slim
                 ;;
             extra)
                 echo "** Installing extra font packages"
@@ -280,11 +407,11 @@ case "$ID" in
                 else
                     $DNF -y install langpacks*
                 fi
-                $DNF -y clean all
+                clean_dnf
                 ;;
             all)
                 echo "** Installing all font packages"
-                $DNF -y --setopt=install_weak_deps=False install --skip-broken -x bicon-fonts -x root-fonts -x wine*-fonts -x php-tcpdf*-fonts -x texlive*-fonts -x mathgl-fonts -x python*-matplotlib-data-fonts *-fonts && $DNF -y clean all
+                $DNF -y --setopt=install_weak_deps=False install --skip-broken -x bicon-fonts -x root-fonts -x wine*-fonts -x php-tcpdf*-fonts -x texlive*-fonts -x mathgl-fonts -x python*-matplotlib-data-fonts *-fonts && clean_dnf
                 ;;
             *)
                 echo "Error: Unknown target: $OPT_TARGET" >&2
@@ -297,3 +424,6 @@ case "$ID" in
         exit 1
         ;;
 esac
+
+update_fccache
+verify_fccache
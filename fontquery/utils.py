@@ -5,17 +5,33 @@
 """Shared utility functions for fontquery."""
 
 import argparse
+import asyncio
+import contextlib
+import json
+import os
 import re
 import shutil
 import subprocess
 import sys
-from typing import List, Optional
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
     from fontquery import client  # noqa: F401
 except ModuleNotFoundError:
     client = None
 
+# Fields identifying where a result of JSON comes from
+HEADER_KEYS = ['id', 'version_id', 'pattern', 'fq_id']
+# Families fontquery-client dumps into JSON, in the same order
+DEFAULT_FAMILIES = ['sans-serif', 'serif', 'monospace', 'system-ui']
+# Suffix of targets which have only what queries need
+SLIM_SUFFIX = '-slim'
+
+# How many commands can run at once through run_async()
+max_concurrency = os.cpu_count() or 4
+_semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+
 
 def normalize_release(release: str, product: str) -> str:
     """Normalize release name for CentOS Stream."""
@@ -48,23 +64,16 @@ def get_fontquery_client_path() -> str:
     raise RuntimeError('fontquery-client not found')
 
 
-def run_container_query(release: str, args: argparse.Namespace, mode: str,
-                       extra_args: Optional[List[str]] = None) -> str:
-    """
-    Run fontquery query in container or locally.
-
-    Args:
-        release: Release name (e.g., 'rawhide', 'local', '40')
-        args: Parsed command line arguments
-        mode: Query mode (e.g., 'json', 'fcmatch')
-        extra_args: Additional arguments to pass to query
+def image_target(args: argparse.Namespace) -> str:
+    """Target of images to query, which is a slim one if requested."""
+    if getattr(args, 'slim', False):
+        return args.target + SLIM_SUFFIX
+    return args.target
 
-    Returns:
-        Query output as string
 
-    Raises:
-        RuntimeError: If query execution fails
-    """
+def build_query_cmdline(release: str, args: argparse.Namespace, mode: str,
+                        extra_args: Optional[List[str]] = None) -> List[str]:
+    """Build a command line to run fontquery query."""
     release = normalize_release(release, args.product)
     extra_args = extra_args or []
 
@@ -74,7 +83,7 @@ def run_container_query(release: str, args: argparse.Namespace, mode: str,
     else:
         cmdline = [
             'podman', 'run', '--rm',
-            f'ghcr.io/fedora-i18n/fontquery/{args.product}/{args.target}:{release}',
+            f'ghcr.io/fedora-i18n/fontquery/{args.product}/{image_target(args)}:{release}',
             '-m', mode
         ]
 
@@ -84,9 +93,203 @@ def run_container_query(release: str, args: argparse.Namespace, mode: str,
     if args.verbose:
         print('# ' + ' '.join(cmdline), file=sys.stderr)
 
+    return cmdline
+
+
+def run_container_query(release: str, args: argparse.Namespace, mode: str,
+                       extra_args: Optional[List[str]] = None) -> str:
+    """
+    Run fontquery query in container or locally.
+
+    Args:
+        release: Release name (e.g., 'rawhide', 'local', '40')
+        args: Parsed command line arguments
+        mode: Query mode (e.g., 'json', 'fcmatch')
+        extra_args: Additional arguments to pass to query
+
+    Returns:
+        Query output as string
+
+    Raises:
+        RuntimeError: If query execution fails
+    """
+    cmdline = build_query_cmdline(release, args, mode, extra_args)
     result = subprocess.run(cmdline, stdout=subprocess.PIPE, check=False)
     if result.returncode != 0:
         sys.tracebacklimit = 0
         raise RuntimeError(f'Query command failed with error code {result.returncode}')
 
     return result.stdout.decode('utf-8')
+
+
+def split_shards(items: List[str], shards: int) -> List[List[str]]:
+    """Split items into shards in the original order."""
+    shards = max(1, min(shards, len(items)))
+    size, rest = divmod(len(items), shards)
+    result = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < rest else 0)
+        result.append(items[start:end])
+        start = end
+    return result
+
+
+def _ordering(items: List[str]) -> Dict[str, int]:
+    order: Dict[str, int] = {}
+    for i in items:
+        order.setdefault(i, len(order))
+    return order
+
+
+def merge_data(docs: List[Dict[str, Any]],
+               langs: Optional[List[str]] = None,
+               families: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Merge partial fontquery results into one.
+
+    Args:
+        docs: Results parsed from JSON
+        langs: Order of languages. the order of appearance if None
+        families: Order of families. DEFAULT_FAMILIES goes first if None
+
+    Returns:
+        Result ordered as if it was queried at once
+
+    Raises:
+        RuntimeError: If results don't come from the same environment
+                      or have conflicting records
+    """
+    if not docs:
+        raise RuntimeError('No results to merge')
+    header = {k: docs[0].get(k) for k in HEADER_KEYS}
+    records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    seen_langs: List[str] = []
+    seen_families: List[str] = []
+    for doc in docs:
+        for k in HEADER_KEYS:
+            if doc.get(k) != header[k]:
+                raise RuntimeError(f'Unable to merge results: {k} mismatch: '
+                                   f'{header[k]} vs {doc.get(k)}')
+        for f in doc['fonts']:
+            key = (f['lang'], f['alias'])
+            if key in records:
+                if records[key] != f:
+                    raise RuntimeError('Unable to merge results: conflicting '
+                                       f'records for {key[0]}/{key[1]}')
+                continue
+            records[key] = f
+            if f['lang'] not in seen_langs:
+                seen_langs.append(f['lang'])
+            if f['alias'] not in seen_families:
+                seen_families.append(f['alias'])
+    lorder = _ordering((langs or []) + seen_langs)
+    forder = _ordering((families or DEFAULT_FAMILIES) + seen_families)
+    fonts = sorted(records.values(),
+                   key=lambda f: (lorder[f['lang']], forder[f['alias']]))
+    result = dict(header)
+    result.update({k: v for k, v in docs[0].items()
+                   if k not in HEADER_KEYS and k != 'fonts'})
+    result['fonts'] = fonts
+
+    return result
+
+
+def merge_json_shards(outputs: List[str]) -> str:
+    """
+    Merge JSON outputs of fontquery queried per shard.
+
+    Args:
+        outputs: JSON strings in the order of shards
+
+    Returns:
+        JSON string as if it was queried at once
+
+    Raises:
+        RuntimeError: If outputs don't come from the same environment
+    """
+    return json.dumps(merge_data([json.loads(out) for out in outputs]),
+                      indent=4)
+
+
+def replace_langs(base: str, update: str, langs: List[str]) -> str:
+    """
+    Replace results for some languages in a fontquery result.
+
+    Args:
+        base: JSON string of the whole result
+        update: JSON string queried only for langs
+        langs: Languages queried in update
+
+    Returns:
+        JSON string as if the whole result was queried where update was
+
+    Raises:
+        RuntimeError: If results don't come from the same environment
+    """
+    bdoc = json.loads(base)
+    udoc = json.loads(update)
+    kept = dict(udoc)
+    kept['fonts'] = [f for f in bdoc['fonts'] if f['lang'] not in langs]
+    for k in HEADER_KEYS:
+        if bdoc.get(k) != udoc.get(k):
+            raise RuntimeError(f'Unable to merge results: {k} mismatch: '
+                               f'{bdoc.get(k)} vs {udoc.get(k)}')
+    order = [f['lang'] for f in bdoc['fonts']] + langs
+    return json.dumps(merge_data([kept, udoc], order), indent=4)
+
+
+def async_limit() -> asyncio.Semaphore:
+    """Semaphore limiting commands run by run_async() in the running loop."""
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = asyncio.Semaphore(max_concurrency)
+        _semaphores[loop] = sem
+    return sem
+
+
+async def run_async(cmdline: List[str], stdout=subprocess.PIPE, stderr=None,
+                    cleanup: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+    """
+    Run a command within the concurrency limit.
+
+    Args:
+        cmdline: Command line to run
+        stdout: Where the standard output goes
+        stderr: Where the standard error goes
+        cleanup: Command line to run when cancelled, e.g. to remove
+                 a container left by the killed command
+
+    Returns:
+        CompletedProcess of the command
+    """
+    async with async_limit():
+        proc = await asyncio.create_subprocess_exec(*cmdline, stdout=stdout,
+                                                    stderr=stderr)
+        try:
+            out, err = await proc.communicate()
+        except asyncio.CancelledError:
+            with contextlib.suppress(ProcessLookupError):
+                proc.kill()
+            await proc.wait()
+            if cleanup:
+                proc = await asyncio.create_subprocess_exec(
+                    *cleanup, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL)
+                await proc.wait()
+            raise
+    return subprocess.CompletedProcess(cmdline, proc.returncode, out, err)
+
+
+async def arun_container_query(release: str, args: argparse.Namespace,
+                               mode: str,
+                               extra_args: Optional[List[str]] = None) -> str:
+    """Asynchronous version of run_container_query()."""
+    cmdline = build_query_cmdline(release, args, mode, extra_args)
+    result = await run_async(cmdline)
+    if result.returncode != 0:
+        sys.tracebacklimit = 0
+        raise RuntimeError(f'Query command failed with error code {result.returncode}')
+
+    return result.stdout.decode('utf-8')
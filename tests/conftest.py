@@ -65,3 +65,10 @@ def mock_version_file(tmp_path):
     version_file = tmp_path / "version.txt"
     version_file.write_text("1.33\n")
     return version_file
+
+
+@pytest.fixture(autouse=True)
+def isolate_cache_stats(monkeypatch):
+    """Don't carry cache statistics over tests."""
+    from fontquery.cache import FontQueryCache
+    monkeypatch.setattr(FontQueryCache, '_stats', {})
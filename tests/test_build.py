@@ -0,0 +1,158 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for build module."""
+
+import argparse
+import threading
+from unittest.mock import patch
+from fontquery.build import print_report, run_matrix
+from fontquery.container import UpdateStatus
+
+
+def make_args(**kwargs):
+    args = dict(jobs=4, push=False, layers=False, skip_build=False,
+                update=False)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+class TestMatrix:
+    """Tests for building a matrix of images."""
+
+    def test_order(self):
+        """Test that targets are built in order per product and release."""
+        built = []
+
+        def do_build(product, release, target, push, args):
+            built.append((product, release, target))
+            return True
+        with patch('fontquery.build.do_build', side_effect=do_build):
+            results = run_matrix(['fedora', 'centos'], ['rawhide', '10'],
+                                 ['all', 'minimal', 'extra'], make_args())
+        assert len(results) == 12
+        for p in ['fedora', 'centos']:
+            for r in ['rawhide', '10']:
+                assert [t for pp, rr, t in built if (pp, rr) == (p, r)] == \
+                    ['minimal', 'extra', 'all']
+        assert all(res == {'build': 'built', 'push': '-'}
+                   for res in results.values())
+
+    def test_concurrent(self):
+        """Test that builds of different releases run at once."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def do_build(product, release, target, push, args):
+            barrier.wait()
+            return True
+        with patch('fontquery.build.do_build', side_effect=do_build):
+            results = run_matrix(['fedora'], ['rawhide', '40'], ['minimal'],
+                                 make_args(jobs=2))
+        assert [r['build'] for r in results.values()] == ['built', 'built']
+
+    def test_failure_skips_later_targets(self, capsys):
+        """Test that targets based on a failed one aren't built."""
+        def do_build(product, release, target, push, args):
+            if target == 'extra':
+                raise RuntimeError('no such image')
+            return True
+        with patch('fontquery.build.do_build', side_effect=do_build), \
+             patch('fontquery.build.do_push', return_value=True) as push:
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra', 'all'],
+                                 make_args(push=True))
+        assert [r['build'] for r in results.values()] == \
+            ['built', 'failed', 'skipped']
+        assert results[('fedora', '40', 'minimal')]['push'] == 'pushed'
+        assert push.call_count == 1
+        assert 'fedora 40: no such image' in capsys.readouterr().err
+        assert not print_report(results)
+
+    def test_up_to_date(self):
+        """Test that images up to date don't stop the next targets."""
+        def do_build(product, release, target, push, args):
+            if target == 'minimal':
+                return UpdateStatus.UP_TO_DATE
+            return UpdateStatus.UPDATED
+        with patch('fontquery.build.do_build', side_effect=do_build), \
+             patch('fontquery.build.do_push', return_value=True) as push:
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra', 'all'],
+                                 make_args(push=True, update=True))
+        assert [r['build'] for r in results.values()] == \
+            ['up to date', 'built', 'built']
+        assert [r['push'] for r in results.values()] == \
+            ['-', 'pushed', 'pushed']
+        assert push.call_count == 2
+        assert print_report(results)
+
+    def test_push_overlaps_builds(self):
+        """Test that a built image is pushed while the next is built."""
+        pushed = threading.Event()
+
+        def do_build(product, release, target, push, args):
+            if target == 'extra':
+                assert pushed.wait(5)
+            return True
+
+        def do_push(product, release, target, args):
+            pushed.set()
+            return True
+        with patch('fontquery.build.do_build', side_effect=do_build), \
+             patch('fontquery.build.do_push', side_effect=do_push):
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra'],
+                                 make_args(push=True))
+        assert print_report(results)
+
+    def test_layers(self):
+        """Test that all targets are built at once with --layers."""
+        with patch('fontquery.build.do_build_stages',
+                   return_value={'minimal': True, 'extra': True}) as stages:
+            results = run_matrix(['fedora'], ['40'], ['extra', 'minimal'],
+                                 make_args(layers=True))
+        assert stages.call_args.args[:3] == ('fedora', '40',
+                                             ['minimal', 'extra'])
+        assert [r['build'] for r in results.values()] == ['built', 'built']
+
+    def test_layers_failure(self):
+        """Test that targets built with --layers are reported separately."""
+        built = {'minimal': True, 'minimal-slim': False, 'extra': True,
+                 'extra-slim': True, 'all': False, 'all-slim': False}
+        with patch('fontquery.build.do_build_stages', return_value=built), \
+             patch('fontquery.build.do_push', return_value=True) as push:
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra', 'all'],
+                                 make_args(layers=True, slim=True, push=True))
+        assert [r['build'] for r in results.values()] == \
+            ['built', 'failed', 'built', 'built', 'failed', 'skipped']
+        assert [r['push'] for r in results.values()] == \
+            ['pushed', '-', 'pushed', 'pushed', '-', '-']
+        assert push.call_count == 3
+        assert not print_report(results)
+
+        built = {'minimal': False, 'extra': True}
+        with patch('fontquery.build.do_build_stages', return_value=built):
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra'],
+                                 make_args(layers=True))
+        assert [r['build'] for r in results.values()] == \
+            ['failed', 'skipped']
+
+        with patch('fontquery.build.do_build_stages',
+                   side_effect=RuntimeError('no such image')):
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra'],
+                                 make_args(layers=True))
+        assert [r['build'] for r in results.values()] == \
+            ['failed', 'skipped']
+
+    def test_slim(self):
+        """Test that slim images are built after each target."""
+        built = []
+
+        def do_build(product, release, target, push, args):
+            built.append(target)
+            if target == 'minimal-slim':
+                raise RuntimeError('no space left')
+            return True
+        with patch('fontquery.build.do_build', side_effect=do_build):
+            results = run_matrix(['fedora'], ['40'], ['minimal', 'extra'],
+                                 make_args(slim=True))
+        assert built == ['minimal', 'minimal-slim', 'extra', 'extra-slim']
+        assert [r['build'] for r in results.values()] == \
+            ['built', 'failed', 'built', 'built']
@@ -3,6 +3,7 @@
 
 """Tests for cache module."""
 
+import hashlib
 import pytest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -30,6 +31,18 @@ class TestFontQueryCache:
         expected_dir = cache_base / 'fedora-40-minimal'
         assert expected_dir.exists()
 
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_init_with_cache_dir_created_by_others(self, mock_cache_path,
+                                                   mock_run, tmp_path):
+        """Test that a cache directory created concurrently is accepted."""
+        mock_cache_path.return_value = str(tmp_path)
+        (tmp_path / 'fedora-40-minimal').mkdir()
+
+        # Pretend it was created right after it was checked
+        with patch('pathlib.Path.exists', return_value=False):
+            FontQueryCache('fedora', '40', 'minimal')
+
     @patch('subprocess.run')
     @patch('fontquery.cache.BaseDirectory.save_cache_path')
     def test_filename_property(self, mock_cache_path, mock_run, tmp_path):
@@ -177,3 +190,705 @@ class TestFontQueryCache:
         cache = FontQueryCache('fedora', '40', 'minimal')
         data = cache.read()
         assert data is None
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_save_leaves_no_temporary_files(self, mock_cache_path, mock_run, tmp_path):
+        """Test that save renames its temporary file onto the entry."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:atomic\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        assert cache.save('{"test": "data"}') is True
+        assert cache.save('{"test": "more"}') is True
+
+        files = [p.name for p in (cache_base / 'fedora-40-minimal').iterdir()]
+        assert files == ['sha256:atomic.json']
+        assert cache.read() == '{"test": "more"}'
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_lock_serializes_writers(self, mock_cache_path, mock_run, tmp_path):
+        """Test that a second lock holder waits for the first one."""
+        import threading
+
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:locked\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        events = []
+        entered = threading.Event()
+
+        def waiter():
+            entered.wait()
+            with cache.lock():
+                events.append('second')
+
+        t = threading.Thread(target=waiter)
+        t.start()
+        with cache.lock():
+            entered.set()
+            t.join(timeout=0.2)
+            assert t.is_alive()
+            events.append('first')
+        t.join()
+        assert events == ['first', 'second']
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_lock_without_image(self, mock_cache_path, mock_run, tmp_path):
+        """Test that lock is a no-op when no image is available."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 1
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        with cache.lock():
+            pass
+
+
+class TestGetOrCompute:
+    """Tests for FontQueryCache.get_or_compute and aget_or_compute."""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        result = MagicMock(returncode=0,
+                           stdout=b'sha256:' + b'a' * 64 + b'\n')
+        with patch('fontquery.cache.BaseDirectory.save_cache_path',
+                   return_value=str(tmp_path)), \
+             patch('subprocess.run', return_value=result):
+            yield FontQueryCache('fedora', '40', 'minimal')
+
+    def test_miss_and_hit(self, cache):
+        """Test that a result is computed once and stored."""
+        fn = MagicMock(return_value='{"fonts": []}')
+        assert cache.get_or_compute(fn) == '{"fonts": []}'
+        assert cache.get_or_compute(fn) == '{"fonts": []}'
+        assert fn.call_count == 1
+        assert cache.read() == '{"fonts": []}'
+
+    def test_stored_while_waiting(self, cache):
+        """Test that an entry stored by others while locking is used."""
+        fn = MagicMock()
+        real_lock = cache.lock
+
+        def lock():
+            cache.save('{"fonts": [1]}')
+            return real_lock()
+        with patch.object(cache, 'lock', side_effect=lock):
+            assert cache.get_or_compute(fn) == '{"fonts": [1]}'
+        fn.assert_not_called()
+
+    def test_disabled(self, cache):
+        """Test that nothing is read or stored if disabled."""
+        cache.save('{"fonts": []}')
+        fn = MagicMock(return_value='{"fonts": [1]}')
+        assert cache.get_or_compute(fn, False) == '{"fonts": [1]}'
+        assert cache.read() == '{"fonts": []}'
+
+    def test_failure_is_not_stored(self, cache):
+        """Test that a failed computation isn't stored."""
+        assert cache.get_or_compute(lambda: None) is None
+        assert cache.read() is None
+
+    def test_async(self, cache):
+        """Test that coroutine functions are supported."""
+        import asyncio
+
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            return '{"fonts": []}'
+        for _ in range(2):
+            assert asyncio.run(cache.aget_or_compute(fn)) == '{"fonts": []}'
+        assert asyncio.run(cache.aget_or_compute(fn, False)) == \
+            '{"fonts": []}'
+        assert len(calls) == 2
+
+
+class TestLocalFingerprint:
+    """Tests for local_fingerprint function."""
+
+    @pytest.fixture
+    def local_env(self, tmp_path, monkeypatch):
+        confdir = tmp_path / 'etc' / 'fonts'
+        confdir.mkdir(parents=True)
+        (confdir / 'fonts.conf').write_text('<fontconfig/>')
+        fontdir = tmp_path / 'fonts'
+        (fontdir / 'noto').mkdir(parents=True)
+        rpmdb = tmp_path / 'rpm'
+        rpmdb.mkdir()
+        (rpmdb / 'rpmdb.sqlite').write_bytes(b'db')
+        monkeypatch.setattr('fontquery.cache.FC_CONFIG_PATHS', [str(confdir)])
+        monkeypatch.setattr('fontquery.cache.FONT_DIR_PATHS', [str(fontdir)])
+        monkeypatch.setattr('fontquery.cache.RPMDB_PATHS', [str(rpmdb)])
+        return confdir, fontdir, rpmdb
+
+    def test_stable_when_unchanged(self, local_env):
+        """Test that the fingerprint is stable for an unchanged system."""
+        from fontquery.cache import local_fingerprint
+
+        assert local_fingerprint() == local_fingerprint()
+
+    def test_changes_with_config(self, local_env):
+        """Test that editing fontconfig config changes the fingerprint."""
+        from fontquery.cache import local_fingerprint
+
+        confdir, _, _ = local_env
+        before = local_fingerprint()
+        (confdir / 'fonts.conf').write_text('<fontconfig><dir>/x</dir></fontconfig>')
+        assert local_fingerprint() != before
+
+    def test_changes_with_font_dirs(self, local_env):
+        """Test that adding a font directory changes the fingerprint."""
+        from fontquery.cache import local_fingerprint
+
+        _, fontdir, _ = local_env
+        before = local_fingerprint()
+        (fontdir / 'dejavu').mkdir()
+        assert local_fingerprint() != before
+
+    def test_changes_with_rpmdb(self, local_env):
+        """Test that updating the rpm database changes the fingerprint."""
+        import os
+        from fontquery.cache import local_fingerprint
+
+        _, _, rpmdb = local_env
+        before = local_fingerprint()
+        db = rpmdb / 'rpmdb.sqlite'
+        st = db.stat()
+        os.utime(db, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        assert local_fingerprint() != before
+
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_local_cache_does_not_need_podman(self, mock_cache_path, local_env, tmp_path):
+        """Test that local entries are keyed by the fingerprint."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        with patch('subprocess.run') as mock_run:
+            cache = FontQueryCache('fedora', 'local', 'minimal')
+            assert cache.save('{"test": "data"}') is True
+            assert cache.read() == '{"test": "data"}'
+            assert cache.filename.name.startswith('local-')
+            mock_run.assert_not_called()
+
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_local_fingerprint_computed_once(self, mock_cache_path, tmp_path):
+        """Test that the fingerprint is computed once per instance."""
+        mock_cache_path.return_value = str(tmp_path)
+
+        with patch('fontquery.cache.local_fingerprint',
+                   return_value='a' * 64) as fp:
+            cache = FontQueryCache('fedora', 'local', 'minimal')
+            cache.get_or_compute(lambda: '{"fonts": []}')
+            assert cache.read() == '{"fonts": []}'
+            assert cache.revision == 'local-' + 'a' * 64
+            fp.assert_called_once()
+
+
+class TestPackageDigest:
+    """Tests for package_digest function."""
+
+    def test_order_independent(self, tmp_path):
+        """Test that the digest doesn't depend on the order of files."""
+        from fontquery.cache import package_digest
+
+        a = tmp_path / 'a.rpm'
+        b = tmp_path / 'b.rpm'
+        a.write_bytes(b'aaa')
+        b.write_bytes(b'bbb')
+        assert package_digest([str(a), str(b)], []) == \
+            package_digest([str(b), str(a)], [])
+
+    def test_changes_with_contents(self, tmp_path):
+        """Test that rebuilding a package changes the digest."""
+        from fontquery.cache import package_digest
+
+        a = tmp_path / 'a.rpm'
+        a.write_bytes(b'aaa')
+        before = package_digest([str(a)], [])
+        a.write_bytes(b'aab')
+        assert package_digest([str(a)], []) != before
+
+    def test_changes_with_params(self, tmp_path):
+        """Test that query parameters are part of the digest."""
+        from fontquery.cache import package_digest
+
+        a = tmp_path / 'a.rpm'
+        a.write_bytes(b'aaa')
+        assert package_digest([str(a)], ['-l=ja']) != \
+            package_digest([str(a)], [])
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_variant_filename(self, mock_cache_path, mock_run, tmp_path):
+        """Test that a variant is appended to the image ID."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:base\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal', variant='abc')
+        assert cache.filename.name == 'sha256:base-abc.json'
+
+    @patch('subprocess.run')
+    def test_sysroot_variant(self, mock_run):
+        """Test that sysroot entries depend on fontconfig on the host."""
+        from fontquery.cache import ENTRY_RE, sysroot_variant
+
+        def variant(fcver):
+            mock_run.return_value = MagicMock(stdout=b'', stderr=fcver)
+            sysroot_variant.cache_clear()
+            return sysroot_variant()
+        a = variant(b'fontconfig version 2.15.0\n')
+        assert ENTRY_RE.fullmatch(f'sha256:{"0" * 64}-{a}.json')
+        assert variant(b'fontconfig version 2.16.0\n') != a
+        sysroot_variant.cache_clear()
+
+
+class TestIndexCache:
+    """Tests for the indexed data stored in FontQueryCache."""
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_save_and_read_index(self, mock_cache_path, mock_run, tmp_path):
+        """Test storing and reading indexed data."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:index\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        data = {'id': 'fedora', 'index': {'English': {'serif': {'family': 'A'}}}}
+        assert cache.save_index(data, False, True) is True
+        assert cache.read_index(False, True) == data
+        assert cache.read_index(True, True) is None
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_index_from_other_version_is_ignored(self, mock_cache_path, mock_run, tmp_path, monkeypatch):
+        """Test that indexed data stored by another version is not used."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:index\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        cache.save_index({'id': 'fedora'}, False, True)
+        monkeypatch.setattr('fontquery.cache.FQ_VERSION', '0.0')
+        assert cache.read_index(False, True) is None
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_delete_removes_index(self, mock_cache_path, mock_run, tmp_path):
+        """Test that delete removes indexed data as well."""
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:index\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        cache.save('{}')
+        cache.save_index({'id': 'fedora'}, False, True)
+        cache.delete()
+        assert list((cache_base / 'fedora-40-minimal').glob('*.idx')) == []
+
+
+class TestBundle:
+    """Tests for export_bundle and import_bundle."""
+
+    IMAGE_ID = 'sha256:' + 'a' * 64
+
+    @pytest.fixture
+    def cache_base(self, tmp_path):
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        with patch('fontquery.cache.BaseDirectory.save_cache_path',
+                   return_value=str(cache_base)):
+            yield cache_base
+
+    @staticmethod
+    def podman_images(image_id):
+        mock_result = MagicMock()
+        mock_result.returncode = 0 if image_id else 1
+        mock_result.stdout = (image_id + '\n').encode('utf-8') if image_id else b''
+        return mock_result
+
+    def test_export_and_import(self, cache_base, tmp_path):
+        """Test that exported entries are imported on another node."""
+        from fontquery.cache import export_bundle, import_bundle
+
+        bundle = tmp_path / 'bundle.tar.gz'
+        with patch('subprocess.run', return_value=self.podman_images(self.IMAGE_ID)):
+            FontQueryCache('fedora', '40', 'minimal').save('{"fonts": []}')
+            assert export_bundle([('fedora', '40', 'minimal')], str(bundle)) == 1
+
+        # Fresh node which hasn't pulled the image yet
+        for p in cache_base.glob('*/*'):
+            p.unlink()
+        with patch('subprocess.run', return_value=self.podman_images(None)):
+            assert import_bundle(str(bundle)) == 1
+        with patch('subprocess.run', return_value=self.podman_images(self.IMAGE_ID)):
+            assert FontQueryCache('fedora', '40', 'minimal').read() == '{"fonts": []}'
+
+    def test_import_skips_mismatched_image(self, cache_base, tmp_path):
+        """Test that entries for another image ID are not imported."""
+        from fontquery.cache import export_bundle, import_bundle
+
+        bundle = tmp_path / 'bundle.tar.gz'
+        with patch('subprocess.run', return_value=self.podman_images(self.IMAGE_ID)):
+            FontQueryCache('fedora', '40', 'minimal').save('{"fonts": []}')
+            export_bundle([('fedora', '40', 'minimal')], str(bundle))
+        for p in cache_base.glob('*/*'):
+            p.unlink()
+        with patch('subprocess.run', return_value=self.podman_images('sha256:' + 'b' * 64)):
+            assert import_bundle(str(bundle)) == 0
+
+    @pytest.mark.parametrize('key', [
+        {'product': '/tmp/x'},
+        {'product': '../x'},
+        {'release': '../../x'},
+        {'release': '40/../../x'},
+        {'release': 'local'},
+        {'target': 'minimal/../../x'},
+        {'target': 'other'},
+    ])
+    def test_import_rejects_invalid_keys(self, cache_base, tmp_path, key):
+        """Test that keys escaping the cache directory are refused."""
+        import io
+        import json
+        import tarfile
+        from fontquery.cache import import_bundle
+
+        data = b'{"fonts": []}'
+        name = f'fedora-40-minimal/{self.IMAGE_ID}.json'
+        ent = dict({'product': 'fedora', 'release': '40', 'target': 'minimal',
+                    'image_id': self.IMAGE_ID, 'file': name,
+                    'sha256': hashlib.sha256(data).hexdigest()}, **key)
+        manifest = json.dumps({'format': 1, 'entries': [ent]}).encode('utf-8')
+        bundle = tmp_path / 'bundle.tar.gz'
+        with tarfile.open(bundle, 'w:gz') as tar:
+            for n, d in [(name, data), ('manifest.json', manifest)]:
+                info = tarfile.TarInfo(n)
+                info.size = len(d)
+                tar.addfile(info, io.BytesIO(d))
+        with patch('subprocess.run', return_value=self.podman_images(None)):
+            assert import_bundle(str(bundle)) == 0
+        assert not list(tmp_path.glob('**/' + self.IMAGE_ID + '.json'))
+
+    def test_import_rejects_invalid_bundle(self, cache_base, tmp_path):
+        """Test that an archive without manifest is refused."""
+        import tarfile
+        from fontquery.cache import import_bundle
+
+        bundle = tmp_path / 'bundle.tar.gz'
+        with tarfile.open(bundle, 'w:gz'):
+            pass
+        with pytest.raises(RuntimeError, match='Invalid cache bundle'):
+            import_bundle(str(bundle))
+
+
+class TestMaintenance:
+    """Tests for statistics and maintenance commands."""
+
+    @patch('subprocess.run')
+    @patch('fontquery.cache.BaseDirectory.save_cache_path')
+    def test_hit_and_miss_are_recorded(self, mock_cache_path, mock_run, tmp_path):
+        """Test that reads and stores are counted."""
+        import json
+
+        cache_base = tmp_path / "cache"
+        cache_base.mkdir()
+        mock_cache_path.return_value = str(cache_base)
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'sha256:stats\n'
+        mock_run.return_value = mock_result
+
+        cache = FontQueryCache('fedora', '40', 'minimal')
+        assert cache.read() is None
+        # Looked up again after waiting for others
+        assert cache.read() is None
+        cache.save('{}')
+        FontQueryCache('fedora', '40', 'minimal').read()
+        FontQueryCache('fedora', '40', 'minimal').read()
+        assert cache.read_index(False, False) is None
+        cache.save_index({}, False, False)
+        assert cache.read_index(False, False) == {}
+
+        # Nothing is written until flushed
+        assert not (cache_base / 'stats.json').exists()
+        FontQueryCache.flush_stats()
+        stats = json.loads((cache_base / 'stats.json').read_text())
+        assert stats['fedora-40-minimal'] == {'miss': 1, 'hit': 2,
+                                              'index_miss': 1,
+                                              'index_hit': 1}
+
+        # Merged into what other processes recorded
+        FontQueryCache('fedora', '40', 'minimal').read()
+        FontQueryCache.flush_stats()
+        stats = json.loads((cache_base / 'stats.json').read_text())
+        assert stats['fedora-40-minimal']['hit'] == 3
+
+    @patch('subprocess.run')
+    def test_prune_stale(self, mock_run, tmp_path):
+        """Test that entries for other images are pruned."""
+        import argparse
+        from fontquery.cache import do_prune
+
+        cache_base = tmp_path / "cache"
+        d = cache_base / 'fedora-40-minimal'
+        d.mkdir(parents=True)
+        current = 'sha256:' + 'a' * 64
+        old = 'sha256:' + 'b' * 64
+        for name in [f'{current}.json', f'{old}.json', f'{old}.lock',
+                     f'{old}.01.idx']:
+            (d / name).write_text('{}')
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = (current + '\n').encode('utf-8')
+        mock_run.return_value = mock_result
+
+        args = argparse.Namespace(product=None, release=None, target=None,
+                                  max_age=None, stale=True, try_run=False)
+        with patch('fontquery.cache.BaseDirectory.save_cache_path',
+                   return_value=str(cache_base)):
+            assert do_prune(cache_base, args) == 0
+        assert [p.name for p in d.iterdir()] == [f'{current}.json']
+
+    def test_prune_max_age_keeps_locks(self, tmp_path):
+        """Test that old entries are pruned but lock files in use aren't."""
+        import argparse
+        import os
+        from fontquery.cache import do_prune
+
+        d = tmp_path / 'fedora-40-minimal'
+        d.mkdir(parents=True)
+        image_id = 'sha256:' + 'a' * 64
+        for name in [f'{image_id}.json', f'{image_id}.lock',
+                     f'{image_id}.01.idx']:
+            (d / name).write_text('{}')
+            os.utime(d / name, (0, 0))
+
+        args = argparse.Namespace(product=None, release=None, target=None,
+                                  max_age=30, stale=False, try_run=False)
+        with patch('subprocess.run') as mock_run:
+            assert do_prune(tmp_path, args) == 0
+        mock_run.assert_not_called()
+        assert [p.name for p in d.iterdir()] == [f'{image_id}.lock']
+
+
+class TestCommands:
+    """Tests for fontquery-cache commands."""
+
+    CURRENT = 'sha256:' + 'a' * 64
+    OLD = 'sha256:' + 'b' * 64
+
+    @pytest.fixture
+    def cache_base(self, tmp_path):
+        d = tmp_path / 'fedora-40-minimal'
+        d.mkdir()
+        (d / f'{self.CURRENT}.json').write_text('{"fonts": []}')
+        (d / f'{self.CURRENT}-{"c" * 64}.json').write_text('[]')
+        (d / f'{self.OLD}.json').write_text('{"fonts": [')
+        (d / f'{self.OLD}.01.idx').write_bytes(b'broken')
+        (tmp_path / 'stats.json').write_text(
+            '{"fedora-40-minimal": {"hit": 3, "miss": 1}}')
+        result = MagicMock(returncode=0,
+                           stdout=(self.CURRENT + '\n').encode('utf-8'))
+        with patch('fontquery.cache.BaseDirectory.save_cache_path',
+                   return_value=str(tmp_path)), \
+             patch('subprocess.run', return_value=result):
+            yield tmp_path
+
+    @staticmethod
+    def make_args(**kwargs):
+        import argparse
+        return argparse.Namespace(**dict({'product': None, 'release': None,
+                                          'target': None, 'verbose': 0,
+                                          'sysroot': False},
+                                         **kwargs))
+
+    def test_list(self, cache_base, capsys):
+        """Test that entries are listed with their status."""
+        from fontquery.cache import do_list
+
+        assert do_list(cache_base, self.make_args()) == 0
+        lines = [ln.split('\t') for ln in
+                 capsys.readouterr().out.splitlines()[1:]]
+        assert [(ln[1], ln[2], ln[5]) for ln in lines] == [
+            (self.CURRENT, 'c' * 64, 'current'),
+            (self.CURRENT, '-', 'current'),
+            (self.OLD, '-', 'stale'),
+        ]
+
+    def test_list_filters_keys(self, cache_base, capsys):
+        """Test that entries for other keys aren't listed."""
+        from fontquery.cache import do_list
+
+        assert do_list(cache_base, self.make_args(release=['41'])) == 0
+        assert len(capsys.readouterr().out.splitlines()) == 1
+
+    def test_stats(self, cache_base, capsys):
+        """Test that statistics are shown per key."""
+        from fontquery.cache import do_stats
+
+        assert do_stats(cache_base, self.make_args(reset=False)) == 0
+        line = capsys.readouterr().out.splitlines()[1].split('\t')
+        assert line[0] == 'fedora-40-minimal'
+        assert line[1] == '3'
+        assert line[3:6] == ['3', '1', '75%']
+
+    def test_stats_reset(self, cache_base):
+        """Test that statistics are reset."""
+        from fontquery.cache import do_stats
+
+        assert do_stats(cache_base, self.make_args(reset=True)) == 0
+        assert not (cache_base / 'stats.json').exists()
+
+    def test_verify(self, cache_base, capsys):
+        """Test that broken entries are reported and removed with --fix."""
+        from fontquery.cache import do_verify
+
+        d = cache_base / 'fedora-40-minimal'
+        assert do_verify(cache_base, self.make_args(fix=False)) == 1
+        out = capsys.readouterr().out
+        assert f'{self.OLD}.json: broken' in out
+        assert f'{self.OLD}.01.idx: broken' in out
+        assert f'{self.CURRENT}-{"c" * 64}.json: broken' in out
+        assert len(list(d.iterdir())) == 4
+
+        assert do_verify(cache_base, self.make_args(fix=True)) == 1
+        assert [p.name for p in d.iterdir()] == [f'{self.CURRENT}.json']
+        assert do_verify(cache_base, self.make_args(fix=False)) == 0
+
+    def test_warm(self, cache_base):
+        """Test that only missing entries are filled."""
+        from fontquery.cache import do_warm
+
+        with patch('fontquery.container.ContainerImage') as image:
+            image.return_value.pull.return_value = True
+            image.return_value.get_json.return_value = '{"fonts": [1]}'
+            args = self.make_args(product=['fedora'], release=['40', '41'],
+                                  target=['minimal'])
+            assert do_warm(cache_base, args) == 0
+        # The entry for 40 is already there
+        assert image.return_value.get_json.call_count == 1
+        d = cache_base / 'fedora-41-minimal'
+        assert (d / f'{self.CURRENT}.json').read_text() == '{"fonts": [1]}'
+
+    def test_warm_pull_failure(self, cache_base):
+        """Test that images which can't be pulled are reported."""
+        from fontquery.cache import do_warm
+
+        with patch('fontquery.container.ContainerImage') as image:
+            image.return_value.pull.return_value = False
+            assert do_warm(cache_base, self.make_args()) == 1
+        image.return_value.get_json.assert_not_called()
+
+    def test_slim_keys(self, cache_base, capsys):
+        """Test that entries for slim images are handled under their key."""
+        from fontquery.cache import _split_key, do_list, do_prune
+
+        assert _split_key('fedora-rawhide-all-slim') == \
+            ('fedora', 'rawhide', 'all-slim')
+        assert _split_key('centos-stream-10-extra') == \
+            ('centos', 'stream-10', 'extra')
+        with pytest.raises(ValueError):
+            _split_key('fedora-40-foo')
+        d = cache_base / 'fedora-40-minimal-slim'
+        d.mkdir()
+        (d / f'{self.CURRENT}.json').write_text('{"fonts": []}')
+        (d / f'{self.OLD}.json').write_text('{"fonts": []}')
+
+        with patch('subprocess.run') as mock_run:
+            mock_run.return_value = MagicMock(
+                returncode=0, stdout=(self.CURRENT + '\n').encode('utf-8'))
+            args = self.make_args(target=['minimal-slim'])
+            assert do_list(cache_base, args) == 0
+            lines = [ln.split('\t') for ln in
+                     capsys.readouterr().out.splitlines()[1:]]
+            assert [(ln[0], ln[5]) for ln in lines] == [
+                ('fedora-40-minimal-slim', 'current'),
+                ('fedora-40-minimal-slim', 'stale'),
+            ]
+            assert do_prune(cache_base, self.make_args(
+                target=['minimal-slim'], max_age=None, stale=True,
+                try_run=False)) == 0
+        assert mock_run.call_args.args[0][-1] == \
+            'ghcr.io/fedora-i18n/fontquery/fedora/minimal-slim:40'
+        assert [p.name for p in d.iterdir()] == [f'{self.CURRENT}.json']
+        # Entries for the full image are left as is
+        assert len(list((cache_base / 'fedora-40-minimal').iterdir())) == 4
+
+    def test_warm_failure(self, cache_base, capsys):
+        """Test that a failed query doesn't stop warming the others."""
+        from fontquery.cache import do_warm
+
+        def get_json(**kwargs):
+            if image.call_args.args[1] == '41':
+                raise RuntimeError('`podman run\' failed')
+            return ''
+        with patch('fontquery.container.ContainerImage') as image:
+            image.return_value.pull.return_value = True
+            image.return_value.get_json.side_effect = get_json
+            args = self.make_args(product=['fedora'], release=['41', '42'],
+                                  target=['minimal'])
+            assert do_warm(cache_base, args) == 1
+        assert image.return_value.get_json.call_count == 2
+        err = capsys.readouterr().err
+        assert "fedora-41-minimal: `podman run' failed" in err
+        assert 'fedora-42-minimal: No results' in err
+        assert not list((cache_base / 'fedora-42-minimal').glob('*.json'))
+
+    def test_warm_sysroot(self, cache_base):
+        """Test that entries for the sysroot mode are filled."""
+        from fontquery.cache import do_warm
+
+        with patch('fontquery.container.ContainerImage') as image, \
+             patch('fontquery.cache.sysroot_variant', return_value='d' * 64):
+            image.return_value.pull.return_value = True
+            image.return_value.get_json.return_value = '{"fonts": [1]}'
+            args = self.make_args(sysroot=True)
+            assert do_warm(cache_base, args) == 0
+            assert image.sysroot is True
+        d = cache_base / 'fedora-rawhide-minimal'
+        assert [p.name for p in d.glob('*.json')] == [
+            f'{self.CURRENT}-{"d" * 64}.json']
@@ -0,0 +1,65 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for client module."""
+
+import argparse
+import pytest
+from unittest.mock import MagicMock, patch
+from fontquery.client import affected
+
+
+LANG_CONF = '''<?xml version="1.0"?>
+<fontconfig>
+  <match>
+    <test name="lang" compare="contains"><string>ja</string></test>
+    <edit name="family" mode="prepend"><string>Noto Sans CJK JP</string></edit>
+  </match>
+</fontconfig>
+'''
+ALIAS_CONF = '''<?xml version="1.0"?>
+<fontconfig>
+  <alias>
+    <family>Noto Sans</family>
+    <default><family>sans-serif</family></default>
+  </alias>
+</fontconfig>
+'''
+
+
+class TestAffected:
+    """Tests for affected function."""
+
+    @pytest.fixture
+    def run(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('fontquery.client.FONTCONFIG_DIRS',
+                            (f'{tmp_path}/',))
+        monkeypatch.setattr('shutil.which', lambda x: f'/usr/bin/{x}')
+
+        def run(files):
+            paths = []
+            for name, content in files.items():
+                p = tmp_path / name
+                p.write_text(content, encoding='utf-8')
+                paths.append(str(p))
+            params = argparse.Namespace(args=['foo.rpm'],
+                                        lang=['en', 'ja', 'ko', 'zh_CN'])
+            fcq = MagicMock(returncode=0, stdout=b'en|ko\n')
+            with patch('fontquery.client._installed_files',
+                       return_value=paths), \
+                 patch('subprocess.run', return_value=fcq):
+                return affected(params)
+        return run
+
+    def test_fonts_and_lang_conf(self, run):
+        """Test that languages of fonts and tested in configs are affected."""
+        assert run({'foo.ttf': '', 'foo.conf': LANG_CONF}) == 'en\nja\nko'
+
+    def test_conf_without_lang(self, run):
+        """Test that configs without any lang tests affect everything."""
+        assert run({'foo.ttf': '', 'foo.conf': ALIAS_CONF}) == '*'
+        assert run({'foo.conf': ALIAS_CONF}) == '*'
+
+    def test_unparsable_conf(self, run):
+        """Test that configs which can't be parsed affect everything."""
+        assert run({'foo.ttf': '', 'foo.conf': '<fontconfig>'}) == '*'
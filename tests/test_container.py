@@ -0,0 +1,854 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for container module."""
+
+import asyncio
+import concurrent.futures
+import io
+import json
+import subprocess
+import sys
+import tarfile
+import pytest
+from unittest.mock import MagicMock, patch
+from fontquery import rpmmd
+from fontquery.container import (ContainerImage, POOL_EXEC, POOL_WATCHDOG,
+                                 SYSROOT_SCRIPT, StageTimer, UpdateStatus,
+                                 session_name)
+
+
+@pytest.fixture(autouse=True)
+def reset_image_state(tmp_path, monkeypatch):
+    """Forget images known by previous tests and isolate pull records."""
+    ContainerImage._image_state.clear()
+    ContainerImage._pool_owned.clear()
+    monkeypatch.setattr('fontquery.registry.BaseDirectory.save_cache_path',
+                        lambda *args: str(tmp_path))
+    # Nothing listens on the discard port
+    monkeypatch.setattr(ContainerImage, 'registry_url', 'http://127.0.0.1:9')
+    yield
+    ContainerImage._image_state.clear()
+    ContainerImage._pool_owned.clear()
+
+
+def count_calls(mock_run, subcommand):
+    return len([c for c in mock_run.call_args_list
+                if c.args[0][1] == subcommand])
+
+
+def make_result(returncode=0, stdout=b''):
+    result = MagicMock()
+    result.returncode = returncode
+    result.stdout = stdout
+    result.stderr = b''
+    return result
+
+
+class TestImageState:
+    """Tests for tracking image state within a process."""
+
+    @patch('subprocess.run')
+    def test_pull_once(self, mock_run):
+        """Test that the same image is pulled only once."""
+        mock_run.return_value = make_result(stdout=b'sha256:abc\n')
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        assert c.pull() is True
+        assert c.exists(remote=True) is True
+
+        c2 = ContainerImage('fedora', 'rawhide')
+        c2.target = 'minimal'
+        assert c2.pull() is True
+        assert c2.exists(remote=False) is True
+        assert count_calls(mock_run, 'pull') == 1
+
+    @patch('subprocess.run')
+    def test_concurrent_pulls(self, mock_run):
+        """Test that threads pulling the same image wait for one pull."""
+        mock_run.return_value = make_result(stdout=b'sha256:abc\n')
+
+        def pull():
+            c = ContainerImage('fedora', 'rawhide')
+            c.target = 'minimal'
+            return c.pull()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as ex:
+            assert all(ex.map(lambda _: pull(), range(4)))
+        assert count_calls(mock_run, 'pull') == 1
+
+    @patch('subprocess.run')
+    def test_different_images_are_pulled(self, mock_run):
+        """Test that state is tracked per image."""
+        mock_run.return_value = make_result(stdout=b'sha256:abc\n')
+
+        for target in ['minimal', 'extra']:
+            c = ContainerImage('fedora', 'rawhide')
+            c.target = target
+            assert c.pull() is True
+        assert count_calls(mock_run, 'pull') == 2
+
+    @patch('subprocess.run')
+    def test_failed_pull_is_retried(self, mock_run):
+        """Test that a failed pull isn't recorded."""
+        mock_run.return_value = make_result(returncode=1)
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        assert c.pull() is False
+        assert c.pull() is False
+        assert count_calls(mock_run, 'pull') == 2
+
+    @patch('subprocess.run')
+    def test_local_check_does_not_mark_pulled(self, mock_run):
+        """Test that an image found on local is still pulled on request."""
+        mock_run.return_value = make_result()
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        assert c.exists(remote=False) is True
+        assert c.exists(remote=False) is True
+        assert c.exists(remote=True) is True
+        assert [call.args[0][1] for call in mock_run.call_args_list] == \
+            ['images', 'pull']
+
+    @patch('subprocess.run')
+    def test_image_id_from_pull(self, mock_run, tmp_path):
+        """Test that the ID from pulling is reused for caches."""
+        from fontquery.cache import FontQueryCache
+
+        mock_run.return_value = make_result(stdout=b'a' * 64 + b'\n')
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        with patch.object(c, '_is_up_to_date', return_value=False):
+            assert c.pull() is True
+        with patch('fontquery.cache.BaseDirectory.save_cache_path',
+                   return_value=str(tmp_path)):
+            fqc = FontQueryCache('fedora', 'rawhide', 'minimal',
+                                 image_id=c.image_id)
+            assert fqc.revision == 'sha256:' + 'a' * 64
+        assert [call.args[0][1] for call in mock_run.call_args_list] == \
+            ['pull']
+
+    @patch('subprocess.run')
+    def test_image_id_looked_up_once(self, mock_run):
+        """Test that the ID of an image not pulled is looked up once."""
+        mock_run.return_value = make_result(stdout=b'sha256:abc\n')
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        assert c.image_id() == 'sha256:abc'
+        assert c.image_id() == 'sha256:abc'
+        assert count_calls(mock_run, 'images') == 1
+
+    @patch('subprocess.run')
+    def test_clean_forgets_state(self, mock_run):
+        """Test that removing an image resets its state."""
+        mock_run.return_value = make_result()
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c.pull()
+        c.clean()
+        assert c._get_state('pulled') is None
+
+
+class TestRun:
+    """Tests for the single invocation path."""
+
+    @patch('subprocess.run')
+    def test_get_json_uses_single_run(self, mock_run):
+        """Test that get_json spawns one podman run for a pulled image."""
+        mock_run.return_value = make_result(stdout=b'{"fonts": []}')
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        assert c.get_json(lang=['ja'], verbose=0) == '{"fonts": []}'
+        assert mock_run.call_count == 1
+        cmdline = mock_run.call_args.args[0]
+        assert cmdline[:3] == ['podman', 'run', '--rm']
+        assert cmdline[-3:] == ['-m', 'json', '-l=ja']
+
+    @patch('subprocess.run')
+    def test_get_json_reports_error(self, mock_run):
+        """Test that a failure of the container is reported."""
+        mock_run.return_value = make_result(returncode=125)
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        with pytest.raises(RuntimeError, match='error code 125'):
+            c.get_json(lang=None)
+
+    @patch('subprocess.run')
+    def test_missing_image(self, mock_run):
+        """Test that a missing image is reported without running it."""
+        mock_run.return_value = make_result(returncode=1)
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        with pytest.raises(RuntimeError, match="isn't yet available"):
+            c.get_json(lang=None)
+
+
+class FakePodman:
+    """Answer podman commands used by the pool."""
+
+    def __init__(self, running=None, exec_codes=None):
+        self.running = running or []
+        self.exec_codes = exec_codes or []
+        self.started = []
+
+    def __call__(self, cmdline, **kwargs):
+        cmd = cmdline[1]
+        if cmd == 'ps':
+            return make_result(stdout='\n'.join(self.running).encode('utf-8'))
+        if cmd == 'run' and '-d' in cmdline:
+            name = cmdline[cmdline.index('--name') + 1]
+            self.started.append(name)
+            self.running.append(name)
+            return make_result()
+        if cmd == 'exec':
+            code = self.exec_codes.pop(0) if self.exec_codes else 0
+            return make_result(returncode=code, stdout=b'{}')
+        return make_result()
+
+
+class TestPool:
+    """Tests for dispatching queries into pooled containers."""
+
+    @pytest.fixture(autouse=True)
+    def enable_pool(self, monkeypatch):
+        monkeypatch.setattr(ContainerImage, 'pool_timeout', 60)
+        monkeypatch.setattr('atexit.register', lambda *args: None)
+
+    def make_image(self):
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        return c
+
+    @patch('subprocess.run')
+    def test_container_is_reused(self, mock_run):
+        """Test that one container serves repeated queries."""
+        podman = FakePodman()
+        mock_run.side_effect = podman
+
+        c = self.make_image()
+        assert c.get_json(lang=None) == '{}'
+        assert c.get_json(lang=['ja']) == '{}'
+        assert len(podman.started) == 1
+        assert count_calls(mock_run, 'exec') == 2
+        assert count_calls(mock_run, 'ps') == 1
+        cmdline = mock_run.call_args.args[0]
+        assert cmdline[2] == podman.started[0]
+        assert cmdline[-6:] == ['/usr/local/bin/fontquery-client',
+                                '--pattern', 'minimal', '-m', 'json', '-l=ja']
+
+    def test_long_query_keeps_container(self, tmp_path):
+        """Test that a query longer than the idle timeout isn't killed."""
+        stamp = str(tmp_path / 'stamp')
+        watchdog = subprocess.Popen(['/bin/sh', '-c', POOL_WATCHDOG.format(
+            stamp=stamp, timeout=1, interval=1)])
+        try:
+            res = subprocess.run(['/bin/sh', '-c', POOL_EXEC.format(stamp=stamp),
+                                  'sh', 'sh', '-c', 'sleep 3; exit 7'],
+                                 check=False)
+            assert res.returncode == 7
+            assert watchdog.poll() is None
+            # Exits once idle
+            assert watchdog.wait(timeout=10) == 0
+        finally:
+            watchdog.kill()
+
+    @patch('subprocess.run')
+    def test_slim(self, mock_run):
+        """Test that slim images are queried for the same pattern."""
+        podman = FakePodman()
+        mock_run.side_effect = podman
+
+        c = self.make_image()
+        c.target = 'minimal-slim'
+        c._set_state(pulled=True, local=True)
+        c.get_json(lang=None)
+        cmdline = mock_run.call_args.args[0]
+        assert cmdline[-5:] == ['/usr/local/bin/fontquery-client',
+                                '--pattern', 'minimal', '-m', 'json']
+
+    @patch('subprocess.run')
+    def test_running_container_is_shared(self, mock_run):
+        """Test that a container started by others is used."""
+        podman = FakePodman(running=['fontquery-1-deadbeef'])
+        mock_run.side_effect = podman
+
+        c = self.make_image()
+        c.get_json(lang=None)
+        assert not podman.started
+        assert mock_run.call_args.args[0][2] == 'fontquery-1-deadbeef'
+
+    @patch('subprocess.run')
+    def test_expired_container_is_replaced(self, mock_run):
+        """Test that a container gone by the idle timeout is restarted."""
+        podman = FakePodman(running=['fontquery-1-deadbeef'],
+                            exec_codes=[0, 125])
+        mock_run.side_effect = podman
+
+        c = self.make_image()
+        c.get_json(lang=None)
+        podman.running.clear()
+        assert c.get_json(lang=None) == '{}'
+        assert len(podman.started) == 1
+        assert mock_run.call_args.args[0][2] == podman.started[0]
+
+    @patch('subprocess.run')
+    def test_cleanup(self, mock_run, monkeypatch):
+        """Test that containers created by this process are removed."""
+        podman = FakePodman()
+        mock_run.side_effect = podman
+
+        self.make_image().get_json(lang=None)
+        ContainerImage._cleanup_pool()
+        assert mock_run.call_args.args[0][:2] == ['podman', 'rm']
+        assert mock_run.call_args.args[0][-1] == podman.started[0]
+
+        monkeypatch.setattr(ContainerImage, 'pool_keep', True)
+        mock_run.reset_mock()
+        self.make_image().get_json(lang=None)
+        ContainerImage._cleanup_pool()
+        assert count_calls(mock_run, 'rm') == 0
+
+    def test_session_name(self):
+        """Test that session names don't conflict within a process."""
+        assert session_name() != session_name()
+
+
+class FakePopen:
+    """Collect data written into a process."""
+
+    def __init__(self, cmdline, returncode=0, **kwargs):
+        self.cmdline = cmdline
+        self.returncode = returncode
+        self.data = b''
+        self.stdin = MagicMock()
+        self.stdin.write.side_effect = self._write
+        self.stderr = io.BytesIO(b'Error: no such container')
+
+    def _write(self, data):
+        self.data += bytes(data)
+        return len(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class TestCopy:
+    """Tests for copying files into a container."""
+
+    def test_stream(self, tmp_path):
+        """Test that files are streamed as a tarball."""
+        files = []
+        for n in ['foo.rpm', 'bar.rpm']:
+            (tmp_path / n).write_bytes(n.encode('utf-8') * 100)
+            files.append(str(tmp_path / n))
+        procs = []
+
+        def popen(cmdline, **kwargs):
+            procs.append(FakePopen(cmdline))
+            return procs[-1]
+
+        c = ContainerImage('fedora', 'rawhide')
+        with patch('subprocess.Popen', side_effect=popen):
+            assert c._copy('fontquery-1-abc', files)
+        assert procs[0].cmdline == ['podman', 'cp', '-',
+                                    'fontquery-1-abc:/var/tmp/fontquery']
+        with tarfile.open(fileobj=io.BytesIO(procs[0].data)) as tar:
+            assert tar.getnames() == ['foo.rpm', 'bar.rpm']
+            assert tar.extractfile('bar.rpm').read() == b'bar.rpm' * 100
+
+    def test_failure(self, tmp_path):
+        """Test that a failure of podman is reported."""
+        (tmp_path / 'foo.rpm').write_bytes(b'foo')
+
+        c = ContainerImage('fedora', 'rawhide')
+        with patch('subprocess.Popen',
+                   side_effect=lambda c, **kw: FakePopen(c, returncode=125)):
+            assert not c._copy('fontquery-1-abc', [str(tmp_path / 'foo.rpm')])
+            assert not c._copy('fontquery-1-abc', [str(tmp_path / 'bar.rpm')])
+
+
+class TestAsync:
+    """Tests for the asynchronous API."""
+
+    @pytest.fixture(autouse=True)
+    def fake_exec(self, monkeypatch):
+        self.cmdlines = []
+
+        async def create(*cmdline, **kwargs):
+            self.cmdlines.append(list(cmdline))
+            proc = MagicMock()
+            proc.returncode = 0
+
+            async def communicate():
+                if cmdline[1] == 'pull':
+                    return b'0123\n', None
+                return b'{}', None
+            proc.communicate = communicate
+            return proc
+        monkeypatch.setattr('asyncio.create_subprocess_exec', create)
+
+    @patch('subprocess.run')
+    def test_queries_overlap(self, mock_run):
+        """Test that images are pulled and queried in one event loop."""
+        # No images on local
+        mock_run.return_value = make_result(returncode=1)
+
+        async def run(release):
+            c = ContainerImage('fedora', release)
+            c.target = 'minimal'
+            assert await c.apull()
+            return await c.aget_json(lang=None)
+
+        async def main():
+            return await asyncio.gather(run('rawhide'), run('40'))
+        assert asyncio.run(main()) == ['{}', '{}']
+        pulls = [c for c in self.cmdlines if c[:2] == ['podman', 'pull']]
+        runs = [c for c in self.cmdlines if c[:2] == ['podman', 'run']]
+        assert len(pulls) == 2
+        assert len(runs) == 2
+        assert all(c[2:4] == ['--rm', '--name'] for c in runs)
+
+    def test_pulled_once(self):
+        """Test that the image state is shared with the synchronous API."""
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        assert asyncio.run(c.apull())
+        asyncio.run(c.aget_json(lang=None))
+        assert [c[:2] for c in self.cmdlines] == [['podman', 'run']]
+
+
+class TestShards:
+    """Tests for splitting a query into shards."""
+
+    @pytest.fixture(autouse=True)
+    def fake_exec(self, monkeypatch):
+        self.cmdlines = []
+
+        async def create(*cmdline, **kwargs):
+            self.cmdlines.append(list(cmdline))
+            proc = MagicMock()
+            proc.returncode = 0
+            if cmdline[-2:] == ('-m', 'langs'):
+                out = '\n'.join(['en', 'ja', 'ko', 'zh-cn', 'zh-tw'])
+            else:
+                langs = [a[3:] for a in cmdline if a.startswith('-l=')]
+                out = json.dumps({'id': 'fedora', 'pattern': 'minimal',
+                                  'fonts': [{'lang': ll, 'alias': 'serif'}
+                                            for ll in langs]})
+
+            async def communicate():
+                return out.encode('utf-8'), None
+            proc.communicate = communicate
+            return proc
+        monkeypatch.setattr('asyncio.create_subprocess_exec', create)
+
+    def make_image(self):
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        return c
+
+    def test_default_langs(self):
+        """Test that the default languages are split and merged in order."""
+        out = json.loads(self.make_image().get_json(lang=None, shards=2))
+        assert [f['lang'] for f in out['fonts']] == ['en', 'ja', 'ko',
+                                                     'zh-cn', 'zh-tw']
+        assert out['pattern'] == 'minimal'
+        runs = [c for c in self.cmdlines if '-m' in c and 'json' in c]
+        assert len(runs) == 2
+
+    def test_given_langs(self):
+        """Test that given languages are used as is."""
+        out = json.loads(self.make_image().get_json(lang=['ja', 'ko', 'zh'],
+                                                    shards=3))
+        assert [f['lang'] for f in out['fonts']] == ['ja', 'ko', 'zh']
+        assert len(self.cmdlines) == 3
+
+
+class TestInstall:
+    """Tests for querying after installing packages."""
+
+    header = {'id': 'fedora', 'version_id': '40', 'pattern': 'minimal'}
+
+    def make_json(self, langs, family):
+        return json.dumps(dict(self.header, fonts=[
+            {'lang': ll, 'alias': 'serif', 'family': family} for ll in langs
+        ]))
+
+    def run(self, affected, baseline=None, full_query=False):
+        self.cmds = []
+
+        def exec_(session='', cmd='', **kwargs):
+            self.cmds.append(cmd.split())
+            args = cmd.split()
+            if args[2] == 'affected':
+                return make_result(stdout=affected.pop(0).encode('utf-8'))
+            if args[2] == 'json':
+                langs = [a[3:] for a in args if a.startswith('-l=')]
+                return make_result(stdout=self.make_json(
+                    langs or ['en', 'ja', 'ko'], 'B').encode('utf-8'))
+            return make_result()
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        with patch.object(c, '_ensure_image'), \
+             patch.object(c, '_create') as create, \
+             patch.object(c, '_copy', return_value=True), \
+             patch.object(c, '_exec', side_effect=exec_):
+            create.return_value.__enter__.return_value = 'fontquery-1-abc'
+            out = c.get_json_after_install(['/tmp/foo.rpm'], lang=None,
+                                           baseline=baseline,
+                                           full_query=full_query)
+        return json.loads(out)
+
+    def families(self, out):
+        return [(f['lang'], f['family']) for f in out['fonts']]
+
+    def test_affected_only(self):
+        """Test that only affected languages are queried."""
+        out = self.run(['ja', 'ja\nko'], self.make_json(['en', 'ja', 'ko'],
+                                                         'A'))
+        assert self.families(out) == [('en', 'A'), ('ja', 'B'), ('ko', 'B')]
+        assert [a for a in self.cmds[-1] if a.startswith('-l=')] == \
+            ['-l=ja', '-l=ko']
+
+    def test_nothing_affected(self):
+        """Test that the baseline is used as is if nothing is affected."""
+        baseline = self.make_json(['en', 'ja'], 'A')
+        out = self.run(['', ''], baseline)
+        assert self.families(out) == [('en', 'A'), ('ja', 'A')]
+        assert 'json' not in [c[2] for c in self.cmds]
+
+    def test_unknown(self):
+        """Test that all languages are queried if it can't be determined."""
+        out = self.run(['ja', '*'], self.make_json(['en', 'ja', 'ko'], 'A'))
+        assert self.families(out) == [('en', 'B'), ('ja', 'B'), ('ko', 'B')]
+
+    def test_full_query(self):
+        """Test that all languages are queried on request."""
+        out = self.run([], self.make_json(['en', 'ja', 'ko'], 'A'),
+                       full_query=True)
+        assert self.families(out) == [('en', 'B'), ('ja', 'B'), ('ko', 'B')]
+        assert 'affected' not in [c[2] for c in self.cmds]
+
+    def test_future_baseline(self):
+        """Test that a baseline being queried is waited for."""
+        baseline = concurrent.futures.Future()
+        baseline.set_result(self.make_json(['en', 'ja', 'ko'], 'A'))
+        out = self.run(['ja', 'ja'], baseline)
+        assert self.families(out) == [('en', 'A'), ('ja', 'B'), ('ko', 'A')]
+
+    def test_future_baseline_nothing_affected(self):
+        """Test that a baseline being queried is returned as JSON."""
+        baseline = concurrent.futures.Future()
+        baseline.set_result(self.make_json(['en', 'ja'], 'A'))
+        out = self.run(['', ''], baseline)
+        assert self.families(out) == [('en', 'A'), ('ja', 'A')]
+
+
+class TestSlim:
+    """Tests for images only for queries."""
+
+    @patch('subprocess.run')
+    def test_read_only(self, mock_run):
+        """Test that slim images are refused to install or update."""
+        c = ContainerImage('fedora', '40')
+        c.target = 'extra-slim'
+        assert c.slim
+        assert c.pattern == 'extra'
+        with pytest.raises(RuntimeError, match='only for queries'):
+            c.get_json_after_install(['foo.rpm'], lang=None)
+        with pytest.raises(RuntimeError, match='only for queries'):
+            c.update()
+        mock_run.assert_not_called()
+
+    def test_full(self):
+        """Test that other images aren't slim."""
+        c = ContainerImage('fedora', '40')
+        c.target = 'extra'
+        assert not c.slim
+        assert c.pattern == 'extra'
+
+
+class TestSysroot:
+    """Tests for querying images mounted on the host."""
+
+    @pytest.fixture(autouse=True)
+    def enable_sysroot(self, monkeypatch):
+        monkeypatch.setattr(ContainerImage, 'sysroot', True)
+        monkeypatch.setattr('fontquery.utils.get_fontquery_client_path',
+                            lambda: '/usr/bin/fontquery-client')
+
+    def make_image(self):
+        c = ContainerImage('fedora', '40')
+        c.target = 'minimal-slim'
+        c._set_state(pulled=True, local=True)
+        return c
+
+    @patch('os.geteuid', return_value=1000)
+    @patch('subprocess.run')
+    def test_rootless(self, mock_run, mock_geteuid):
+        """Test that images are mounted in the user namespace."""
+        mock_run.return_value = make_result(stdout=b'{}')
+        assert self.make_image().get_json(lang=['ja']) == '{}'
+        mock_run.assert_called_once()
+        cmdline = mock_run.call_args.args[0]
+        assert cmdline[:5] == ['podman', 'unshare', '/bin/sh', '-c',
+                               SYSROOT_SCRIPT]
+        assert cmdline[6:] == [
+            'ghcr.io/fedora-i18n/fontquery/fedora/minimal-slim:40',
+            sys.executable, '/usr/bin/fontquery-client',
+            '--pattern', 'minimal', '-m', 'json', '-l=ja']
+
+    @patch('os.geteuid', return_value=0)
+    @patch('subprocess.run')
+    def test_root(self, mock_run, mock_geteuid):
+        """Test that images are mounted directly by root."""
+        mock_run.return_value = make_result(stdout=b'{}')
+        asyncio.run(self.make_image().aquery('fcmatch', lang=None))
+        assert mock_run.call_args.args[0][:2] == ['/bin/sh', '-c']
+
+    @patch('os.geteuid', return_value=1000)
+    @patch('subprocess.run')
+    def test_mount_failure(self, mock_run, mock_geteuid, capsys):
+        """Test that a failure to mount the image is reported."""
+        mock_run.return_value = make_result(returncode=125)
+        with pytest.raises(RuntimeError):
+            self.make_image().get_json(lang=None)
+        assert 'Unable to mount fontquery/fedora/minimal-slim:40' in \
+            capsys.readouterr().err
+
+
+class TestDnfCache:
+    """Tests for sharing the dnf cache with builds and updates."""
+
+    def volumes(self, cmdline):
+        return [cmdline[i + 1] for i, a in enumerate(cmdline) if a == '-v']
+
+    @patch('subprocess.run')
+    def test_build(self, mock_run, tmp_path):
+        """Test that the cache is shared between targets of a release."""
+        mock_run.return_value = make_result()
+        for target in ['minimal', 'extra']:
+            c = ContainerImage('fedora', 'rawhide')
+            c.target = target
+            c.build()
+        builds = [c.args[0] for c in mock_run.call_args_list
+                  if c.args[0][:2] == ['buildah', 'build']]
+        assert len(builds) == 2
+        cache = tmp_path / 'dnf' / 'fedora-rawhide'
+        assert self.volumes(builds[0]) == [
+            f'{cache / "dnf"}:/var/cache/dnf:z',
+            f'{cache / "libdnf5"}:/var/cache/libdnf5:z']
+        assert self.volumes(builds[1]) == self.volumes(builds[0])
+        assert (cache / 'libdnf5').is_dir()
+
+    @patch('subprocess.run')
+    def test_disabled(self, mock_run):
+        """Test that nothing is mounted on request."""
+        mock_run.return_value = make_result()
+        c = ContainerImage('centos', '10')
+        c.target = 'minimal'
+        assert c.dnf_cache_volumes(disable_dnf_cache=True) == []
+        c.build(disable_dnf_cache=True)
+        assert '-v' not in mock_run.call_args_list[-1].args[0]
+
+    @patch('subprocess.run')
+    def test_update(self, mock_run, tmp_path):
+        """Test that checking updates and updating share the cache."""
+        # Updates are available but creating a container succeeds
+        mock_run.side_effect = lambda cmdline, **kw: make_result(
+            returncode=100 if cmdline[1] == 'run' else 0)
+        c = ContainerImage('fedora', '40')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        with patch.object(c, '_start', return_value=make_result()), \
+             patch.object(c, '_commit'):
+            assert c.update()
+        run, create = [c.args[0] for c in mock_run.call_args_list
+                       if c.args[0][1] in ('run', 'create')]
+        volume = f'{tmp_path / "dnf" / "fedora-40" / "dnf"}:/var/cache/dnf:z'
+        assert volume in self.volumes(run)
+        assert volume in self.volumes(create)
+
+
+BUILD_LOG = '''[1/4] STEP 1/3: FROM quay.io/fedora/fedora:rawhide AS base
+[1/4] STEP 2/3: COPY fontquery-setup.sh /usr/local/bin/
+--> Using cache 0123
+[1/4] STEP 3/3: RUN fontquery-setup.sh -t base
+* Setup base image
+--> 4567
+[2/4] STEP 1/2: FROM base as minimal
+[2/4] STEP 2/2: RUN fontquery-setup.sh -t minimal
+--> 89ab
+'''
+
+
+class FakeBuild:
+    """Popen running buildah build"""
+
+    def __init__(self, cmdline, log, returncode=0):
+        self.cmdline = cmdline
+        self.stdout = io.StringIO(log)
+        self.returncode = returncode
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class TestBuildStages:
+    """Tests for building all targets in one multi-stage build."""
+
+    def test_timer(self):
+        """Test that time and cached steps are tracked per stage."""
+        timer = StageTimer()
+        for i, line in enumerate(BUILD_LOG.splitlines()):
+            timer.feed(line, now=float(i))
+        timer.finish('minimal', now=10.0)
+        assert [(s['name'], s['end'] - s['start'], s['steps'],
+                 s['executed']) for s in timer.stages] == [
+            ('base', 6.0, 2, 1), ('minimal', 4.0, 1, 1)]
+        out = io.StringIO()
+        timer.report(out)
+        assert out.getvalue().splitlines()[1].split() == [
+            'base', '6.0s', '(2', 'step(s),', '1', 'cached)']
+
+    @patch('subprocess.run')
+    def test_build_stages(self, mock_run, capsys):
+        """Test that the last target is built first and others reuse it."""
+        mock_run.return_value = make_result()
+        builds = []
+        cached = BUILD_LOG.replace('--> 4567', '--> Using cache 4567')
+
+        def popen(cmdline, **kwargs):
+            log = BUILD_LOG if not builds else cached
+            builds.append(FakeBuild(cmdline, log))
+            return builds[-1]
+
+        c = ContainerImage('fedora', 'rawhide')
+        with patch('subprocess.Popen', side_effect=popen):
+            assert c.build_stages(['minimal', 'extra', 'all']) == {
+                'minimal': True, 'extra': True, 'all': True}
+        assert [b.cmdline[b.cmdline.index('--target') + 1]
+                for b in builds] == ['all', 'extra', 'minimal']
+        assert all('--layers' in b.cmdline for b in builds)
+        assert c.target is None
+        err = capsys.readouterr().err
+        assert 'Time spent in each stage' in err
+        # The minimal stage is run again in the log
+        assert err.count('were run again') == 2
+
+    @patch('subprocess.run')
+    def test_build_stages_failure(self, mock_run, capsys):
+        """Test that a failed target doesn't stop building the others."""
+        mock_run.return_value = make_result()
+        builds = []
+
+        def popen(cmdline, **kwargs):
+            target = cmdline[cmdline.index('--target') + 1]
+            builds.append(target)
+            return FakeBuild(cmdline, '', 1 if target == 'all' else 0)
+
+        c = ContainerImage('fedora', 'rawhide')
+        with patch('subprocess.Popen', side_effect=popen):
+            assert c.build_stages(['minimal', 'extra', 'all']) == {
+                'minimal': True, 'extra': True, 'all': False}
+        assert builds == ['all', 'extra', 'minimal']
+        assert 'Unable to build fontquery/fedora/all:rawhide' in \
+            capsys.readouterr().err
+
+
+class TestHostSideUpdate:
+    """Tests for checking updates against repositories on the host."""
+
+    @pytest.fixture(autouse=True)
+    def repo(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('fontquery.rpmmd.BaseDirectory.save_cache_path',
+                            lambda *args: str(tmp_path))
+        rpmmd._repos.clear()
+        # A repository stand-in with foo-1.1 only
+        (tmp_path / 'repo' / 'repodata').mkdir(parents=True)
+        (tmp_path / 'repo' / 'repodata' / 'repomd.xml').write_text(
+            '<repomd xmlns="http://linux.duke.edu/metadata/repo">'
+            '<data type="primary"><location href="primary.xml"/></data>'
+            '</repomd>', encoding='utf-8')
+        (tmp_path / 'repo' / 'primary.xml').write_text(
+            '<metadata xmlns="http://linux.duke.edu/metadata/common">'
+            '<package><name>foo</name><arch>noarch</arch>'
+            '<version epoch="0" ver="1.1" rel="1"/></package></metadata>',
+            encoding='utf-8')
+        self.url = str(tmp_path / 'repo')
+        yield
+        rpmmd._repos.clear()
+
+    def run_update(self, installed, **kwargs):
+        calls = []
+
+        def run(cmdline, **kwargs):
+            calls.append(cmdline)
+            if cmdline[:2] == ['podman', 'images']:
+                return make_result(stdout=b'sha256:1\n')
+            if cmdline[1] == 'run':
+                if 'packages' in cmdline:
+                    return make_result(stdout=b'foo-0:1.1-1.noarch\n')
+                return make_result(returncode=100)
+            return make_result()
+
+        c = ContainerImage('fedora', '40')
+        c.target = 'minimal'
+        c._set_state(pulled=True, local=True)
+        if installed:
+            rpmmd.PackageRecord(c._get_fullnamespace()).update(
+                'sha256:1', installed)
+        with patch('subprocess.run', side_effect=run), \
+             patch.object(c, '_start', return_value=make_result()), \
+             patch.object(c, '_commit'):
+            ret = c.update(repo_url=[self.url], **kwargs)
+        record = rpmmd.PackageRecord(c._get_fullnamespace()).get('sha256:1')
+        return ret, [cmd[1] for cmd in calls if cmd[0] == 'podman'], record
+
+    def test_up_to_date(self):
+        """Test that no containers are started if nothing is updated."""
+        ret, calls, _ = self.run_update(['foo-0:1.1-1.noarch'])
+        assert ret == UpdateStatus.UP_TO_DATE
+        assert 'run' not in calls and 'create' not in calls
+
+    def test_force_check(self):
+        """Test that updates are checked in a container on request."""
+        ret, calls, _ = self.run_update(['foo-0:1.1-1.noarch'],
+                                        force_check=True)
+        assert ret == UpdateStatus.UPDATED
+        assert calls.count('run') == 2
+        assert calls.count('create') == 1
+
+    def test_pending(self):
+        """Test that updates are applied without checking in a container."""
+        ret, calls, record = self.run_update(['foo-0:1.0-1.noarch'])
+        assert ret == UpdateStatus.UPDATED
+        assert calls.count('create') == 1
+        # Only to record packages after the update
+        assert calls.count('run') == 1
+        assert record == ['foo-0:1.1-1.noarch']
+
+    def test_unknown(self):
+        """Test that updates are checked in a container without records."""
+        ret, calls, record = self.run_update(None)
+        assert ret == UpdateStatus.UPDATED
+        assert calls.count('run') == 2
+        assert record == ['foo-0:1.1-1.noarch']
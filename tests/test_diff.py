@@ -0,0 +1,58 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for diff module."""
+
+import argparse
+import asyncio
+from unittest.mock import patch
+from fontquery.diff import load_both
+
+
+class TestLoadBoth:
+    """Tests for load_both function."""
+
+    def test_concurrent(self):
+        """Test that both sides are loaded at the same time."""
+        running = []
+        overlapped = []
+
+        async def aload_data(release, args, fcache):
+            running.append(release)
+            await asyncio.sleep(0.05)
+            overlapped.append(len(running) == 2)
+            return {'release': release}
+
+        with patch('fontquery.diff.aload_data', side_effect=aload_data):
+            outs = asyncio.run(load_both('rawhide', 'local',
+                                         argparse.Namespace(), False))
+        assert outs == [{'release': 'rawhide'}, {'release': 'local'}]
+        assert overlapped == [True, True]
+
+    def test_failure_does_not_cancel_other(self):
+        """Test that a result for the other side is kept on a failure."""
+        async def aload_data(release, args, fcache):
+            if release == 'rawhide':
+                raise RuntimeError('`podman pull\' failed')
+            await asyncio.sleep(0.05)
+            return {'release': release}
+
+        with patch('fontquery.diff.aload_data', side_effect=aload_data):
+            outs = asyncio.run(load_both('rawhide', 'local',
+                                         argparse.Namespace(), False))
+        assert isinstance(outs[0], RuntimeError)
+        assert outs[1] == {'release': 'local'}
+
+    def test_same_release(self):
+        """Test that the same release is loaded only once."""
+        calls = []
+
+        async def aload_data(release, args, fcache):
+            calls.append(release)
+            return {'release': release}
+
+        with patch('fontquery.diff.aload_data', side_effect=aload_data):
+            outs = asyncio.run(load_both('rawhide', 'rawhide',
+                                         argparse.Namespace(), False))
+        assert calls == ['rawhide']
+        assert outs == [{'release': 'rawhide'}, {'release': 'rawhide'}]
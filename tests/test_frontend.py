@@ -0,0 +1,32 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for frontend module."""
+
+import argparse
+import asyncio
+from unittest.mock import patch
+from fontquery.frontend import load_all
+
+
+class TestLoadAll:
+    """Tests for load_all function."""
+
+    def test_failure_does_not_cancel_others(self):
+        """Test that results for other releases are kept on a failure."""
+        done = []
+
+        async def aload(release, args, fcache):
+            if release == '40':
+                raise RuntimeError('`podman pull\' failed')
+            await asyncio.sleep(0.05)
+            done.append(release)
+            return f'{{"release": "{release}"}}'
+
+        with patch('fontquery.frontend.aload', side_effect=aload):
+            outs = asyncio.run(load_all(['rawhide', '40', '41'],
+                                        argparse.Namespace(), False))
+        assert outs[0] == '{"release": "rawhide"}'
+        assert isinstance(outs[1], RuntimeError)
+        assert outs[2] == '{"release": "41"}'
+        assert sorted(done) == ['41', 'rawhide']
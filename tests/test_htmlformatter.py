@@ -5,6 +5,10 @@
 
 import pytest
 from fontquery.htmlformatter import (
+    FONT_ALIASES,
+    TextRenderer,
+    generate_diff,
+    json2index,
     get_for_alias,
     get_family_for_alias,
     get_lang_for_alias,
@@ -96,3 +100,52 @@ class TestHelperFunctions:
         assert get_family_for_alias(value, 'sans-serif') == 'Noto Sans'
         assert get_family_for_alias(value, 'serif') == 'Noto Serif'
         assert get_family_for_alias(value, 'monospace') == 'Noto Sans Mono'
+
+
+class TestIndexedData:
+    """Tests for json2index and its use in generate_diff."""
+
+    @staticmethod
+    def make_json(family):
+        return {
+            'id': 'fedora',
+            'version_id': '40',
+            'pattern': 'minimal',
+            'fq_id': '1',
+            'fonts': [
+                {'lang': 'en', 'lang_name': 'English', 'alias': a,
+                 'file': 'a.ttf', 'family': family, 'style': 'Regular',
+                 'is_default': 1}
+                for a in FONT_ALIASES
+            ],
+        }
+
+    def test_json2index_keeps_header(self):
+        """Test that header fields are preserved."""
+        data = json2index(self.make_json('Noto Sans'), False, True)
+        assert data['id'] == 'fedora'
+        assert data['pattern'] == 'minimal'
+        assert 'fonts' not in data
+        assert data['index']['English']['serif']['family'] == 'Noto Sans'
+        assert 'is_default' not in data['index']['English']['serif']
+
+    def test_generate_diff_accepts_index(self):
+        """Test that indexed data produces the same output as JSON."""
+        expected = list(generate_diff(TextRenderer(), '',
+                                      self.make_json('Noto Sans'),
+                                      self.make_json('DejaVu Sans'),
+                                      True, False))
+        result = list(generate_diff(TextRenderer(), '',
+                                    json2index(self.make_json('Noto Sans'),
+                                               False, True),
+                                    json2index(self.make_json('DejaVu Sans'),
+                                               False, True),
+                                    True, False))
+        assert result == expected
+        assert result[1] is False
+
+    def test_generate_diff_rejects_mismatched_index(self):
+        """Test that an index built with other options is refused."""
+        data = json2index(self.make_json('Noto Sans'), True, True)
+        with pytest.raises(RuntimeError):
+            list(generate_diff(TextRenderer(), '', data, data, True, False))
@@ -0,0 +1,125 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for merge module."""
+
+import json
+import pytest
+from unittest.mock import patch
+from fontquery.merge import make_plan, merge_files
+
+HEADER = {
+    'id': 'fedora',
+    'version_id': '42',
+    'pattern': 'minimal',
+    'fq_id': '1.0',
+}
+FAMILIES = ['sans-serif', 'serif', 'monospace', 'system-ui']
+
+
+def record(lang, alias):
+    return {'lang': lang, 'lang_name': lang, 'alias': alias,
+            'file': f'{lang}.ttf', 'family': lang, 'style': 'Regular',
+            'is_default': 1}
+
+
+def single_node(langs, families=FAMILIES):
+    return dict(HEADER, fonts=[record(ll, f) for ll in langs
+                               for f in families])
+
+
+def write(path, data):
+    path.write_text(json.dumps(data, indent=4) + '\n', encoding='utf-8')
+    return str(path)
+
+
+class TestPlan:
+    """Tests for making a plan."""
+
+    def test_distribute(self):
+        """Test that shards are distributed to workers in turn."""
+        plan = make_plan([('fedora', 'rawhide', 'minimal'),
+                          ('fedora', 'rawhide', 'all')], 2,
+                         langs=['en', 'ja', 'ko'])
+        assert len(plan['images']) == 2
+        assert [j['worker'] for j in plan['jobs']] == [0, 1, 0, 1]
+        assert [j['lang'] for j in plan['jobs']] == [['en', 'ja'], ['ko']] * 2
+        cmd = plan['jobs'][3]['command']
+        assert cmd[:9] == ['fontquery', '-m', 'json', '-P', 'fedora',
+                           '-r', 'rawhide', '-t', 'all']
+        assert cmd[-2:] == ['-l', 'ko']
+        assert len({j['output'] for j in plan['jobs']}) == 4
+
+    def test_split_families(self):
+        """Test that families are passed to the client when split."""
+        plan = make_plan([('fedora', 'rawhide', 'minimal')], 1,
+                         langs=['ja'], split_families=True)
+        assert len(plan['jobs']) == 4
+        assert plan['jobs'][1]['command'][-3:] == ['--', '-f', 'serif']
+
+    def test_default_langs(self):
+        """Test that the default languages are taken from the image once."""
+        with patch('fontquery.utils.run_container_query',
+                   return_value='en\nja\n') as mock_query:
+            plan = make_plan([('fedora', '42', 'minimal'),
+                              ('fedora', '42', 'extra')], 2)
+        assert mock_query.call_count == 1
+        assert mock_query.call_args.args[2] == 'langs'
+        assert plan['images'][1]['lang'] == ['en', 'ja']
+
+
+class TestMerge:
+    """Tests for merging results."""
+
+    def test_identical_to_single_node(self, tmp_path):
+        """Test that merged result is what a single node emits."""
+        langs = ['en', 'ja', 'ko', 'zh-cn']
+        plan = make_plan([('fedora', '42', 'minimal')], 3, langs=langs,
+                         split_families=True)
+        files = []
+        # Results may be collected in any order
+        for j in reversed(plan['jobs']):
+            files.append(write(tmp_path / j['output'],
+                               single_node(j['lang'], j['family'])))
+        result = merge_files(files, plan)
+        assert len(result) == 1
+        name, data = result[0]
+        assert name == 'fedora-42-minimal.json'
+        assert json.dumps(data, indent=4) == \
+            json.dumps(single_node(langs), indent=4)
+
+    def test_without_plan(self, tmp_path):
+        """Test that results are merged in the given order."""
+        files = [write(tmp_path / 'a.json', single_node(['en'])),
+                 write(tmp_path / 'b.json', single_node(['ja', 'en']))]
+        name, data = merge_files(files)[0]
+        assert name == 'fedora-42-minimal.json'
+        assert data == single_node(['en', 'ja'])
+
+    def test_header_mismatch(self, tmp_path):
+        """Test that results for the same image must match headers."""
+        other = dict(single_node(['ja']), fq_id='2.0')
+        plan = make_plan([('fedora', '42', 'minimal')], 2,
+                         langs=['en', 'ja'])
+        files = [write(tmp_path / plan['jobs'][0]['output'],
+                       single_node(['en'])),
+                 write(tmp_path / plan['jobs'][1]['output'], other)]
+        with pytest.raises(RuntimeError, match='fq_id mismatch'):
+            merge_files(files, plan)
+
+    def test_conflict(self, tmp_path):
+        """Test that conflicting records are reported."""
+        other = single_node(['en'])
+        other['fonts'][0]['family'] = 'Other'
+        files = [write(tmp_path / 'a.json', single_node(['en'])),
+                 write(tmp_path / 'b.json', other)]
+        with pytest.raises(RuntimeError, match='conflicting'):
+            merge_files(files)
+
+    def test_multiple_images(self, tmp_path):
+        """Test that results are grouped per image."""
+        files = [write(tmp_path / 'a.json', single_node(['en'])),
+                 write(tmp_path / 'b.json',
+                       dict(single_node(['en']), version_id='41'))]
+        names = [name for name, _ in merge_files(files)]
+        assert names == ['fedora-42-minimal.json', 'fedora-41-minimal.json']
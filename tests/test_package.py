@@ -127,6 +127,25 @@ class TestFont2Package:
         with pytest.raises(PackageNotFound):
             list(Font2Package.get_package_name_from_file('/path/to/font.ttf'))
 
+    @patch('shutil.which')
+    @patch('subprocess.run')
+    def test_get_package_name_from_file_sysroot(self, mock_run, mock_which,
+                                                monkeypatch):
+        """Test looking up files reported with the sysroot in the root."""
+        monkeypatch.setattr(Font2Package, 'root', '/mnt/image')
+        mock_which.return_value = '/usr/bin/rpm'
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = b'google-noto-sans-fonts'
+        mock_run.return_value = mock_result
+
+        result = list(Font2Package.get_package_name_from_file(
+            '/mnt/image/usr/share/fonts/font.ttf'))
+        assert result == ['google-noto-sans-fonts']
+        assert mock_run.call_args.args[0] == [
+            'rpm', '--root', '/mnt/image', '-qf', '--qf', '%{name}',
+            '/usr/share/fonts/font.ttf']
+
     @patch('shutil.which')
     def test_get_package_name_from_file_no_rpm(self, mock_which):
         """Test getting package name when rpm is not available."""
@@ -0,0 +1,164 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for pkgdiff module."""
+
+import argparse
+import io
+import json
+import threading
+import pytest
+from unittest.mock import patch
+from fontquery.htmlformatter import FONT_ALIASES, TextRenderer
+from fontquery.pkgdiff import load_manifest, load_pair, run_batch
+
+
+def make_json(family):
+    return json.dumps({
+        'id': 'fedora',
+        'version_id': '40',
+        'pattern': 'minimal',
+        'fq_id': '1',
+        'fonts': [
+            {'lang': 'en', 'lang_name': 'English', 'alias': a,
+             'file': 'a.ttf', 'family': family, 'style': 'Regular',
+             'is_default': 1}
+            for a in FONT_ALIASES
+        ],
+    })
+
+
+class TestManifest:
+    """Tests for loading package sets."""
+
+    def test_load(self, tmp_path):
+        """Test that globs are expanded from the manifest directory."""
+        for n in ['a-1.rpm', 'a-2.rpm', 'b.rpm']:
+            (tmp_path / n).write_bytes(b'')
+        manifest = tmp_path / 'sets.yaml'
+        manifest.write_text('sets:\n'
+                            '  - name: a\n'
+                            '    packages: [a-*.rpm]\n'
+                            '  - packages: [b.rpm]\n', encoding='utf-8')
+        sets = load_manifest(str(manifest))
+        assert sets == [('a', [str(tmp_path / 'a-1.rpm'),
+                               str(tmp_path / 'a-2.rpm')]),
+                        ('set002', [str(tmp_path / 'b.rpm')])]
+
+    def test_missing_package(self, tmp_path):
+        """Test that a missing package is reported."""
+        manifest = tmp_path / 'sets.json'
+        manifest.write_text(json.dumps([['foo.rpm']]), encoding='utf-8')
+        with pytest.raises(RuntimeError, match='No such package'):
+            load_manifest(str(manifest))
+
+
+class TestBatch:
+    """Tests for checking package sets against one baseline."""
+
+    def run(self, tmp_path, results):
+        for n in results:
+            (tmp_path / f'{n}.rpm').write_bytes(b'')
+        manifest = tmp_path / 'sets.yaml'
+        manifest.write_text(json.dumps({'sets': [
+            {'name': n, 'packages': [f'{n}.rpm']} for n in results
+        ]}), encoding='utf-8')
+        args = argparse.Namespace(batch=str(manifest), output_dir=tmp_path,
+                                  render='text', jobs=2, release='rawhide',
+                                  disable_cache=True, loose_comparison=False,
+                                  diff_only=False, output=io.StringIO())
+        args.output.close = lambda: None
+
+        def load_json(release, packages, args, fcache, baseline):
+            return results[packages[0].rsplit('/', 1)[-1][:-4]]
+        with patch('fontquery.pkgdiff.load_json', side_effect=load_json):
+            ret = run_batch(TextRenderer, make_json('Noto Sans'), args)
+        return ret, args.output.getvalue()
+
+    def test_unchanged(self, tmp_path):
+        """Test that no changes are reported with the exit status 0."""
+        ret, summary = self.run(tmp_path, {'a': make_json('Noto Sans')})
+        assert ret == 0
+        assert '1 unchanged' in summary
+        assert (tmp_path / 'a.txt').exists()
+
+    def test_changed(self, tmp_path):
+        """Test that any changed set makes the exit status 1."""
+        ret, summary = self.run(tmp_path, {'a': make_json('Noto Sans'),
+                                           'b': make_json('DejaVu Sans')})
+        assert ret == 1
+        assert summary.splitlines()[1].split()[:2] == ['b', 'changed']
+        assert 'DejaVu Sans' in (tmp_path / 'b.txt').read_text()
+
+    def test_failed(self, tmp_path):
+        """Test that a set failed to install makes the exit status 2."""
+        ret, summary = self.run(tmp_path, {'a': make_json('DejaVu Sans'),
+                                           'b': None})
+        assert ret == 2
+        assert '1 changed, 0 unchanged, 1 failed' in summary
+
+
+    def test_unsafe_names(self, tmp_path):
+        """Test that set names can't write reports out of the output dir."""
+        (tmp_path / 'a.rpm').write_bytes(b'')
+        manifest = tmp_path / 'sets.yaml'
+        manifest.write_text(json.dumps({'sets': [
+            {'name': '../../evil', 'packages': ['a.rpm']},
+            {'name': '/tmp/evil', 'packages': ['a.rpm']},
+        ]}), encoding='utf-8')
+        outdir = tmp_path / 'out' / 'reports'
+        args = argparse.Namespace(batch=str(manifest), output_dir=outdir,
+                                  render='text', jobs=2, release='rawhide',
+                                  disable_cache=True, loose_comparison=False,
+                                  diff_only=False, output=io.StringIO())
+        args.output.close = lambda: None
+        with patch('fontquery.pkgdiff.load_json',
+                   return_value=make_json('Noto Sans')):
+            assert run_batch(TextRenderer, make_json('Noto Sans'), args) == 0
+        assert sorted(p.name for p in tmp_path.glob('**/*.txt')) == \
+            ['_._.._evil.txt', '_tmp_evil.txt']
+        assert all(p.parent == outdir for p in tmp_path.glob('**/*.txt'))
+
+    def test_error_in_one_set(self, tmp_path):
+        """Test that an error in one set doesn't abort the others."""
+        for n in ['a', 'b']:
+            (tmp_path / f'{n}.rpm').write_bytes(b'')
+        manifest = tmp_path / 'sets.yaml'
+        manifest.write_text(json.dumps({'sets': [
+            {'name': n, 'packages': [f'{n}.rpm']} for n in ['a', 'b']
+        ]}), encoding='utf-8')
+        args = argparse.Namespace(batch=str(manifest), output_dir=tmp_path,
+                                  render='text', jobs=2, release='rawhide',
+                                  disable_cache=True, loose_comparison=False,
+                                  diff_only=False, output=io.StringIO())
+        args.output.close = lambda: None
+
+        def load_json(release, packages, args, fcache, baseline):
+            if packages[0].endswith('b.rpm'):
+                raise OSError('No space left on device')
+            return make_json('Noto Sans')
+        with patch('fontquery.pkgdiff.load_json', side_effect=load_json):
+            ret = run_batch(TextRenderer, make_json('Noto Sans'), args)
+        assert ret == 2
+        assert '0 changed, 1 unchanged, 1 failed' in args.output.getvalue()
+
+
+class TestPair:
+    """Tests for loading JSON without and with packages."""
+
+    def test_concurrent(self):
+        """Test that both are loaded at once."""
+        args = argparse.Namespace(release='rawhide', package=['foo.rpm'],
+                                  disable_cache=True, lang=None)
+        barrier = threading.Barrier(2, timeout=5)
+        calls = []
+
+        def load_json(release, packages, args, fcache, baseline=None):
+            calls.append((packages, baseline))
+            barrier.wait()
+            if packages is None:
+                return 'base'
+            return 'installed:' + baseline.result()
+        with patch('fontquery.pkgdiff.load_json', side_effect=load_json):
+            assert load_pair(args) == ('base', 'installed:base')
+        assert len(calls) == 2
@@ -0,0 +1,276 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for podmanapi module."""
+
+import io
+import json
+import socketserver
+import struct
+import tarfile
+import tempfile
+import threading
+import urllib.parse
+import pytest
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from unittest.mock import patch
+from fontquery.cache import FontQueryCache
+from fontquery.container import ContainerImage
+from fontquery.podmanapi import ApiContainerImage, LibpodClient, demux
+
+IMAGE = 'ghcr.io/fedora-i18n/fontquery/fedora/minimal:rawhide'
+
+
+def frame(kind, data):
+    return struct.pack('>BxxxI', kind, len(data)) + data
+
+
+class LibpodStandIn(BaseHTTPRequestHandler):
+    """Subset of the libpod API to run containers"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _reply(self, code, body=None):
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)
+                if size == 0:
+                    return data
+                data += chunk[:-2]
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _hijack(self, frames, wait=None):
+        self.wfile.write(b'HTTP/1.1 200 OK\r\n'
+                         b'Content-Type: application/vnd.docker.raw-stream'
+                         b'\r\n\r\n')
+        self.wfile.flush()
+        if wait:
+            wait.wait(5)
+        for f in frames:
+            self.wfile.write(f)
+        self.close_connection = True
+
+    def _dispatch(self, method):
+        url = urllib.parse.urlparse(self.path)
+        path = url.path[len('/v4.0.0/libpod'):]
+        params = dict(urllib.parse.parse_qsl(url.query))
+        body = self._read_body()
+        srv = self.server
+        srv.requests.append((method, path))
+        image = '/images/' + urllib.parse.quote(IMAGE, safe='')
+        if path == image + '/exists':
+            self._reply(204 if srv.has_image else 404)
+        elif path == image + '/json':
+            if srv.has_image:
+                self._reply(200, {'Id': 'a' * 64, 'Digest': 'sha256:1',
+                                  'RepoDigests': [IMAGE + '@sha256:2']})
+            else:
+                self._reply(404, {'message': 'no such image'})
+        elif path == '/images/pull':
+            srv.has_image = True
+            data = b'{"id": "0123"}\n'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif path == '/containers/create':
+            srv.spec = json.loads(body)
+            self._reply(201, {'Id': 'c1'})
+        elif path == '/containers/c1/attach':
+            out = json.dumps(srv.spec.get('command')).encode('utf-8')
+            self._hijack([frame(2, b'warn\n'), frame(1, out)], srv.started)
+        elif path == '/containers/c1/start':
+            code = 304 if srv.started.is_set() else 204
+            srv.started.set()
+            self._reply(code)
+        elif path == '/containers/c1/wait':
+            self._reply(200, 0)
+        elif path == '/containers/c1/exec':
+            srv.execs.append(json.loads(body)['Cmd'])
+            self._reply(201, {'Id': 'e1'})
+        elif path == '/exec/e1/start':
+            out = json.dumps(srv.execs[-1]).encode('utf-8')
+            self._hijack([frame(1, out)])
+        elif path == '/exec/e1/json':
+            self._reply(200, {'ExitCode': 0})
+        elif path == '/containers/c1/archive':
+            srv.archive = (params['path'], body)
+            self._reply(200)
+        elif path == '/commit':
+            srv.commit = params
+            self._reply(201, {'Id': '4567'})
+        elif path == '/containers/c1':
+            self._reply(200, [])
+        else:
+            self._reply(404, {'message': 'not found'})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+class LibpodServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, LibpodStandIn)
+        self.connections = 0
+        self.requests = []
+        self.execs = []
+        self.has_image = True
+        self.spec = {}
+        self.started = threading.Event()
+
+
+@pytest.fixture
+def libpod(tmp_path, monkeypatch):
+    ContainerImage._image_state.clear()
+    ApiContainerImage._clients.clear()
+    monkeypatch.setattr('fontquery.registry.BaseDirectory.save_cache_path',
+                        lambda *args: str(tmp_path))
+    monkeypatch.setattr(ContainerImage, 'registry_url', 'http://127.0.0.1:9')
+    # Keep the path short enough for a unix socket
+    with tempfile.TemporaryDirectory(dir='/tmp') as d:
+        server = LibpodServer(str(Path(d) / 'podman.sock'))
+        t = threading.Thread(target=server.serve_forever,
+                             kwargs={'poll_interval': 0.05}, daemon=True)
+        t.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+    for client in ApiContainerImage._clients.values():
+        client.close()
+    ApiContainerImage._clients.clear()
+    ContainerImage._image_state.clear()
+
+
+def make_image(server):
+    c = ApiContainerImage('fedora', 'rawhide',
+                          socket_path=server.server_address)
+    c.target = 'minimal'
+    return c
+
+
+class TestDemux:
+    """Tests for splitting multiplexed streams."""
+
+    def test_demux(self):
+        stream = io.BytesIO(frame(1, b'foo') + frame(2, b'bar') +
+                            frame(1, b'baz'))
+        assert demux(stream) == (b'foobaz', b'bar')
+
+    def test_stderr_passthrough(self):
+        stream = io.BytesIO(frame(2, b'bar') + frame(1, b'foo'))
+        err = io.StringIO()
+        assert demux(stream, err) == (b'foo', b'')
+        assert err.getvalue() == 'bar'
+
+
+class TestApiContainerImage:
+    """Tests for operating containers through the API."""
+
+    def test_get_json(self, libpod, capsys):
+        """Test that a query runs in one container with attached output."""
+        c = make_image(libpod)
+        assert json.loads(c.get_json(lang=['ja'])) == ['-m', 'json', '-l=ja']
+        assert libpod.spec['image'] == IMAGE
+        assert ('DELETE', '/containers/c1') in libpod.requests
+        assert 'warn' in capsys.readouterr().err
+        # One shared connection plus one hijacked for attach
+        assert libpod.connections == 2
+
+    def test_connection_reuse(self, libpod):
+        """Test that requests share a connection between instances."""
+        for _ in range(3):
+            make_image(libpod)._has_image()
+        assert libpod.connections == 1
+
+    def test_pull(self, libpod):
+        """Test that a missing image is pulled through the API."""
+        libpod.has_image = False
+        c = make_image(libpod)
+        assert c.pull()
+        assert ('POST', '/images/pull') in libpod.requests
+        assert c._get_state('image_id') == '0123'
+        assert c._get_local_digests() == ['sha256:1', 'sha256:2']
+
+    def test_install(self, libpod, tmp_path):
+        """Test that packages are streamed and installed in a container."""
+        rpm = tmp_path / 'foo.rpm'
+        rpm.write_bytes(b'rpm' * 100)
+        c = make_image(libpod)
+        out = c.get_json_after_install([str(rpm)], lang=None)
+        assert json.loads(out) == ['/usr/local/bin/fontquery-client',
+                                   '-m', 'json']
+        assert libpod.execs[0][-1] == 'foo.rpm'
+        assert libpod.spec['entrypoint'] == ['/bin/bash']
+        path, data = libpod.archive
+        assert path == '/var/tmp/fontquery'
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            assert tar.extractfile('foo.rpm').read() == b'rpm' * 100
+
+    def test_volumes(self, libpod):
+        """Test that volumes are mounted with their options."""
+        c = make_image(libpod)
+        c._run(['-m', 'checkupdate'], volumes=['/tmp/dnf:/var/cache/dnf:z'])
+        assert libpod.spec['mounts'] == [{
+            'type': 'bind', 'source': '/tmp/dnf',
+            'destination': '/var/cache/dnf', 'options': ['rbind', 'z']
+        }]
+
+    def test_commit(self, libpod):
+        """Test that a container is committed into the image."""
+        c = make_image(libpod)
+        c._commit('c1')
+        assert libpod.commit == {
+            'container': 'c1',
+            'repo': 'ghcr.io/fedora-i18n/fontquery/fedora/minimal',
+            'tag': 'rawhide'
+        }
+
+    def test_no_socket(self, tmp_path):
+        """Test that a missing socket is reported."""
+        client = LibpodClient(str(tmp_path / 'podman.sock'))
+        with pytest.raises(RuntimeError, match='podman API socket'):
+            client.request('GET', '/_ping')
+
+    def test_cache_revision(self, libpod, tmp_path, monkeypatch):
+        """Test that caches look up images through the API."""
+        monkeypatch.setenv('CONTAINER_HOST', f'unix://{libpod.server_address}')
+        with patch('fontquery.cache.BaseDirectory.save_cache_path',
+                   return_value=str(tmp_path)), \
+             patch('subprocess.run') as mock_run:
+            fqc = FontQueryCache('fedora', 'rawhide', 'minimal',
+                                 backend='api')
+            assert fqc.revision == 'sha256:' + 'a' * 64
+            assert make_image(libpod)._local_image_id() == fqc.revision
+            libpod.has_image = False
+            with pytest.raises(RuntimeError, match='No images available'):
+                fqc.revision
+            assert fqc.read() is None
+        mock_run.assert_not_called()
@@ -0,0 +1,149 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for registry module."""
+
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+from fontquery.container import ContainerImage
+from fontquery.registry import PullRecord, RegistryClient, split_reference
+
+DIGEST = 'sha256:' + '1' * 64
+REPO = 'fedora-i18n/fontquery/fedora/minimal'
+
+
+class RegistryStandIn(BaseHTTPRequestHandler):
+    """Registry which requires a bearer token like ghcr.io"""
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.requests.append(('GET', self.path))
+        if self.path.startswith('/token?'):
+            body = json.dumps({'token': 'secret'}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def do_HEAD(self):
+        self.requests.append(('HEAD', self.path))
+        if self.path != f'/v2/{REPO}/manifests/rawhide':
+            self.send_response(404)
+            self.end_headers()
+        elif self.headers.get('Authorization') != 'Bearer secret':
+            host, port = self.server.server_address
+            self.send_response(401)
+            self.send_header('WWW-Authenticate',
+                             f'Bearer realm="http://{host}:{port}/token",'
+                             f'service="stand-in",scope="repository:{REPO}:pull"')
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('Docker-Content-Digest', DIGEST)
+            self.end_headers()
+
+
+@pytest.fixture
+def registry():
+    RegistryStandIn.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RegistryStandIn)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    host, port = server.server_address
+    yield f'http://{host}:{port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def isolate(tmp_path, monkeypatch):
+    ContainerImage._image_state.clear()
+    monkeypatch.setattr('fontquery.registry.BaseDirectory.save_cache_path',
+                        lambda *args: str(tmp_path))
+    yield
+    ContainerImage._image_state.clear()
+
+
+def make_result(returncode=0, stdout=b''):
+    result = MagicMock()
+    result.returncode = returncode
+    result.stdout = stdout
+    return result
+
+
+class TestRegistryClient:
+    """Tests for RegistryClient class."""
+
+    def test_split_reference(self):
+        """Test splitting an image reference."""
+        assert split_reference(f'ghcr.io/{REPO}:rawhide') == \
+            ('ghcr.io', REPO, 'rawhide')
+
+    def test_get_digest_with_token(self, registry):
+        """Test that a token is obtained on the challenge."""
+        client = RegistryClient(registry)
+        assert client.get_digest(REPO, 'rawhide') == DIGEST
+        assert client.get_digest(REPO, 'rawhide') == DIGEST
+        # The token is reused for the second request
+        assert [r[0] for r in RegistryStandIn.requests] == \
+            ['HEAD', 'GET', 'HEAD', 'HEAD']
+
+    def test_get_digest_unknown_tag(self, registry):
+        """Test that an unknown tag results in None."""
+        assert RegistryClient(registry).get_digest(REPO, '1') is None
+
+    def test_get_digest_unreachable(self):
+        """Test that an unreachable registry results in None."""
+        assert RegistryClient('http://127.0.0.1:9').get_digest(REPO, 'rawhide') is None
+
+
+class TestPull:
+    """Tests for ContainerImage.pull with freshness checks."""
+
+    @patch('subprocess.run')
+    def test_skip_pull_when_digest_matches(self, mock_run, registry, monkeypatch):
+        """Test that no layers are pulled when the digest matches."""
+        monkeypatch.setattr(ContainerImage, 'registry_url', registry)
+        mock_run.return_value = make_result(stdout=f'{DIGEST} '
+                                            f'ghcr.io/{REPO}@{DIGEST}\n'.encode('utf-8'))
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        assert c.pull() is True
+        assert [call.args[0][:3] for call in mock_run.call_args_list] == \
+            [['podman', 'image', 'inspect']]
+        assert PullRecord().get(f'ghcr.io/{REPO}:rawhide')['digest'] == DIGEST
+
+    @patch('subprocess.run')
+    def test_pull_when_digest_differs(self, mock_run, registry, monkeypatch):
+        """Test that the image is pulled when the registry has another one."""
+        monkeypatch.setattr(ContainerImage, 'registry_url', registry)
+        mock_run.return_value = make_result(stdout=b'sha256:' + b'2' * 64 + b'\n')
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        assert c.pull() is True
+        assert mock_run.call_args_list[-1].args[0][:2] == ['podman', 'pull']
+
+    @patch('subprocess.run')
+    def test_skip_within_ttl(self, mock_run, monkeypatch):
+        """Test that nothing is checked within TTL."""
+        monkeypatch.setattr(ContainerImage, 'registry_url', 'http://127.0.0.1:9')
+        mock_run.return_value = make_result()
+        PullRecord().update(f'ghcr.io/{REPO}:rawhide', None)
+
+        c = ContainerImage('fedora', 'rawhide')
+        c.target = 'minimal'
+        c.pull_ttl = 3600
+        assert c.pull() is True
+        assert [call.args[0][:2] for call in mock_run.call_args_list] == \
+            [['buildah', 'images']]
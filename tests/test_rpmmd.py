@@ -0,0 +1,143 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# SPDX-License-Identifier: MIT
+
+"""Tests for rpmmd module."""
+
+import gzip
+import pytest
+from fontquery import rpmmd
+from fontquery.rpmmd import (PackageRecord, compare_evr, load_repo,
+                             parse_nevra, pending_updates, rpmvercmp)
+
+PRIMARY = '''<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common"
+          xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="{n}">
+{packages}
+</metadata>
+'''
+PACKAGE = '''<package type="rpm">
+  <name>{name}</name>
+  <arch>{arch}</arch>
+  <version epoch="{epoch}" ver="{ver}" rel="{rel}"/>
+</package>'''
+REPOMD = '''<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo">
+  <data type="filelists">
+    <location href="repodata/filelists.xml.gz"/>
+  </data>
+  <data type="primary">
+    <location href="repodata/abc-primary.xml.gz"/>
+  </data>
+</repomd>
+'''
+
+
+def make_repo(path, packages):
+    """Make a repository stand-in with the primary metadata only."""
+    (path / 'repodata').mkdir(parents=True)
+    (path / 'repodata' / 'repomd.xml').write_text(REPOMD, encoding='utf-8')
+    xml = PRIMARY.format(n=len(packages), packages='\n'.join(
+        PACKAGE.format(**p) for p in packages))
+    with gzip.open(path / 'repodata' / 'abc-primary.xml.gz', 'wt',
+                   encoding='utf-8') as f:
+        f.write(xml)
+    return str(path)
+
+
+def pkg(name, ver, rel='1.fc40', epoch='0', arch='noarch'):
+    return dict(name=name, ver=ver, rel=rel, epoch=epoch, arch=arch)
+
+
+@pytest.fixture(autouse=True)
+def isolate(tmp_path, monkeypatch):
+    rpmmd._repos.clear()
+    monkeypatch.setattr('fontquery.rpmmd.BaseDirectory.save_cache_path',
+                        lambda *args: str(tmp_path))
+    yield
+    rpmmd._repos.clear()
+
+
+class TestVersions:
+    """Tests for comparing versions."""
+
+    @pytest.mark.parametrize('a, b, expected', [
+        ('1.0', '1.0', 0),
+        ('1.0', '1.1', -1),
+        ('1.10', '1.9', 1),
+        ('1.010', '1.10', 0),
+        ('1.0a', '1.0', 1),
+        ('1.0', '1.a', 1),
+        ('1.0~rc1', '1.0', -1),
+        ('1.0~rc1', '1.0~rc2', -1),
+        ('1.0^git1', '1.0', 1),
+        ('1.0^git1', '1.0.1', -1),
+        ('2.0_1', '2.0.1', 0),
+    ])
+    def test_rpmvercmp(self, a, b, expected):
+        """Test that versions are ordered like rpm does."""
+        assert rpmvercmp(a, b) == expected
+        assert rpmvercmp(b, a) == -expected
+
+    def test_epoch(self):
+        """Test that the epoch wins over the version."""
+        assert compare_evr(('1', '1.0', '1'), ('0', '2.0', '1')) == 1
+
+    def test_parse_nevra(self):
+        """Test that NEVRA is split with the epoch defaulting to 0."""
+        assert parse_nevra('google-noto-sans-fonts-1:20240101-2.fc40.noarch') \
+            == ('google-noto-sans-fonts', '1', '20240101', '2.fc40', 'noarch')
+        assert parse_nevra('fontconfig-2.15.0-4.fc40.x86_64')[1] == '0'
+        with pytest.raises(RuntimeError):
+            parse_nevra('fontconfig')
+
+
+class TestRepo:
+    """Tests for reading repositories."""
+
+    def test_newest(self, tmp_path):
+        """Test that the newest version per package is kept."""
+        url = make_repo(tmp_path / 'repo', [pkg('foo', '1.0'),
+                                            pkg('foo', '1.2'),
+                                            pkg('foo', '1.1'),
+                                            pkg('foo', '2.0', arch='src')])
+        assert load_repo(url) == {('foo', 'noarch'): ('0', '1.2', '1.fc40')}
+        assert load_repo('file://' + url) == load_repo(url)
+
+    def test_missing(self, tmp_path):
+        """Test that an unavailable repository is reported."""
+        with pytest.raises(RuntimeError, match='Unable to read repository'):
+            load_repo(str(tmp_path / 'none'))
+
+    def test_pending_updates(self, tmp_path):
+        """Test that only packages with newer versions are reported."""
+        base = make_repo(tmp_path / 'base', [pkg('foo', '1.0'),
+                                             pkg('bar', '1.0', arch='x86_64')])
+        updates = make_repo(tmp_path / 'updates', [pkg('foo', '1.1')])
+        installed = ['foo-0:1.0-1.fc40.noarch', 'bar-0:1.0-1.fc40.x86_64',
+                     'local-0:1.0-1.noarch']
+        assert pending_updates(installed, [base]) == []
+        assert pending_updates(installed, [base, updates]) == [
+            ('foo.noarch', '0:1.0-1.fc40', '0:1.1-1.fc40')]
+
+    def test_pending_updates_limitation(self, tmp_path):
+        """Test that obsoletes and noarch to arch changes aren't found.
+
+        They are documented to be checked in containers with force_check.
+        """
+        url = make_repo(tmp_path / 'repo', [pkg('foo', '1.1', arch='x86_64'),
+                                            pkg('bar-ng', '2.0')])
+        installed = ['foo-0:1.0-1.fc40.noarch', 'bar-0:1.0-1.fc40.noarch']
+        assert pending_updates(installed, [url]) == []
+
+
+class TestPackageRecord:
+    """Tests for recording packages in images."""
+
+    def test_bound_to_image(self):
+        """Test that packages are known only for the recorded image."""
+        ref = 'ghcr.io/fedora-i18n/fontquery/fedora/minimal:40'
+        assert PackageRecord(ref).get('sha256:1') is None
+        assert PackageRecord(ref).update('sha256:1', ['b', 'a'])
+        assert PackageRecord(ref).get('sha256:1') == ['a', 'b']
+        assert PackageRecord(ref).get('sha256:2') is None
+        assert PackageRecord(ref).get(None) is None
@@ -3,13 +3,22 @@
 
 """Tests for utils module."""
 
+import argparse
+import asyncio
+import json
 import pytest
 from unittest.mock import MagicMock, patch
 from fontquery.utils import (
     normalize_release,
     build_verbose_flags,
     build_lang_flags,
+    build_query_cmdline,
+    image_target,
     get_fontquery_client_path,
+    merge_json_shards,
+    replace_langs,
+    run_async,
+    split_shards,
 )
 
 
@@ -60,6 +69,23 @@ class TestBuildVerboseFlags:
         assert build_verbose_flags(5) == ['-vvvv']
 
 
+class TestImageTarget:
+    """Tests for image_target function."""
+
+    def test_target(self):
+        """Test that the target is used as is by default."""
+        args = argparse.Namespace(target='extra')
+        assert image_target(args) == 'extra'
+
+    def test_slim(self):
+        """Test that slim images are queried with --slim."""
+        args = argparse.Namespace(product='fedora', target='extra', slim=True,
+                                  verbose=0, lang=None)
+        assert image_target(args) == 'extra-slim'
+        assert 'ghcr.io/fedora-i18n/fontquery/fedora/extra-slim:40' in \
+            build_query_cmdline('40', args, 'json')
+
+
 class TestBuildLangFlags:
     """Tests for build_lang_flags function."""
 
@@ -104,3 +130,135 @@ class TestGetFontqueryClientPath:
             with patch('fontquery.utils.client', None):
                 with pytest.raises(RuntimeError, match='fontquery-client not found'):
                     get_fontquery_client_path()
+
+
+class FakeProcess:
+    """Process which finishes when told to."""
+
+    running = 0
+    peak = 0
+
+    def __init__(self, cmdline, block=False):
+        self.cmdline = cmdline
+        self.block = block
+        self.returncode = None
+        self.killed = False
+
+    async def communicate(self):
+        FakeProcess.running += 1
+        FakeProcess.peak = max(FakeProcess.peak, FakeProcess.running)
+        try:
+            if self.block:
+                await asyncio.Event().wait()
+            await asyncio.sleep(0.01)
+        finally:
+            FakeProcess.running -= 1
+        self.returncode = 0
+        return b' '.join(s.encode('utf-8') for s in self.cmdline), None
+
+    def kill(self):
+        self.killed = True
+        self.returncode = -9
+
+    async def wait(self):
+        self.returncode = self.returncode or 0
+        return self.returncode
+
+
+class TestRunAsync:
+    """Test cases for run_async function."""
+
+    @pytest.fixture(autouse=True)
+    def fake_exec(self, monkeypatch):
+        FakeProcess.running = FakeProcess.peak = 0
+        self.procs = []
+
+        async def create(*cmdline, **kwargs):
+            self.procs.append(FakeProcess(list(cmdline),
+                                          block=cmdline[0] == 'block'))
+            return self.procs[-1]
+        monkeypatch.setattr('asyncio.create_subprocess_exec', create)
+
+    def test_output(self):
+        """Test that output and the exit code are returned."""
+        res = asyncio.run(run_async(['echo', 'foo']))
+        assert res.returncode == 0
+        assert res.stdout == b'echo foo'
+
+    def test_concurrency_limit(self, monkeypatch):
+        """Test that no more commands than the limit run at once."""
+        monkeypatch.setattr('fontquery.utils.max_concurrency', 2)
+
+        async def run():
+            return await asyncio.gather(*[run_async(['true'])
+                                          for _ in range(5)])
+        assert len(asyncio.run(run())) == 5
+        assert FakeProcess.peak == 2
+
+    def test_cancel(self):
+        """Test that a cancelled command is killed and cleaned up."""
+        async def run():
+            task = asyncio.create_task(run_async(['block'],
+                                                 cleanup=['cleanup']))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        asyncio.run(run())
+        assert self.procs[0].killed
+        assert self.procs[1].cmdline == ['cleanup']
+
+
+class TestShards:
+    """Test cases for splitting and merging shards."""
+
+    def test_split_keeps_order(self):
+        """Test that items are split evenly in the original order."""
+        assert split_shards(list('abcdefg'), 3) == [['a', 'b', 'c'],
+                                                     ['d', 'e'],
+                                                     ['f', 'g']]
+
+    def test_split_more_shards_than_items(self):
+        """Test that no empty shards are made."""
+        assert split_shards(['a', 'b'], 4) == [['a'], ['b']]
+
+    def test_merge(self):
+        """Test that fonts are concatenated under the same header."""
+        header = {'id': 'fedora', 'version_id': '40', 'pattern': 'minimal'}
+        a = json.dumps(dict(header, fonts=[{'lang': 'ja', 'alias': 'serif'}]))
+        b = json.dumps(dict(header, fonts=[{'lang': 'ko', 'alias': 'serif'},
+                                           {'lang': 'zh', 'alias': 'serif'}]))
+        merged = json.loads(merge_json_shards([a, b]))
+        assert merged['id'] == 'fedora'
+        assert [f['lang'] for f in merged['fonts']] == ['ja', 'ko', 'zh']
+
+    def test_merge_mismatch(self):
+        """Test that results from different environments aren't merged."""
+        a = json.dumps({'id': 'fedora', 'version_id': '40', 'fonts': []})
+        b = json.dumps({'id': 'fedora', 'version_id': '41', 'fonts': []})
+        with pytest.raises(RuntimeError, match='version_id mismatch'):
+            merge_json_shards([a, b])
+
+
+class TestReplaceLangs:
+    """Test cases for replacing results for some languages."""
+
+    header = {'id': 'fedora', 'version_id': '40', 'pattern': 'minimal'}
+
+    def make(self, langs, family):
+        return json.dumps(dict(self.header, fonts=[
+            {'lang': ll, 'alias': 'serif', 'family': family} for ll in langs
+        ]))
+
+    def test_replace(self):
+        """Test that updated languages are replaced in the original order."""
+        out = json.loads(replace_langs(self.make(['en', 'ja', 'ko'], 'A'),
+                                       self.make(['ja'], 'B'), ['ja']))
+        assert [(f['lang'], f['family']) for f in out['fonts']] == [
+            ('en', 'A'), ('ja', 'B'), ('ko', 'A')]
+
+    def test_mismatch(self):
+        """Test that results from different environments aren't merged."""
+        update = json.dumps(dict(self.header, version_id='41', fonts=[]))
+        with pytest.raises(RuntimeError, match='version_id mismatch'):
+            replace_langs(self.make(['en'], 'A'), update, ['en'])